@@ -2,72 +2,55 @@ import streamlit as st
 from langchain_core.messages import HumanMessage, AIMessage
 
 # from langchain_core.globals import set_verbose
-import utils.chains_lcel as chains
 from utils.sidebar import sidebar
-import utils.llm_models as llms
-from utils.utils import load_db, query_db_connection, process_and_store_query
-from utils.tools import create_tool_chain
+from utils.utils import load_db, load_retriever, load_answer_cache, load_router, load_query_logger, load_exercise_pool, load_faq_index
+from utils.pipeline import build_chains, call_function, route_query
+from utils.speculative import prefetch, wants_prefetch
+from utils.answer_cache import replay_stream
+from utils.instrumentation import RequestMetricsHandler, metrics
+from utils.cascade import escalation_stats
+from utils.debug_analyzer import debug_stats
+from utils.hedging import hedge_stats
+from utils.scheduler import is_rate_limit_error, scheduler_stats
+from utils.memory import SessionMemory
+import utils.http_clients as http
+import os
+import time
 from datetime import datetime
 
 # import langchain
 # langchain.debug = False
 
+BUSY_TEXT = "Lots of students are asking questions right now. Please try again in a minute."
+# messages kept on screen; older turns live on only in the memory summary
+DISPLAY_MESSAGES = 40
+
 # Initialize resources
 def initialize_resources():
-    # Load database and setup retriever
-    retriever = load_db().as_retriever()
+    # open provider connections now, and keep them warm, instead of on the first query
+    if http.SHARED_HTTP:
+        http.start_warmer()
+
+    # Load database and setup the hybrid BM25 + vector retriever
+    retriever = load_retriever()
 
-    # Connect to MongoDB
-    mongo_db = query_db_connection()
-    collection = mongo_db['Python_toolkit']
-    return retriever, collection
+    # Connect to MongoDB through the background query logger
+    query_logger = load_query_logger()
+    return retriever, query_logger
 
 def initialize_chains(retriever):
-    """Initialize all LLM models and chains with caching."""
+    """Initialize all LLM models and chains with caching.
+
+    Chains and model clients come from a process-wide registry, so they are
+    built once on first use and reruns only look them up.
+    """
     try:
-        
-        # Setup LLM models
-        gpt4o_mini = llms.openai_gpt4o_mini
-        gpt4o_mini_json = llms.openai_4o_mini_json
-        claude_sonnet = llms.claude_sonnet
-        claude_haiku = llms.claude_haiku
-        gpt4o = llms.openai_gpt4o
-        
-        # Create base chains
-        chains_dict = {
-            'rag': chains.rag_chain(claude_haiku, retriever),
-            'exercise': chains.exercise_chain(claude_sonnet),
-            'chat': chains.chat_chain(gpt4o_mini),
-            'explain': chains.code_chain(gpt4o),
-            'debug': chains.code_chain(claude_haiku),
-        }
-        
-        # Create tool chain
-        tool_chain = create_tool_chain(gpt4o_mini, chains_dict)
-        
-        # Return chains dictionary with tool chain
-        return tool_chain, chains_dict
+        return build_chains(retriever)
     
     except Exception as e:
         st.error(f"Failed to initialize chains: {str(e)}")
         raise e
 
-def call_function(name, args: dict, chat_history, chains_dict):
-    """Invoke the appropriate tool based on the name and arguments."""
-
-    if name == "course_information":
-        return chains_dict['rag'].stream(input={'chat_history': chat_history,**args})     
-    if name == "explain_concept":
-        return chains_dict['explain'].stream(input={'chat_history': chat_history, **args})
-    if name == "generate_exercise":
-        return chains_dict['exercise'].stream(input={'chat_history': chat_history, **args})
-    if name == "debug_code":
-        return chains_dict['debug'].stream(input=args)
-    if name == "general_chat":
-        return chains_dict['chat'].stream(input={**args, "chat_history": chat_history})
-    else:
-        return "Invalid tool name"
-        
 # Build an app with streamlit
 def main():
     # Set the page_title
@@ -79,9 +62,30 @@ def main():
     sidebar()
 
     # Initialize resources
-    retriever, collection = initialize_resources()
+    retriever, query_logger = initialize_resources()
     # Initialize chains with caching
     agent, chain_dict = initialize_chains(retriever)
+    answer_cache = load_answer_cache()
+    router = load_router()
+    exercise_pool = load_exercise_pool()
+    faq_index = load_faq_index()
+    metrics.register_stats("answer_cache", answer_cache.stats)
+    metrics.register_stats("router", router.stats)
+    metrics.register_stats("query_log", query_logger.stats)
+    metrics.register_stats("embeddings", load_db().embeddings.stats)
+    metrics.register_stats("cascade", escalation_stats.stats)
+    metrics.register_stats("scheduler", scheduler_stats)
+    metrics.register_stats("hedging", hedge_stats.stats)
+    metrics.register_stats("exercise_pool", exercise_pool.stats)
+    metrics.register_stats("faq", faq_index.stats)
+    metrics.register_stats("http", http.connection_stats.stats)
+    metrics.register_stats("metadata_filter", retriever.metadata_index.stats)
+    metrics.register_stats("debug_analyzer", debug_stats.stats)
+
+    # in-process metrics dump for operators
+    if os.getenv("VTA_SHOW_METRICS"):
+        with st.sidebar.expander("Metrics"):
+            st.code(metrics.render_text(), language="text")
     
     # Initialize the query text box
     initial_text = "Hi. I'm your virtual TA Peyton. How can I help you today?"
@@ -90,6 +94,10 @@ def main():
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
         st.session_state.chat_history.append(AIMessage(initial_text))
+    # bounded history for the chains: rolling summary of older turns + recent turns
+    if "memory" not in st.session_state:
+        st.session_state.memory = SessionMemory([AIMessage(initial_text)])
+    memory = st.session_state.memory
 
     # display previous conversation history
     for message in st.session_state.chat_history:
@@ -109,45 +117,61 @@ def main():
         with st.chat_message("Human"):
             st.markdown(user_query)
         
-        # save to MongoDB database
-        process_and_store_query(collection, query=user_query)
-
-        # Use tool chain to handle the query with chat history
-        conversation_context = "\n".join([
-            f"{'User' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg.content}"
-            for msg in st.session_state.chat_history[-3:]  # Last 3 exchanges for context
-        ])
-        
-        # decide which tool to call
-        tool_call = agent.invoke(
-            f"""
-            Your only task is to decide which tool to call based on the user query delimited with <query> tags and chat history, and generate the appropriate arguements for the tool call. 
+        # collect latency and token metrics for this request
+        handler = RequestMetricsHandler()
+        chat_history = memory.messages()
+        try:
+            # approved answers to frequent questions skip routing and the LLM
+            faq_answer = faq_index.match(user_query)
+            if faq_answer is not None:
+                handler.record_route("faq", 0.0, "faq")
+                response = replay_stream(faq_answer)
+            else:
+                # route locally first; retrieval for the raw query only starts when it may be needed
+                route_start = time.perf_counter()
+                decision = router.route(user_query)
+                decision_seconds = time.perf_counter() - route_start
+                prefetched = None
+                if wants_prefetch(decision):
+                    prefetched = prefetch(retriever, user_query, callbacks=[handler])
+
+                # decide which tool to call, locally when confident
+                tool_calls = route_query(agent, user_query, chat_history,
+                                         router=router, handler=handler, decision=decision,
+                                         decision_seconds=decision_seconds)
             
-            Previous conversation: {conversation_context} \n
-            Query: <query>{user_query}</query>\n
-            Generate the tool call with appropriate arguments. Do not generate direct response. Enrich the query for the tool call when appropriate, but don't fundamentally change it. Limit query to no more than 25 tokens.
-            """)
-        
-        print(tool_call.tool_calls)
-
-        # call the tool
-        response = call_function(
-            name=tool_call.tool_calls[0]["name"],
-            args=tool_call.tool_calls[0]['args'],
-            chat_history=st.session_state.chat_history[-3:],
-            chains_dict=chain_dict
-        )
-        # display AI response
-        with st.chat_message("AI", avatar="🦜"):
-            ai_response = st.write_stream(response)
+                print(tool_calls)
+
+                # call the tool
+                response = call_function(
+                    name=tool_calls[0]["name"],
+                    args=tool_calls[0]['args'],
+                    chat_history=chat_history,
+                    chains_dict=chain_dict,
+                    answer_cache=answer_cache,
+                    prefetched=prefetched,
+                    callbacks=[handler],
+                    exercise_pool=exercise_pool
+                )
+            # display AI response
+            with st.chat_message("AI", avatar="🦜"):
+                ai_response = st.write_stream(handler.track_stream(response))
+        except Exception as e:
+            # still rate limited after retries: tell the student instead of a stack trace
+            if not is_rate_limit_error(e):
+                raise e
+            ai_response = BUSY_TEXT
+            with st.chat_message("AI", avatar="🦜"):
+                st.markdown(ai_response)
+        finally:
+            # save to MongoDB database in the background, with the request metrics
+            query_logger.log(query=user_query, **handler.log_fields())
 
         # append AI response to chat history
         st.session_state.chat_history.append(HumanMessage(user_query))
         st.session_state.chat_history.append(AIMessage(ai_response))
-
-    # truncate chat history to last 5 messages
-    max_num_messages = 5
-    if len(st.session_state.chat_history) > max_num_messages:
-        st.session_state.chat_history = st.session_state.chat_history[-max_num_messages:]
+        del st.session_state.chat_history[:-DISPLAY_MESSAGES]
+        # fold older turns into the summary in the background, after the answer has streamed
+        memory.add_turn(user_query, ai_response)
 if __name__ == '__main__':
     main()
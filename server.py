@@ -0,0 +1,268 @@
+"""
+Headless ASGI service for the virtual TA pipeline.
+
+Exposes routing + call_function as an HTTP endpoint that streams answer
+tokens over server-sent events. Session history is kept server-side and
+every conversation runs on one event loop through the chains' astream.
+Session ids are issued by the server (unguessable tokens returned in the
+X-Session-Id header and the first event); an unknown or client-invented id
+starts a new session instead of opening someone else's.
+
+Run with:
+    uvicorn server:app --host 0.0.0.0 --port 8000
+
+Endpoints:
+    POST   /chat                    {"query": "...", "session_id": "..."} -> SSE stream
+    GET    /sessions/{id}/history
+    DELETE /sessions/{id}
+    GET    /metrics                 Prometheus-style text dump
+    GET    /health
+"""
+
+import asyncio
+import contextlib
+import json
+import secrets
+import time
+import traceback
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage, HumanMessage
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+
+import utils.http_clients as http
+from utils.answer_cache import replay_stream
+from utils.cascade import escalation_stats
+from utils.concurrency import Overloaded, limiter
+from utils.debug_analyzer import debug_stats
+from utils.hedging import hedge_stats
+from utils.instrumentation import RequestMetricsHandler, metrics
+from utils.memory import SessionMemory
+from utils.pipeline import acall_function, aroute_query, build_chains
+from utils.scheduler import is_rate_limit_error, scheduler_stats
+from utils.speculative import prefetch, wants_prefetch
+from utils.utils import (
+    load_answer_cache, load_db, load_exercise_pool, load_faq_index, load_query_logger, load_retriever,
+    load_router)
+
+INITIAL_TEXT = "Hi. I'm your virtual TA Peyton. How can I help you today?"
+# error events never carry exception details; those only go to the server log
+BUSY_TEXT = "Lots of students are asking questions right now. Please try again in a minute."
+ERROR_TEXT = "Something went wrong while answering. Please try again."
+MAX_SESSIONS = 10000
+SESSION_TTL = 4 * 60 * 60  # seconds
+
+
+class SessionStore:
+    """In-memory session memories (rolling summary + recent turns), evicted by idle time and LRU."""
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl=SESSION_TTL):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()  # id -> (memory, lock, last_used)
+
+    def get(self, session_id):
+        """Return (memory, lock) for session_id, creating the session if needed."""
+        now = time.monotonic()
+        for stale in [k for k, (_, _, used) in self._sessions.items() if now - used > self.ttl]:
+            del self._sessions[stale]
+
+        if session_id not in self._sessions:
+            self._sessions[session_id] = (SessionMemory([AIMessage(INITIAL_TEXT)]), asyncio.Lock(), now)
+        memory, lock, _ = self._sessions[session_id]
+        self._sessions[session_id] = (memory, lock, now)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return memory, lock
+
+    def create(self):
+        """Start a session under a new unguessable id."""
+        session_id = secrets.token_urlsafe(32)
+        self.get(session_id)
+        return session_id
+
+    def memory(self, session_id):
+        entry = self._sessions.get(session_id)
+        return entry[0] if entry else None
+
+    def delete(self, session_id):
+        return self._sessions.pop(session_id, None) is not None
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+sessions = SessionStore()
+resources = {}
+
+
+def _resources():
+    """Load the retriever, chains, caches and logger once per process."""
+    if not resources:
+        retriever = load_retriever()
+        agent, chains_dict = build_chains(retriever)
+        resources.update(
+            retriever=retriever, agent=agent, chains_dict=chains_dict,
+            answer_cache=load_answer_cache(), router=load_router(), query_logger=load_query_logger(),
+            exercise_pool=load_exercise_pool(), faq_index=load_faq_index())
+        metrics.register_stats("answer_cache", resources["answer_cache"].stats)
+        metrics.register_stats("router", resources["router"].stats)
+        metrics.register_stats("query_log", resources["query_logger"].stats)
+        metrics.register_stats("embeddings", load_db().embeddings.stats)
+        metrics.register_stats("cascade", escalation_stats.stats)
+        metrics.register_stats("concurrency", limiter.stats)
+        metrics.register_stats("scheduler", scheduler_stats)
+        metrics.register_stats("hedging", hedge_stats.stats)
+        metrics.register_stats("exercise_pool", resources["exercise_pool"].stats)
+        metrics.register_stats("faq", resources["faq_index"].stats)
+        metrics.register_stats("http", http.connection_stats.stats)
+        metrics.register_stats("metadata_filter", retriever.metadata_index.stats)
+        metrics.register_stats("debug_analyzer", debug_stats.stats)
+        metrics.register_stats("sessions", lambda: {"active": len(sessions)})
+    return resources
+
+
+async def _replay(answer):
+    for chunk in replay_stream(answer):
+        yield chunk
+
+
+def _sse(data, event=None):
+    lines = f"event: {event}\n" if event else ""
+    return f"{lines}data: {json.dumps(data)}\n\n"
+
+
+async def answer_events(session_id, user_query):
+    """Route the query, stream the answer as SSE events and update the session memory."""
+    r = _resources()
+    memory, lock = sessions.get(session_id)
+    yield _sse({"session_id": session_id}, event="session")
+
+    # queue for a slot under the global in-flight cap, shed load past the timeout
+    try:
+        await limiter.acquire("requests")
+    except Overloaded as e:
+        print(f"Request shed: {e}")
+        yield _sse({"error": BUSY_TEXT, "overloaded": True}, event="error")
+        return
+
+    handler = RequestMetricsHandler()
+    chunks = []
+    try:
+        # one message at a time per session, so histories stay in order
+        async with lock:
+            history = memory.messages()
+            # approved answers to frequent questions skip routing and the LLM
+            faq_answer = await asyncio.to_thread(r["faq_index"].match, user_query)
+            if faq_answer is not None:
+                handler.record_route("faq", 0.0, "faq")
+                yield _sse({"name": "faq"}, event="tool")
+                stream = _replay(faq_answer)
+            else:
+                # route locally first; retrieval for the raw query only starts when it may be needed
+                route_start = time.perf_counter()
+                decision = await asyncio.to_thread(r["router"].route, user_query)
+                decision_seconds = time.perf_counter() - route_start
+                prefetched = None
+                if wants_prefetch(decision):
+                    prefetched = prefetch(r["retriever"], user_query, callbacks=[handler])
+                tool_calls = await aroute_query(r["agent"], user_query, history,
+                                                router=r["router"], handler=handler, decision=decision,
+                                                decision_seconds=decision_seconds)
+                yield _sse({"name": tool_calls[0]["name"]}, event="tool")
+
+                stream = acall_function(
+                    name=tool_calls[0]["name"],
+                    args=tool_calls[0]["args"],
+                    chat_history=history,
+                    chains_dict=r["chains_dict"],
+                    answer_cache=r["answer_cache"],
+                    prefetched=prefetched,
+                    callbacks=[handler],
+                    exercise_pool=r["exercise_pool"])
+            async for chunk in handler.atrack_stream(stream):
+                chunks.append(chunk)
+                yield _sse(chunk)
+
+            # the summary is updated in the background, never before the next response
+            memory.add_turn(user_query, "".join(chunks))
+        yield _sse({}, event="done")
+    except Exception as e:
+        print(f"Request failed: {e}")
+        traceback.print_exc()
+        overloaded = isinstance(e, Overloaded) or is_rate_limit_error(e)
+        yield _sse({"error": BUSY_TEXT if overloaded else ERROR_TEXT, "overloaded": overloaded}, event="error")
+    finally:
+        limiter.release("requests")
+        r["query_logger"].log(query=user_query, **handler.log_fields())
+
+
+async def chat(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return JSONResponse({"error": "request body must be JSON"}, status_code=400)
+    if not isinstance(body, dict):
+        return JSONResponse({"error": "request body must be a JSON object"}, status_code=400)
+    user_query = body.get("query")
+    if not isinstance(user_query, str) or not user_query.strip():
+        return JSONResponse({"error": "query must be a non-empty string"}, status_code=400)
+    user_query = user_query.strip()
+    # only ids this server issued continue a session
+    session_id = body.get("session_id")
+    if not isinstance(session_id, str) or sessions.memory(session_id) is None:
+        session_id = sessions.create()
+    return StreamingResponse(
+        answer_events(session_id, user_query),
+        media_type="text/event-stream",
+        headers={"X-Session-Id": session_id, "Cache-Control": "no-cache"})
+
+
+async def session_history(request):
+    memory = sessions.memory(request.path_params["session_id"])
+    if memory is None:
+        return JSONResponse({"error": "unknown session"}, status_code=404)
+    return JSONResponse([
+        {"role": "user" if isinstance(m, HumanMessage) else "assistant", "content": m.content}
+        for m in memory.messages()])
+
+
+async def delete_session(request):
+    deleted = sessions.delete(request.path_params["session_id"])
+    return JSONResponse({"deleted": deleted}, status_code=200 if deleted else 404)
+
+
+async def metrics_text(request):
+    return PlainTextResponse(metrics.render_text())
+
+
+async def health(request):
+    return JSONResponse({"status": "ok", "sessions": len(sessions)})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # load models and indexes, and open provider connections, before the first request arrives
+    warmer = None
+    if http.SHARED_HTTP:
+        http.start_warmer()
+        warmer = asyncio.create_task(http.awarm_periodically())
+    await asyncio.to_thread(_resources)
+    yield
+    if warmer is not None:
+        warmer.cancel()
+
+
+app = Starlette(
+    routes=[
+        Route("/chat", chat, methods=["POST"]),
+        Route("/sessions/{session_id}/history", session_history, methods=["GET"]),
+        Route("/sessions/{session_id}", delete_session, methods=["DELETE"]),
+        Route("/metrics", metrics_text, methods=["GET"]),
+        Route("/health", health, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
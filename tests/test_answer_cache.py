@@ -0,0 +1,32 @@
+from utils.answer_cache import SemanticAnswerCache, number_tokens
+
+
+class SameVectorEmbeddings:
+    """Every query embeds identically, like near-duplicates under ada-002."""
+
+    def embed_query(self, text):
+        return [1.0, 0.0, 0.0]
+
+
+def cache(tmp_path):
+    return SemanticAnswerCache(SameVectorEmbeddings(), db_path=str(tmp_path))
+
+
+def test_number_tokens_normalize_number_words():
+    assert number_tokens("When is the third assignment due?") == number_tokens("when is assignment 3 due")
+    assert number_tokens("When is the midterm?") == frozenset()
+
+
+def test_queries_differing_in_a_number_do_not_share_an_answer(tmp_path):
+    answers = cache(tmp_path)
+    answers.put("course_information", "When is assignment 3 due?", "Assignment 3 is due on March 1.")
+    assert answers.get("course_information", "when is assignment 4 due")[0] is None
+    assert answers.get("course_information", "What's the deadline of assignment three?")[0] == \
+        "Assignment 3 is due on March 1."
+
+
+def test_semantic_hits_are_per_tool(tmp_path):
+    answers = cache(tmp_path)
+    answers.put("course_information", "When are office hours?", "Tuesdays at 3pm.")
+    assert answers.get("explain_concept", "When are office hours?")[0] is None
+    assert answers.get("course_information", "office hours, when are they?")[0] == "Tuesdays at 3pm."
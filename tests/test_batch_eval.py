@@ -0,0 +1,42 @@
+import json
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+
+from utils.batch_eval import answer_batch, resume, route_batch, run
+
+
+def test_resume_keeps_only_complete_answers(tmp_path):
+    output = tmp_path / "answers.jsonl"
+    output.write_text(
+        json.dumps({"id": "1", "answer": "ok"}) + "\n"
+        + json.dumps({"id": "2", "error": "rate limited"}) + "\n"
+        + '{"id": "3", "ans', encoding='utf-8')
+    assert resume(str(output)) == {"1"}
+    assert output.read_text(encoding='utf-8') == json.dumps({"id": "1", "answer": "ok"}) + "\n"
+
+
+def test_resumed_run_retries_failures_after_a_killed_write(tmp_path):
+    output = tmp_path / "answers.jsonl"
+    output.write_text(
+        json.dumps({"id": "1", "tool": "general_chat", "answer": "hi"}) + "\n"
+        + json.dumps({"id": "2", "error": "rate limited"}) + "\n"
+        + '{"id": "3", "ans', encoding='utf-8')
+    agent = RunnableLambda(lambda _: AIMessage("", tool_calls=[
+        {"name": "general_chat", "args": {"query": "hello"}, "id": "call"}]))
+    chains = {"chat": RunnableLambda(lambda inputs: f"answer to {inputs['query']}")}
+    queries = [("1", "hello"), ("2", "hello"), ("3", "hello")]
+
+    counts = run(agent, chains, queries, str(output), concurrency=2)
+    records = [json.loads(line) for line in output.read_text(encoding='utf-8').splitlines()]
+    assert counts == {"general_chat": 2}
+    assert [record["id"] for record in records] == ["1", "2", "3"]
+    assert all("error" not in record for record in records)
+
+
+def test_reply_without_tool_call_is_a_routing_error():
+    agent = RunnableLambda(lambda _: AIMessage("I am not sure which tool to use."))
+    queries = [("1", "hmm")]
+    routes = route_batch(agent, queries, concurrency=1)
+    records = answer_batch({}, queries, routes, concurrency=1)
+    assert records[0]["error"].startswith("routing failed")
@@ -0,0 +1,27 @@
+from langchain_core.runnables import RunnableLambda
+
+from utils.cascade import POOL_TAG, CascadeChain, EscalationStats, check_exercise
+
+MCQ = "Which loop runs at least once?\nA) for\nB) while\nC) do-while\nD) none"
+
+
+def cascade(small_answer, stats):
+    small = RunnableLambda(lambda _: small_answer)
+    large = RunnableLambda(lambda _: MCQ)
+    return CascadeChain("exercise", small, large, check_exercise, stats=stats)
+
+
+def test_failed_check_escalates_to_large_model():
+    stats = EscalationStats()
+    assert "".join(cascade("A question without options", stats).stream({"query": "quiz me"})) == MCQ
+    assert stats.stats()["exercise_escalated"] == 1
+
+
+def test_pool_refills_are_counted_separately():
+    stats = EscalationStats()
+    chain = cascade(MCQ, stats)
+    chain.invoke({"query": "quiz me"}, config={"tags": [POOL_TAG]})
+    chain.invoke({"query": "quiz me"})
+    counts = stats.stats()
+    assert counts["exercise_pool_requests"] == 1
+    assert counts["exercise_requests"] == 1
@@ -0,0 +1,74 @@
+import pytest
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage, HumanMessage
+
+import utils.context as context
+from utils.context import (SUMMARY_MESSAGE_ID, TOKEN_BUDGETS, assemble_context, count_tokens, trim_history,
+                           truncate_text)
+from utils.pipeline import tool_input
+
+
+@pytest.fixture(autouse=True)
+def fallback_counter(monkeypatch):
+    """Count tokens as 4 characters each, as when tiktoken is not installed."""
+    monkeypatch.setattr(context, "_encoding", None)
+
+
+def history(turns, words=60):
+    messages = []
+    for i in range(turns):
+        messages += [HumanMessage(f"question {i} " + "word " * words), AIMessage(f"answer {i} " + "word " * words)]
+    return messages
+
+
+def history_tokens(messages):
+    return sum(count_tokens(m.content) for m in messages)
+
+
+@pytest.mark.parametrize("tool", sorted(TOKEN_BUDGETS))
+def test_prompt_parts_stay_within_the_tool_budget(tool):
+    budget = TOKEN_BUDGETS[tool]
+    query = "Traceback (most recent call last):\n" + "x = 1\n" * 2000 + "ValueError: last line"
+    inputs = tool_input(tool, {"query": query}, history(20), context=[])
+
+    assert count_tokens(inputs["query"]) <= budget["query"]
+    assert inputs["query"].endswith("ValueError: last line")  # the tail of a paste is kept
+    assert history_tokens(inputs.get("chat_history", [])) <= budget["history"]
+
+
+def test_history_keeps_the_newest_turns_and_drops_the_oldest():
+    messages = history(10)
+    kept = trim_history(messages, 200)
+    assert kept == messages[-len(kept):]
+    assert kept[-1].content.startswith("answer 9")
+    assert history_tokens(kept) <= 200
+
+
+def test_summary_is_kept_ahead_of_recent_turns_within_half_the_budget():
+    summary = AIMessage("Summary of the earlier conversation:\n" + "topic " * 500, id=SUMMARY_MESSAGE_ID)
+    kept = trim_history([summary] + history(10), 300)
+    assert kept[0].id == SUMMARY_MESSAGE_ID
+    assert count_tokens(kept[0].content) <= 150
+    assert kept[-1].content.startswith("answer 9")
+    assert history_tokens(kept) <= 300
+
+
+def test_oversized_newest_message_is_truncated_not_dropped():
+    kept = trim_history([HumanMessage("old"), HumanMessage("new " * 1000)], 50)
+    assert len(kept) == 1 and count_tokens(kept[0].content) <= 50
+
+
+def test_truncate_text_fits_the_budget():
+    for max_tokens in (1, 2, 10, 333):
+        assert count_tokens(truncate_text("abcdefgh " * 500, max_tokens)) <= max_tokens
+
+
+def test_context_keeps_relevant_sentences_and_drops_duplicates():
+    office = "Office hours are on Tuesdays at 3pm in room 204."
+    filler = " ".join(f"Unrelated sentence number {i} about grading rubrics." for i in range(200))
+    documents = [Document(page_content=f"﻿{filler} {office}"), Document(page_content=office),
+                 Document(page_content=f"{office}  ")]
+    text = assemble_context(documents, "when are office hours", max_tokens=100)
+    assert count_tokens(text) <= 100
+    assert office in text
+    assert text.count(office) == 1  # the shorter copies are contained in the first chunk
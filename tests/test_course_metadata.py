@@ -0,0 +1,73 @@
+from typing import Any, List
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from utils.course_metadata import MetadataIndex, infer_metadata, parse_filters, to_where
+from utils.hybrid_retriever import BM25Index, HybridRetriever
+
+TOPICS = {1: "variables and types", 2: "loops and conditionals", 3: "pandas dataframes"}
+
+
+def chunk(source, text):
+    return Document(page_content=text, metadata={"source": source, **infer_metadata(source, text)})
+
+
+def knowledge_base():
+    documents = []
+    for week, topic in TOPICS.items():
+        for part in range(3):
+            documents.append(chunk(f"course/Week_{week}/lecture_notes.md",
+                                   f"Week {week} lecture, part {part}: {topic}. Practice reading the examples."))
+    documents.append(chunk("course/syllabus.pdf", "Syllabus: grading, late policy and office hours."))
+    documents.append(chunk("course/assignments/assignment_2.ipynb", "Assignment 2: loops over sales data."))
+    return documents
+
+
+class FakeVectorRetriever(BaseRetriever):
+    """Returns every chunk matching the Chroma-style filter; records the filters it was given."""
+
+    documents: List[Document]
+    filters: List[Any] = []
+
+    def _get_relevant_documents(self, query, *, run_manager, filter=None):
+        self.filters.append(filter)
+        index = MetadataIndex(self.documents, min_candidates=0)
+        rows = index.rows(filter) if filter else range(len(self.documents))
+        return [self.documents[i] for i in sorted(rows)][:8]
+
+
+def retriever():
+    documents = knowledge_base()
+    return HybridRetriever(index=BM25Index(documents), metadata_index=MetadataIndex(documents),
+                           vector_retriever=FakeVectorRetriever(documents=documents, filters=[]), k=4)
+
+
+def test_chunks_are_tagged_from_path_and_title():
+    assert infer_metadata("course/Week_02/lecture_notes.md", "text") == {"doc_type": "lecture", "week": 2}
+    assert infer_metadata("recap.ipynb", "Topic: Module three recap\nbody") == {"doc_type": "notebook", "module": 3}
+    assert parse_filters("What do the week five lecture slides cover?") == {"week": 5, "doc_type": "lecture"}
+    assert to_where({"week": 5, "doc_type": "lecture"}) == {"$and": [{"doc_type": "lecture"}, {"week": 5}]}
+
+
+def test_query_naming_a_week_only_returns_that_week():
+    hybrid = retriever()
+    documents = hybrid.invoke("What should I practice from week 2?")
+    assert documents and all(doc.metadata["week"] == 2 for doc in documents)
+    assert hybrid.vector_retriever.filters == [{"week": 2}]
+    assert hybrid.metadata_index.stats()["scoped"] == 1
+
+
+def test_unknown_week_falls_back_to_unfiltered_retrieval():
+    hybrid = retriever()
+    documents = hybrid.invoke("What should I practice from week 9?")
+    assert {doc.metadata.get("week") for doc in documents} != {9}
+    assert hybrid.vector_retriever.filters == [None]
+    assert hybrid.metadata_index.stats()["unscoped"] == 1
+
+
+def test_filter_matching_too_few_chunks_is_not_applied():
+    hybrid = retriever()
+    hybrid.invoke("What is assignment 2 about?")  # a single chunk is tagged assignment 2
+    assert hybrid.vector_retriever.filters == [None]
+    assert hybrid.metadata_index.stats()["fallbacks"] == 1
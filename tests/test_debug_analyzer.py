@@ -0,0 +1,115 @@
+from utils.debug_analyzer import analyze
+
+
+def diagnose(query):
+    return analyze(query, stats=None)
+
+
+def test_indented_excerpt_without_reported_error_goes_to_model():
+    diagnosis = diagnose("why is my total always zero?\n```python\n    for x in items:\n        total += x\n```")
+    assert diagnosis.answer is None
+    assert diagnosis.error is None
+    assert diagnosis.prompt is not None
+
+
+def test_unfinished_snippet_without_reported_error_goes_to_model():
+    diagnosis = diagnose(
+        "Is my grading logic right? Scores of 90 get a B.\n"
+        "```python\nif score > 90:\n    grade = 'A'\nelif score > 80:\n```")
+    assert diagnosis.answer is None
+    assert diagnosis.prompt is not None
+
+
+def test_reported_indentation_error_is_located_with_ast():
+    diagnosis = diagnose("I get an IndentationError here\n```python\nfor i in range(3):\nprint(i)\n```")
+    assert diagnosis.error == "IndentationError"
+    assert diagnosis.line_number == 2
+    assert "expected" in diagnosis.message
+    assert "indented" in diagnosis.answer
+
+
+def test_name_error_typo_points_at_defined_name():
+    diagnosis = diagnose(
+        "```python\ntotal_sales = 100\ntax = 0.07\nprint(Total_sales * tax)\n```\n"
+        "Traceback (most recent call last):\n"
+        '  File "main.py", line 3, in <module>\n'
+        "    print(Total_sales * tax)\n"
+        "NameError: name 'Total_sales' is not defined")
+    assert diagnosis.line_number == 3
+    assert "`total_sales`" in diagnosis.answer
+
+
+def test_inline_name_error_for_missing_import():
+    diagnosis = diagnose("```\ndf = pd.read_csv('sales.csv')\n```\nNameError: name 'pd' is not defined")
+    assert "import pandas as pd" in diagnosis.answer
+
+
+def test_dataframe_key_error_skips_library_frames_and_reanchors():
+    diagnosis = diagnose(
+        "```python\nimport pandas as pd\nsales = pd.read_csv('sales.csv')\nsales['revenue'] = 1\n"
+        "print(sales['Revenue'].sum())\n```\n"
+        "KeyError                                  Traceback (most recent call last)\n"
+        "Cell In[4], line 12\n"
+        "---> 12 print(sales['Revenue'].sum())\n"
+        "File /usr/local/lib/python3.10/dist-packages/pandas/core/frame.py:3761, in DataFrame.__getitem__\n"
+        "-> 3761 indexer = self.columns.get_loc(key)\n"
+        "KeyError: 'Revenue'")
+    assert diagnosis.line_number == 4
+    assert "`sales` has no column" in diagnosis.answer
+    assert "'revenue'" in diagnosis.answer
+
+
+def test_dict_key_error_in_pandas_file_goes_to_model():
+    diagnosis = diagnose(
+        "```python\nimport pandas as pd\nconfig = {'a': 1}\nprint(config['b'])\n```\nKeyError: 'b'")
+    assert diagnosis.answer is None
+    assert diagnosis.error == "KeyError"
+    assert diagnosis.prompt is not None
+
+
+def test_str_plus_int_finds_concatenation_line():
+    diagnosis = diagnose(
+        'age = 21\nmessage = "I am " + age + " years old"\nprint(message)\n'
+        'TypeError: can only concatenate str (not "int") to str')
+    assert diagnosis.line_number == 2
+    assert "`int`" in diagnosis.answer
+
+
+def test_other_errors_get_trimmed_prompt():
+    diagnosis = diagnose(
+        "Why?\n```python\nprices = [10, 20]\ncount = 0\navg = sum(prices) / count\nprint(avg)\n```\n"
+        "Traceback (most recent call last):\n"
+        '  File "/content/a.py", line 40, in <module>\n'
+        "    avg = sum(prices) / count\n"
+        "ZeroDivisionError: division by zero")
+    assert diagnosis.answer is None
+    assert diagnosis.line_number == 3
+    assert "ZeroDivisionError" in diagnosis.prompt
+    assert "# <- line 3" in diagnosis.prompt
+
+
+def test_unsupported_operands_for_str_and_int_use_template():
+    diagnosis = diagnose("```python\nlabel = 'Total: '\nlabel += 5\n```\n"
+                         "TypeError: unsupported operand type(s) for +=: 'str' and 'int'")
+    assert "`int`" in diagnosis.answer
+
+
+def test_int_plus_none_goes_to_model():
+    diagnosis = diagnose("```python\ntotal = 1 + get_price()\n```\n"
+                         "TypeError: unsupported operand type(s) for +: 'int' and 'NoneType'")
+    assert diagnosis.answer is None
+    assert diagnosis.error == "TypeError"
+    assert "NoneType" in diagnosis.prompt
+
+
+def test_list_plus_int_goes_to_model():
+    diagnosis = diagnose("```python\nitems = [1, 2]\nitems = items + 3\n```\n"
+                         "TypeError: unsupported operand type(s) for +: 'list' and 'int'")
+    assert diagnosis.answer is None
+    assert diagnosis.prompt is not None
+
+
+def test_str_plus_list_goes_to_model():
+    diagnosis = diagnose('```python\nprint("Items: " + items)\n```\n'
+                         'TypeError: can only concatenate str (not "list") to str')
+    assert diagnosis.answer is None
@@ -0,0 +1,75 @@
+import threading
+
+from langchain_core.embeddings import Embeddings
+
+from utils.embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic vectors; records every batch it is asked to embed."""
+
+    def __init__(self, offset=0.0, gate=None):
+        self.offset = offset
+        self.gate = gate
+        self.batches = []
+
+    def _vector(self, text):
+        return [float(len(text)) + self.offset, float(sum(map(ord, text)) % 97), 1.0]
+
+    def embed_documents(self, texts):
+        if self.gate is not None:
+            self.gate.wait()
+        self.batches.append(list(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def cached(tmp_path, embedder, model_name="fake-ada", **kwargs):
+    return CachedEmbeddings(embedder, model_name=model_name, cache_path=str(tmp_path / "cache.sqlite3"), **kwargs)
+
+
+def test_only_missing_texts_are_embedded_in_batches(tmp_path):
+    embedder = CountingEmbeddings()
+    embeddings = cached(tmp_path, embedder, batch_size=2)
+    first = embeddings.embed_documents(["a", "bb"])
+    assert embedder.batches == [["a", "bb"]]
+
+    second = embeddings.embed_documents(["bb", "ccc", "a", "dddd", "eeeee", "ccc"])
+    assert embedder.batches[1:] == [["ccc", "dddd"], ["eeeee"]]
+    assert second[0] == first[1] and second[2] == first[0] and second[1] == second[5]
+
+    stats = embeddings.stats()
+    assert (stats["hits"], stats["misses"], stats["requests"]) == (2, 5, 3)  # duplicates within a request are looked up once
+
+
+def test_vectors_survive_a_restart(tmp_path):
+    vector = cached(tmp_path, CountingEmbeddings()).embed_query("office hours")
+    embedder = CountingEmbeddings()
+    assert cached(tmp_path, embedder).embed_query("office hours") == vector
+    assert embedder.batches == []
+
+
+def test_cache_is_keyed_by_model_name(tmp_path):
+    cached(tmp_path, CountingEmbeddings()).embed_query("office hours")
+    other = CountingEmbeddings(offset=100.0)
+    vector = cached(tmp_path, other, model_name="fake-3-small").embed_query("office hours")
+    assert other.batches == [["office hours"]]
+    assert vector[0] == 112.0
+
+
+def test_identical_inflight_requests_are_embedded_once(tmp_path):
+    gate = threading.Event()
+    embedder = CountingEmbeddings(gate=gate)
+    embeddings = cached(tmp_path, embedder)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(embeddings.embed_query("loops")))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(results) == 4 and all(r == results[0] for r in results)
+    assert embedder.batches == [["loops"]]
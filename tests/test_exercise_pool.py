@@ -0,0 +1,90 @@
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from utils.cascade import check_exercise
+from utils.exercise_pool import ExercisePool, parse_request
+from utils.pipeline import call_function
+
+
+def mcq(n, context="operations"):
+    return (f"Question {n}: In a {context} report, which loop prints each order once?\n"
+            "A) for order in orders: print(order)\nB) while True: pass\nC) print(orders[0])\nD) None of these")
+
+
+class MCQChain:
+    """Generation chain returning a new well-formed MCQ per call."""
+
+    def __init__(self):
+        self.calls = 0
+        self.runnable = RunnableLambda(self._generate)
+
+    def _generate(self, inputs):
+        self.calls += 1
+        return mcq(self.calls)
+
+
+def wait_for_refills(pool, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while pool._refilling:
+        assert time.monotonic() < deadline, "refill did not finish"
+        time.sleep(0.01)
+
+
+def make_pool(tmp_path, **kwargs):
+    return ExercisePool(path=str(tmp_path / "pool.sqlite3"), **{"target": 5, "low_water": 2, **kwargs})
+
+
+def fill_bucket(pool, chain, count, context="operations"):
+    assert pool.fill("loops", "beginner", context, chain.runnable, count) == count
+
+
+def test_generated_questions_pass_the_mcq_check():
+    assert check_exercise(mcq(1), {"query": "quiz me"})
+
+
+def test_serves_pooled_exercises_without_repeating_seen_ones(tmp_path):
+    pool, chain = make_pool(tmp_path, low_water=0), MCQChain()
+    fill_bucket(pool, chain, 3)
+    history = []
+    served = []
+    for _ in range(3):
+        question = pool.serve("give me a practice question on loops", history, chain.runnable)
+        assert question is not None
+        served.append(question)
+        history += [HumanMessage("give me a practice question on loops"), AIMessage(question)]
+    assert len(set(served)) == 3
+    # every pooled question is already in this conversation
+    assert pool.serve("give me a practice question on loops", history, chain.runnable) is None
+    assert pool.stats()["hits"] == 3
+
+
+def test_request_for_a_context_only_serves_that_bucket(tmp_path):
+    pool, chain = make_pool(tmp_path, low_water=0), MCQChain()
+    fill_bucket(pool, chain, 1, context="finance")
+    assert pool.serve("practice question on loops for marketing", [], chain.runnable) is None
+    assert pool.serve("practice question on loops for finance", [], chain.runnable) == mcq(1)
+
+
+def test_empty_bucket_falls_back_to_live_generation(tmp_path):
+    pool = make_pool(tmp_path)
+    live = RunnableLambda(lambda inputs: "live exercise")
+    answer = "".join(call_function("generate_exercise", {"query": "give me a practice question on loops"}, [],
+                                   {"exercise": live}, exercise_pool=pool))
+    assert answer == "live exercise"
+    assert pool.stats()["misses"] == 1
+    wait_for_refills(pool)
+
+
+def test_request_without_context_refills_one_bucket(tmp_path):
+    pool, chain = make_pool(tmp_path), MCQChain()
+    assert parse_request("give me a practice question on loops") == ("loops", "beginner", None)
+    assert pool.serve("give me a practice question on loops", [], chain.runnable) is None
+    wait_for_refills(pool)
+
+    assert chain.calls == 5
+    counts = pool._fresh_counts("loops", "beginner")
+    assert sum(counts.values()) == 5 and len(counts) == 1
+    assert not pool._refilling
+    assert pool.serve("give me a practice question on loops", [], chain.runnable) is not None
@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+
+from utils.faq import FaqIndex, FaqStore, mine
+
+
+class FakeEmbeddings:
+    """Every query embeds identically, like near-duplicates under ada-002."""
+
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+
+class FakeLog:
+    """The find().sort().batch_size() cursor chain of a MongoDB collection."""
+
+    def __init__(self, queries):
+        self.documents = [{"_id": i + 1, "query": query} for i, query in enumerate(queries)]
+
+    def find(self, spec, projection):
+        return self
+
+    def sort(self, key, direction):
+        return self
+
+    def batch_size(self, size):
+        return iter(self.documents)
+
+
+def write_version(db_path, version):
+    (db_path / "kb_version.json").write_text(json.dumps({"version": version}), encoding='utf-8')
+
+
+def test_answers_from_an_older_knowledge_base_are_not_served(tmp_path):
+    db_path = tmp_path / "chroma_db"
+    db_path.mkdir()
+    write_version(db_path, "v1")
+    path = str(tmp_path / "faq.sqlite3")
+    store = FaqStore(path)
+    cluster_id = store.save([], [("when are office hours", np.array([1.0, 0.0], dtype=np.float32), 7)], "1")[0]
+    store.set_answer(cluster_id, "course_information", "Tuesdays at 3pm.", "v1")
+    store.set_approved([cluster_id], True)
+
+    index = FaqIndex(FakeEmbeddings(), db_path=str(db_path), path=path)
+    assert index.match("When are office hours?") == "Tuesdays at 3pm."
+
+    write_version(db_path, "v2")
+    index._last_check = float("-inf")
+    assert index.match("When are office hours?") is None
+    assert store.reset_stale("v2") == 1
+    assert store.unanswered(top=10, min_count=1) == [(cluster_id, "when are office hours")]
+
+
+def test_questions_about_different_numbers_are_not_clustered_or_served_together(tmp_path):
+    db_path = tmp_path / "chroma_db"
+    db_path.mkdir()
+    path = str(tmp_path / "faq.sqlite3")
+    store = FaqStore(path)
+    log = FakeLog(["When is assignment 3 due?", "when is assignment 3 due", "When is assignment 4 due?",
+                   "when is the third assignment due", "When are office hours?"])
+    assert mine(log, store, FakeEmbeddings()) == 5
+
+    clusters = dict(store._conn.execute("SELECT question, count FROM clusters"))
+    assert clusters == {"when is assignment 3 due": 3, "when is assignment 4 due": 1, "when are office hours": 1}
+
+    assignment_3 = store.unanswered(top=1, min_count=1)[0][0]
+    store.set_answer(assignment_3, "course_information", "Assignment 3 is due March 1.")
+    store.set_approved([assignment_3], True)
+    index = FaqIndex(FakeEmbeddings(), db_path=str(db_path), path=path)
+    assert index.match("When's assignment three due?") == "Assignment 3 is due March 1."
+    assert index.match("When is assignment 4 due?") is None
+    assert index.match("When are office hours?") is None
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.runnables import Runnable
+
+from utils.hedging import HedgedRunnable, HedgeStats
+
+
+class FakeModel(Runnable):
+    """Streams chunks after a first-token delay, or raises; records how far each stream got."""
+
+    def __init__(self, chunks, delay=0.0, error=None, chunk_delay=0.01):
+        self.chunks = chunks
+        self.delay = delay
+        self.error = error
+        self.chunk_delay = chunk_delay
+        self.emitted = 0
+        self.closed = threading.Event()
+
+    def invoke(self, input, config=None, **kwargs):
+        return "".join(self.stream(input, config))
+
+    def stream(self, input, config=None, **kwargs):
+        try:
+            time.sleep(self.delay)
+            if self.error:
+                raise self.error
+            for chunk in self.chunks:
+                self.emitted += 1
+                yield chunk
+                time.sleep(self.chunk_delay)
+        finally:
+            self.closed.set()
+
+    async def astream(self, input, config=None, **kwargs):
+        try:
+            await asyncio.sleep(self.delay)
+            if self.error:
+                raise self.error
+            for chunk in self.chunks:
+                self.emitted += 1
+                yield chunk
+                await asyncio.sleep(self.chunk_delay)
+        finally:
+            self.closed.set()
+
+
+PRIMARY = ["primary ", "answer ", "that ", "arrives ", "late"]
+
+
+def hedged(primary, backup, stats):
+    return HedgedRunnable("rag", primary, backup, threshold=0.05, stats=stats)
+
+
+def test_fast_backup_wins_and_slow_primary_is_discarded():
+    stats = HedgeStats()
+    primary = FakeModel(PRIMARY, delay=0.3)
+    backup = FakeModel(["backup ", "answer"])
+    assert "".join(hedged(primary, backup, stats).stream("q")) == "backup answer"
+
+    assert primary.closed.wait(2)
+    assert primary.emitted <= 1  # stopped at its first chunk, which was never shown
+    counts = stats.stats()
+    assert counts["rag_hedged"] == 1
+    assert counts["rag_backup_win_rate"] == 1.0
+
+
+def test_fast_primary_is_not_hedged():
+    stats = HedgeStats()
+    backup = FakeModel(["backup"])
+    assert hedged(FakeModel(["primary"]), backup, stats).invoke("q") == "primary"
+    assert backup.emitted == 0
+    assert stats.stats()["rag_hedged"] == 0
+
+
+def test_primary_error_fails_over_to_backup():
+    stats = HedgeStats()
+    primary = FakeModel(PRIMARY, error=ConnectionError("provider down"))
+    assert "".join(hedged(primary, FakeModel(["backup"]), stats).stream("q")) == "backup"
+    assert stats.stats()["rag_failovers"] == 1
+
+
+def test_backup_error_falls_through_to_slow_primary():
+    stats = HedgeStats()
+    primary = FakeModel(["primary"], delay=0.2)
+    backup = FakeModel(["backup"], error=ConnectionError("provider down"))
+    assert "".join(hedged(primary, backup, stats).stream("q")) == "primary"
+    assert stats.stats()["rag_backup_win_rate"] == 0.0
+
+
+def test_both_failing_raises():
+    primary = FakeModel([], delay=0.1, error=ConnectionError("primary down"))
+    backup = FakeModel([], error=ConnectionError("backup down"))
+    with pytest.raises(ConnectionError):
+        list(hedged(primary, backup, HedgeStats()).stream("q"))
+
+
+def test_async_backup_wins_and_primary_is_cancelled():
+    stats = HedgeStats()
+    primary = FakeModel(PRIMARY, delay=0.3)
+    backup = FakeModel(["backup ", "answer"])
+
+    async def run():
+        chunks = [chunk async for chunk in hedged(primary, backup, stats).astream("q")]
+        await asyncio.sleep(0)  # let the cancelled task unwind
+        return chunks
+
+    assert "".join(asyncio.run(run())) == "backup answer"
+    assert primary.closed.is_set()
+    assert primary.emitted == 0
+    assert stats.stats()["rag_backup_win_rate"] == 1.0
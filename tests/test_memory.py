@@ -0,0 +1,78 @@
+import threading
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from utils.context import SUMMARY_MESSAGE_ID
+from utils.memory import SessionMemory, extractive_summary
+
+
+class FakeSummarizer:
+    """Summarizes a batch as the questions it contains; can fail or block on demand."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self, summary, messages, max_tokens):
+        self.gate.wait()
+        self.calls.append(len(messages))
+        if self.fail:
+            raise RuntimeError("summary model unavailable")
+        questions = [m.content for m in messages if isinstance(m, HumanMessage)]
+        return " | ".join(([summary] if summary else []) + questions)
+
+
+def add_turns(memory, n, start=0):
+    for i in range(start, start + n):
+        memory.add_turn(f"question {i}", f"answer {i}")
+
+
+def test_older_turns_are_folded_into_the_summary():
+    summarizer = FakeSummarizer()
+    memory = SessionMemory(summarizer=summarizer, recent_messages=4)
+    add_turns(memory, 4)
+    memory.wait(5)
+
+    messages = memory.messages()
+    assert messages[0].id == SUMMARY_MESSAGE_ID
+    assert "question 0 | question 1" in messages[0].content
+    assert [m.content for m in messages[1:]] == ["question 2", "answer 2", "question 3", "answer 3"]
+
+
+def test_window_stays_bounded():
+    memory = SessionMemory(summarizer=FakeSummarizer(), recent_messages=4)
+    for start in range(0, 30, 3):
+        add_turns(memory, 3, start)
+        memory.wait(5)
+    assert len(memory.messages()) == 5  # summary + two turns
+
+
+def test_evicted_turns_stay_verbatim_until_folded():
+    summarizer = FakeSummarizer()
+    summarizer.gate.clear()
+    memory = SessionMemory(summarizer=summarizer, recent_messages=2)
+    add_turns(memory, 2)
+    assert [m.content for m in memory.messages()] == ["question 0", "answer 0", "question 1", "answer 1"]
+    summarizer.gate.set()
+    memory.wait(5)
+    assert memory.messages()[0].content.endswith("question 0")
+
+
+def test_failed_summary_keeps_the_evicted_turns():
+    memory = SessionMemory(summarizer=FakeSummarizer(fail=True), recent_messages=2)
+    add_turns(memory, 2)
+    memory.wait(5)
+    messages = memory.messages()
+    assert memory.summary == ""
+    assert [m.content for m in messages] == ["question 0", "answer 0", "question 1", "answer 1"]
+
+
+def test_extractive_summary_keeps_first_sentences_within_budget():
+    messages = [HumanMessage("How do I loop over a dict?"),
+                AIMessage("Use .items(). It yields key and value pairs.\n```python\nfor k, v in d.items(): ...\n```")]
+    summary = extractive_summary("", messages, max_tokens=250)
+    assert summary.splitlines() == ["Student: How do I loop over a dict?", "TA: Use .items()."]
+    long = extractive_summary("", messages * 50, max_tokens=40)
+    assert len(long.splitlines()) < 100
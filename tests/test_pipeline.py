@@ -0,0 +1,22 @@
+from utils.pipeline import route_query
+from utils.router import RouteDecision
+
+
+class FakeRouter:
+    def should_shadow(self):
+        return False
+
+
+class RecordingHandler:
+    def record_route(self, tool, seconds, method):
+        self.route = (tool, seconds, method)
+
+
+def test_precomputed_local_decision_keeps_its_routing_latency():
+    handler = RecordingHandler()
+    decision = RouteDecision("course_information", "course_information", 0.9, "rule")
+    tool_calls = route_query(None, "when is assignment 3 due?", [], router=FakeRouter(), handler=handler,
+                             decision=decision, decision_seconds=0.25)
+    assert tool_calls[0]["name"] == "course_information"
+    assert handler.route[0] == "course_information"
+    assert handler.route[1] >= 0.25
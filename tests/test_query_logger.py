@@ -0,0 +1,105 @@
+import threading
+import time
+
+from utils.query_logger import QueryLogger
+
+
+class FakeCollection:
+    """insert_many that fails while down, and blocks while the gate is closed."""
+
+    def __init__(self, down=False):
+        self.down = down
+        self.gate = threading.Event()
+        self.gate.set()
+        self.documents = []
+        self.batches = []
+
+    def insert_many(self, documents, ordered=False):
+        self.gate.wait()
+        if self.down:
+            raise ConnectionError("cluster unreachable")
+        self.batches.append(len(documents))
+        self.documents.extend(documents)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def queries(collection):
+    return sorted(document["query"] for document in collection.documents)
+
+
+def make_logger(collection, tmp_path, **kwargs):
+    options = dict(spill_path=str(tmp_path / "spill.jsonl"), flush_interval=0.02, retry_interval=0.05)
+    options.update(kwargs)
+    return QueryLogger(collection, **options)
+
+
+def test_spilled_documents_are_replayed_once_after_recovery(tmp_path):
+    collection = FakeCollection(down=True)
+    logger = make_logger(collection, tmp_path)
+    for i in range(3):
+        logger.log(query=f"q{i}")
+    logger.flush()
+    assert collection.documents == []
+    assert logger.stats()["spilled"] == 3
+
+    collection.down = False
+    logger.log(query="q3")
+    wait_for(lambda: len(collection.documents) == 4)
+    time.sleep(0.2)  # later retries must not insert the spilled documents again
+    logger.close()
+
+    assert queries(collection) == ["q0", "q1", "q2", "q3"]
+    stats = logger.stats()
+    assert stats["replayed"] >= 3
+    assert stats["written"] + stats["replayed"] == 4
+    assert not (tmp_path / "spill.jsonl").exists()
+    assert "timestamp" in collection.documents[0] and "_id" not in collection.documents[0]
+
+
+def test_log_never_blocks_when_the_queue_is_full(tmp_path):
+    collection = FakeCollection()
+    collection.gate.clear()  # the writer is stuck inside insert_many
+    logger = make_logger(collection, tmp_path, max_queue_size=2)
+
+    start = time.perf_counter()
+    for i in range(20):
+        logger.log(query=f"q{i:02d}")
+    assert time.perf_counter() - start < 0.5
+    assert logger.stats()["spilled"] > 0
+
+    collection.gate.set()
+    logger.log(query="q20")
+    wait_for(lambda: len(collection.documents) == 21)
+    logger.close()
+    assert queries(collection) == [f"q{i:02d}" for i in range(21)]
+
+
+def test_queued_documents_are_written_in_batches(tmp_path):
+    collection = FakeCollection()
+    collection.gate.clear()
+    logger = make_logger(collection, tmp_path, batch_size=10)
+    logger.log(query="first")
+    time.sleep(0.1)  # the writer takes "first" and blocks on the gate
+    for i in range(25):
+        logger.log(query=f"q{i:02d}")
+    collection.gate.set()
+    logger.flush()
+    logger.close()
+
+    assert collection.batches == [1, 10, 10, 5]
+    assert logger.stats()["written"] == 26
+
+
+def test_documents_are_dropped_when_spilling_fails(tmp_path):
+    collection = FakeCollection(down=True)
+    logger = make_logger(collection, tmp_path, spill_path=str(tmp_path / "missing" / "spill.jsonl"))
+    logger.log(query="lost")
+    logger.flush()
+    logger.close()
+    assert logger.stats()["dropped"] == 1
@@ -0,0 +1,47 @@
+import numpy as np
+
+from utils.router import EXAMPLE_QUERIES, TOOL_NAMES, LocalRouter
+
+
+class FakeEmbeddings:
+    """Examples embed on their tool's axis; queries embed to the vectors given per test."""
+
+    def __init__(self, queries):
+        self.queries = queries
+
+    def embed_documents(self, texts):
+        return [self.queries[text] if text in self.queries else self._example(text) for text in texts]
+
+    @staticmethod
+    def _example(text):
+        tool = next(tool for tool, examples in EXAMPLE_QUERIES.items() if text in examples)
+        return np.eye(len(TOOL_NAMES))[TOOL_NAMES.index(tool)]
+
+
+def axis(tool, weight=1.0, other=None, other_weight=0.0):
+    vector = np.zeros(len(TOOL_NAMES))
+    vector[TOOL_NAMES.index(tool)] = weight
+    if other:
+        vector[TOOL_NAMES.index(other)] = other_weight
+    return vector
+
+
+def test_generic_explain_is_not_a_rule():
+    router = LocalRouter(FakeEmbeddings({}))
+    assert "explain_concept" not in router.match_rules("explain the assignment requirements")
+
+
+def test_rule_hit_confirmed_by_centroid_routes_locally():
+    query = "When are the office hours?"
+    router = LocalRouter(FakeEmbeddings({query: axis("course_information", 0.9, "general_chat", 0.4)}))
+    decision = router.route(query)
+    assert (decision.name, decision.method) == ("course_information", "rule")
+
+
+def test_rule_hit_contradicted_by_centroid_falls_back_to_llm():
+    query = "why does the grading of a decision tree split use entropy?"
+    router = LocalRouter(FakeEmbeddings({query: axis("explain_concept", 0.9, "course_information", 0.3)}))
+    decision = router.route(query)
+    assert decision.name is None
+    assert decision.method == "llm"
+    assert router.fallbacks == 1
@@ -0,0 +1,120 @@
+import itertools
+import threading
+import time
+
+import pytest
+from langchain_core.runnables import Runnable
+
+import utils.scheduler as scheduler
+from utils.scheduler import PRIORITIES, ModelScheduler, ScheduledRunnable
+
+_names = itertools.count()
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__("429 Too Many Requests")
+        headers = {"retry-after": retry_after} if retry_after is not None else {}
+        self.response = type("Response", (), {"headers": headers})()
+
+
+class FakeProvider(Runnable):
+    """Fails the first `failures` calls with a 429, optionally after yielding some chunks."""
+
+    def __init__(self, failures, retry_after=None, chunks_before_error=0):
+        self.failures = failures
+        self.retry_after = retry_after
+        self.chunks_before_error = chunks_before_error
+        self.calls = 0
+
+    def invoke(self, input, config=None, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RateLimited(self.retry_after)
+        return "answer"
+
+    def stream(self, input, config=None, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            yield from ["partial "][:self.chunks_before_error]
+            raise RateLimited(self.retry_after)
+        yield from ["an", "swer"]
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff sleeps instead of waiting; model pauses still apply, so delays stay tiny."""
+    slept = []
+    monkeypatch.setattr(scheduler, "BASE_DELAY", 0.001)
+    monkeypatch.setattr(scheduler.time, "sleep", slept.append)
+    return slept
+
+
+def scheduled(provider, **kwargs):
+    return ScheduledRunnable(provider, f"fake-model-{next(_names)}", **kwargs)
+
+
+def test_429_is_retried_honouring_retry_after(sleeps):
+    provider = FakeProvider(failures=2, retry_after="0.1")
+    runnable = scheduled(provider)
+    assert runnable.invoke("hi") == "answer"
+    assert provider.calls == 3
+    assert sleeps == [0.1, 0.1]
+    assert runnable.scheduler.stats()[f"{runnable.scheduler.name}_rate_limited"] == 2
+
+
+def test_gives_up_after_max_retries(sleeps):
+    provider = FakeProvider(failures=10)
+    with pytest.raises(RateLimited):
+        scheduled(provider, max_retries=2).invoke("hi")
+    assert provider.calls == 3
+    assert len(sleeps) == 2
+
+
+def test_other_errors_are_not_retried(sleeps):
+    class Broken(FakeProvider):
+        def invoke(self, input, config=None, **kwargs):
+            self.calls += 1
+            raise ValueError("bad request")
+
+    provider = Broken(failures=0)
+    with pytest.raises(ValueError):
+        scheduled(provider).invoke("hi")
+    assert provider.calls == 1 and sleeps == []
+
+
+def test_stream_retries_before_the_first_chunk(sleeps):
+    provider = FakeProvider(failures=1)
+    assert list(scheduled(provider).stream("hi")) == ["an", "swer"]
+    assert provider.calls == 2
+
+
+def test_stream_is_not_retried_after_the_first_chunk(sleeps):
+    provider = FakeProvider(failures=1, chunks_before_error=1)
+    chunks = []
+    with pytest.raises(RateLimited):
+        for chunk in scheduled(provider).stream("hi"):
+            chunks.append(chunk)
+    assert chunks == ["partial "]
+    assert provider.calls == 1
+
+
+def test_router_ticket_is_granted_before_a_queued_exercise_ticket():
+    model = ModelScheduler("fake-priority", requests_per_minute=1000, tokens_per_minute=1_000_000)
+    model.paused_until = time.monotonic() + 0.3  # e.g. backing off after a 429
+    granted = []
+
+    def call(tool):
+        model.acquire(PRIORITIES[tool], 10)
+        granted.append(tool)
+
+    exercise = threading.Thread(target=call, args=("exercise",))
+    exercise.start()
+    time.sleep(0.05)  # the exercise ticket is queued first
+    router = threading.Thread(target=call, args=("router",))
+    router.start()
+    exercise.join(5)
+    router.join(5)
+    assert granted == ["router", "exercise"]
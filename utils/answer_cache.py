@@ -0,0 +1,202 @@
+"""
+Semantic answer cache for repeated student questions.
+
+Answers are keyed by tool and by the embedding of the normalized query, so
+near-identical questions ("how do I contact the professor?") can be replayed
+without another LLM call. A semantic match also needs the same numbers in
+both queries, so "assignment 3" never gets the answer cached for "assignment 4".
+"""
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.course_metadata import WORD_NUMBERS
+
+# Cached tools are answered without the chat history, so their answers depend only on the
+# query and the knowledge base; explain_concept answers build on the conversation and are not cached
+CACHEABLE_TOOLS = ("course_information",)
+
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_TTL = 6 * 60 * 60  # seconds
+DEFAULT_MAX_ENTRIES = 512
+KB_CHECK_INTERVAL = 30  # seconds between knowledge base fingerprint checks
+KB_VERSION_FILE = 'kb_version.json'  # written by utils.ingest
+# "assignment 3" and "assignment 4" embed almost identically; a semantic match needs the same numbers
+NUMBER_RE = re.compile(r"\b(\d+|" + "|".join(WORD_NUMBERS) + r")\b")
+
+
+def normalize_query(query: str) -> str:
+    """Lowercase the query and drop punctuation and repeated whitespace."""
+    query = re.sub(r"[^\w\s]", " ", query.lower())
+    return " ".join(query.split())
+
+
+def number_tokens(query: str) -> frozenset:
+    """Numbers mentioned in the query, with number words ("third", "five") as digits."""
+    return frozenset(str(WORD_NUMBERS.get(token) or int(token))
+                     for token in NUMBER_RE.findall(normalize_query(query)))
+
+
+def kb_fingerprint(db_path: str) -> tuple:
+    """Return a cheap fingerprint (name, size, mtime) of the files under db_path."""
+    entries = []
+    for root, _, files in os.walk(db_path):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((os.path.relpath(path, db_path), stat.st_size, stat.st_mtime_ns))
+    return tuple(sorted(entries))
+
+
+def kb_version(db_path: str):
+    """Return the version stamp written by the last ingest into db_path, or None."""
+    try:
+        with open(os.path.join(db_path, KB_VERSION_FILE), encoding='utf-8') as f:
+            return json.load(f)["version"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def replay_stream(answer: str):
+    """Yield a cached answer word by word so it renders like a live stream."""
+    for chunk in re.findall(r"\S+\s*|\s+", answer):
+        yield chunk
+
+
+class SemanticAnswerCache:
+    """LRU + TTL cache of answers, matched by cosine similarity of query embeddings."""
+
+    def __init__(self, embeddings, db_path, threshold=DEFAULT_THRESHOLD,
+                 ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.embeddings = embeddings
+        self.db_path = db_path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        # (tool, normalized query) -> (vector, answer, created_at)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._fingerprint = kb_fingerprint(db_path)
+        self._last_kb_check = time.monotonic()
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _embed(self, text):
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _check_kb(self):
+        """Drop every entry if the knowledge base on disk has changed."""
+        now = time.monotonic()
+        if now - self._last_kb_check < KB_CHECK_INTERVAL:
+            return
+        self._last_kb_check = now
+        fingerprint = kb_fingerprint(self.db_path)
+        if fingerprint != self._fingerprint:
+            self._fingerprint = fingerprint
+            self.clear()
+            self.invalidations += 1
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl
+        for key in [k for k, (_, _, created) in self._entries.items() if created < cutoff]:
+            del self._entries[key]
+
+    def get(self, tool, query):
+        """Return (answer, vector) for the closest cached query, answer is None on a miss."""
+        self._check_kb()
+        key = (tool, normalize_query(query))
+
+        with self._lock:
+            self._purge_expired()
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][1], self._entries[key][0]
+
+        vector = self._embed(key[1])
+        numbers = number_tokens(key[1])
+        with self._lock:
+            candidates = [(k, v) for k, v in self._entries.items()
+                          if k[0] == tool and number_tokens(k[1]) == numbers]
+            if candidates:
+                matrix = np.stack([entry[0] for _, entry in candidates])
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    best_key = candidates[best][0]
+                    self._entries.move_to_end(best_key)
+                    self.hits += 1
+                    return self._entries[best_key][1], vector
+            self.misses += 1
+        return None, vector
+
+    def put(self, tool, query, answer, vector=None):
+        """Store an answer, evicting the least recently used entry when full."""
+        key = (tool, normalize_query(query))
+        if vector is None:
+            vector = self._embed(key[1])
+        with self._lock:
+            self._entries[key] = (vector, answer, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stream_through(self, tool, query, make_stream):
+        """Replay a cached answer, or stream a fresh one and cache it once complete."""
+        answer, vector = self.get(tool, query)
+        if answer is not None:
+            print(f"Answer cache hit for {tool}: {query}")
+            yield from replay_stream(answer)
+            return
+
+        chunks = []
+        for chunk in make_stream():
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            self.put(tool, query, "".join(chunks), vector)
+
+    async def astream_through(self, tool, query, make_stream):
+        """Async stream_through; make_stream returns an async iterator of chunks."""
+        answer, vector = await asyncio.to_thread(self.get, tool, query)
+        if answer is not None:
+            print(f"Answer cache hit for {tool}: {query}")
+            for chunk in replay_stream(answer):
+                yield chunk
+            return
+
+        chunks = []
+        async for chunk in make_stream():
+            chunks.append(chunk)
+            yield chunk
+        if chunks:
+            self.put(tool, query, "".join(chunks), vector)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "invalidations": self.invalidations,
+        }
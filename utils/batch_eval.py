@@ -0,0 +1,166 @@
+"""
+Batch evaluation: run a question bank through the TA pipeline for review.
+
+Queries are read from a CSV (a "query" column, optional "id") or JSONL
+({"query": ..., "id": ...}) file and processed in chunks. Each chunk is
+routed with the tool-bound router's .batch(), grouped by the chosen tool,
+and each tool's chain is run with .batch() under max_concurrency. Every call
+still goes through the per-model scheduler, so throughput scales with
+--concurrency while staying within the provider rate budgets.
+
+Answers are appended to the output JSONL after every chunk. On restart the
+output is rewritten with only the records answered without error; those ids
+are skipped, so an interrupted run resumes where it stopped and queries that
+failed are retried.
+No chat history, answer cache or exercise pool is used: every answer is
+generated fresh.
+
+Usage:
+    python -m utils.batch_eval questions.csv --output data/batch_answers.jsonl [--concurrency 8]
+"""
+
+import argparse
+import csv
+import json
+import os
+import time
+from collections import Counter, defaultdict
+
+from utils.pipeline import TOOL_CHAINS, router_input, tool_input
+
+BATCH_CONCURRENCY = int(os.getenv("VTA_BATCH_CONCURRENCY", "8"))
+CHUNK_SIZE = 100  # queries per checkpoint
+
+
+def read_queries(path):
+    """Return [(id, query)] from a CSV or JSONL file; ids default to the row number."""
+    with open(path, encoding='utf-8', newline='') as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    queries = []
+    for i, row in enumerate(rows):
+        query = (row.get("query") or "").strip()
+        if query:
+            queries.append((str(row.get("id") or i), query))
+    return queries
+
+
+def resume(path):
+    """Keep only the records answered without error in an earlier (possibly interrupted) run.
+
+    The output is rewritten without failed records, which are retried, and
+    without a partial last line left by a killed run, so appending starts on
+    a fresh line. Returns the ids already answered.
+    """
+    if not os.path.exists(path):
+        return set()
+    kept = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # partial last line of an interrupted write
+            if "error" not in record and "id" in record:
+                kept[record["id"]] = line if line.endswith("\n") else line + "\n"
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.writelines(kept.values())
+    os.replace(tmp_path, path)
+    return set(kept)
+
+
+def route_batch(agent, queries, concurrency, router=None):
+    """Return one (tool call, method) per query; the local router handles confident queries first."""
+    routes = [None] * len(queries)
+    if router is not None:
+        for i, (_, query) in enumerate(queries):
+            decision = router.route(query)
+            if decision.name is not None:
+                routes[i] = (decision.tool_calls(query)[0], decision.method)
+
+    pending = [i for i, route in enumerate(routes) if route is None]
+    results = agent.batch([router_input(queries[i][1], []) for i in pending],
+                          config={"max_concurrency": concurrency, "tags": ["router"]}, return_exceptions=True)
+    for i, result in zip(pending, results):
+        if not isinstance(result, Exception) and not result.tool_calls:
+            result = ValueError("router returned no tool call")
+        routes[i] = (result if isinstance(result, Exception) else result.tool_calls[0], "llm")
+    return routes
+
+
+def answer_batch(chains_dict, queries, routes, concurrency):
+    """Run each tool's chain over its queries with .batch(); returns one output record per query."""
+    records = [None] * len(queries)
+    by_tool = defaultdict(list)
+    for i, ((query_id, query), (tool_call, method)) in enumerate(zip(queries, routes)):
+        record = {"id": query_id, "query": query, "tool": None, "args": None, "route": method}
+        records[i] = record
+        if isinstance(tool_call, Exception):
+            record["error"] = f"routing failed: {tool_call}"
+        elif tool_call["name"] not in TOOL_CHAINS:
+            record["error"] = f"invalid tool {tool_call['name']}"
+        else:
+            record.update(tool=tool_call["name"], args=tool_call["args"])
+            by_tool[tool_call["name"]].append(i)
+
+    for tool, indices in by_tool.items():
+        start = time.perf_counter()
+        answers = chains_dict[TOOL_CHAINS[tool]].batch(
+            [tool_input(tool, records[i]["args"], []) for i in indices],
+            config={"max_concurrency": concurrency, "tags": ["batch_eval"]}, return_exceptions=True)
+        for i, answer in zip(indices, answers):
+            if isinstance(answer, Exception):
+                records[i]["error"] = str(answer)
+            else:
+                records[i]["answer"] = answer
+        print(f"  {tool}: {len(indices)} answers in {time.perf_counter() - start:.1f}s")
+    return records
+
+
+def run(agent, chains_dict, queries, output, concurrency=BATCH_CONCURRENCY, chunk_size=CHUNK_SIZE, router=None):
+    """Answer the queries not yet in output, appending records after every chunk; returns per-tool counts."""
+    done = resume(output)
+    todo = [(query_id, query) for query_id, query in queries if query_id not in done]
+    print(f"{len(queries)} queries, {len(queries) - len(todo)} already answered, {len(todo)} to run")
+
+    counts = Counter()
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, 'a', encoding='utf-8') as f:
+        for offset in range(0, len(todo), chunk_size):
+            chunk = todo[offset:offset + chunk_size]
+            start = time.perf_counter()
+            records = answer_batch(chains_dict, chunk, route_batch(agent, chunk, concurrency, router),
+                                   concurrency)
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                counts[record["tool"] if "error" not in record else "error"] += 1
+            f.flush()
+            print(f"Answered {offset + len(chunk)}/{len(todo)} "
+                  f"({len(chunk) / (time.perf_counter() - start):.1f} queries/s)")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a question bank through the TA pipeline in parallel batches.")
+    parser.add_argument("input", help="CSV with a 'query' column, or JSONL with a 'query' field")
+    parser.add_argument("--output", default='data/batch_answers.jsonl', help="JSONL results, resumed if present")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="queries per checkpoint")
+    parser.add_argument("--local-router", action="store_true", help="route confident queries with the local router")
+    args = parser.parse_args()
+
+    from utils.pipeline import build_chains
+    from utils.utils import load_retriever, load_router
+
+    agent, chains_dict = build_chains(load_retriever())
+    start = time.perf_counter()
+    counts = run(agent, chains_dict, read_queries(args.input), args.output, args.concurrency, args.chunk_size,
+                 router=load_router(shadow_rate=0.0) if args.local_router else None)
+    print(f"Done in {time.perf_counter() - start:.1f}s: {dict(counts)}")
+
+
+if __name__ == '__main__':
+    main()
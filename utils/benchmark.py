@@ -0,0 +1,296 @@
+"""
+Offline stage-level benchmark of the TA pipeline.
+
+Swaps the model clients in utils/llm_models and the knowledge base embeddings
+for deterministic fakes with configurable latency and tokens/sec, then drives
+routing -> call_function -> stream consumption over a corpus of
+representative queries. Per-stage timings are reported as p50/p95/p99 and
+written to JSON; pass --baseline to fail on regressions against an earlier run.
+
+Usage:
+    python -m utils.benchmark --output data/benchmark.json
+    python -m utils.benchmark --baseline data/benchmark.json
+"""
+
+import argparse
+import contextvars
+import json
+import math
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Any, Iterator, List, Optional
+
+from langchain_community.vectorstores import Chroma
+from langchain_core.embeddings import DeterministicFakeEmbedding, Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+import utils.llm_models as llms
+import utils.registry as registry
+from utils.embedding_cache import CachedEmbeddings
+from utils.hybrid_retriever import HybridRetriever
+from utils.pipeline import build_chains, call_function, route_query
+from utils.router import ROUTING_RULES, LocalRouter
+
+KB_DB_PATH = 'data/chroma_db'
+STAGES = ("routing", "retrieval", "prompt_build", "time_to_first_token", "total")
+
+BENCHMARK_QUERIES = [
+    "How can I contact the professor?",
+    "When are the office hours?",
+    "What is the late policy for assignments?",
+    "How is the final grade calculated?",
+    "What's a parameter in Python function",
+    "Explain list comprehension with a business example",
+    "What is the difference between a list and a tuple?",
+    "How to use my own module in Colab?",
+    "Give me a practice question on Python functions",
+    "Quiz me on pandas groupby",
+    "I get NameError: name 'revenue' is not defined, how to fix it?",
+    "TypeError: can only concatenate str (not \"int\") to str",
+    "My loop is not working, it prints nothing",
+    "Hi, I'm Lili",
+    "Thanks for your help!",
+]
+
+# per-query timing marks, visible to model calls made on hedging worker threads
+_clock = contextvars.ContextVar("benchmark_clock")
+
+
+def _mark_model_started():
+    marks = _clock.get(None)
+    if marks is not None:
+        marks["model_started"] = time.perf_counter()
+
+
+def _pick_tool(text):
+    """Deterministic stand-in for the LLM router: first tool whose rules match."""
+    # the router prompt mentions "<query> tags" before the real query block
+    query = text.rsplit("<query>", 1)[-1].split("</query>", 1)[0]
+    for tool, patterns in ROUTING_RULES.items():
+        if any(re.search(p, query, re.IGNORECASE) for p in patterns):
+            return tool, query
+    return "general_chat", query
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model with configurable time-to-first-token and tokens/sec."""
+
+    latency: float = 0.5
+    tokens_per_sec: float = 50.0
+    answer_tokens: int = 100
+    tool_names: List[str] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-benchmark"
+
+    def bind_tools(self, tools, tool_choice=None, **kwargs):
+        return self.model_copy(update={"tool_names": [getattr(t, "name", str(t)) for t in tools]})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        _mark_model_started()
+        time.sleep(self.latency)
+        if self.tool_names:
+            tool, query = _pick_tool(messages[-1].content)
+            message = AIMessage(content="", tool_calls=[
+                {"name": tool, "args": {"query": query}, "id": "bench"}])
+        else:
+            time.sleep(self.answer_tokens / self.tokens_per_sec)
+            message = AIMessage(content=" ".join(f"tok{i}" for i in range(self.answer_tokens)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Any = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        _mark_model_started()
+        time.sleep(self.latency)
+        for i in range(self.answer_tokens):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=f"tok{i} "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+            time.sleep(1 / self.tokens_per_sec)
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic embeddings with a fixed per-request latency."""
+
+    def __init__(self, size=1536, latency=0.1):
+        self.embeddings = DeterministicFakeEmbedding(size=size)
+        self.latency = latency
+
+    def embed_documents(self, texts):
+        time.sleep(self.latency)
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self.embeddings.embed_query(text)
+
+
+class _Prefetched:
+    """Documents already retrieved for the benchmark's retrieval stage."""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    def documents_for(self, query):
+        return self.documents
+
+
+def percentile(values, p):
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def install_fakes(args, workdir):
+    """Replace every model client and the KB embeddings with fakes, return the retriever."""
+    router_model = FakeChatModel(latency=args.router_latency, tokens_per_sec=args.tokens_per_sec,
+                                 answer_tokens=args.answer_tokens)
+    answer_model = FakeChatModel(latency=args.llm_latency, tokens_per_sec=args.tokens_per_sec,
+                                 answer_tokens=args.answer_tokens)
+    overrides = {name: answer_model for name in llms.MODEL_CONFIGS}
+    overrides['openai_gpt4o_mini'] = router_model
+    llms.override_models(overrides)
+    registry.clear()
+
+    # Chroma rewrites its files on open, so work on a copy of the KB
+    db_path = os.path.join(workdir, "chroma_db")
+    shutil.copytree(args.db_path, db_path)
+    embeddings = CachedEmbeddings(FakeEmbeddings(latency=args.embedding_latency),
+                                  model_name="fake", cache_path=os.path.join(workdir, "embeddings.sqlite3"))
+    db = Chroma(persist_directory=db_path, embedding_function=embeddings)
+    return HybridRetriever.from_vectorstore(db), embeddings
+
+
+def run_query(agent, chains_dict, retriever, query, router=None):
+    """Run one query through the pipeline and return its stage timings in seconds."""
+    timings = {}
+    start = time.perf_counter()
+    tool_calls = route_query(agent, query, [], router=router)
+    timings["routing"] = time.perf_counter() - start
+    name, args = tool_calls[0]["name"], tool_calls[0]["args"]
+
+    prefetched = None
+    if name == "course_information":
+        retrieval_start = time.perf_counter()
+        prefetched = _Prefetched(retriever.invoke(args["query"]))
+        timings["retrieval"] = time.perf_counter() - retrieval_start
+
+    marks = {}
+    _clock.set(marks)
+    call_start = time.perf_counter()
+    first_token = None
+    for _ in call_function(name, args, [], chains_dict, prefetched=prefetched):
+        if first_token is None:
+            first_token = time.perf_counter()
+    end = time.perf_counter()
+
+    if marks.get("model_started") is not None:
+        timings["prompt_build"] = marks["model_started"] - call_start
+    if first_token is not None:
+        timings["time_to_first_token"] = first_token - start
+    timings["total"] = end - start
+    return name, timings
+
+
+def run_benchmark(args):
+    queries = BENCHMARK_QUERIES
+    if args.queries:
+        with open(args.queries, encoding='utf-8') as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    samples = defaultdict(list)
+    tools = Counter()
+    with tempfile.TemporaryDirectory() as workdir:
+        retriever, embeddings = install_fakes(args, workdir)
+        agent, chains_dict = build_chains(retriever)
+        router = LocalRouter(embeddings) if args.local_router else None
+
+        for _ in range(args.repeat):
+            for query in queries:
+                tool, timings = run_query(agent, chains_dict, retriever, query, router=router)
+                tools[tool] += 1
+                for stage, seconds in timings.items():
+                    samples[stage].append(seconds)
+
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")},
+        "queries": len(queries) * args.repeat,
+        "tools": dict(tools),
+        "stages": {
+            stage: {
+                "n": len(samples[stage]),
+                "p50": percentile(samples[stage], 50),
+                "p95": percentile(samples[stage], 95),
+                "p99": percentile(samples[stage], 99),
+            }
+            for stage in STAGES if samples[stage]
+        },
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return a description of every stage whose p50/p95 regressed beyond tolerance."""
+    regressions = []
+    for stage, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(stage)
+        if not previous:
+            continue
+        for p in ("p50", "p95"):
+            # 1 ms slack so near-zero stages don't flap
+            if current[p] > previous[p] * (1 + tolerance) + 0.001:
+                regressions.append(f"{stage} {p}: {previous[p] * 1000:.1f} ms -> {current[p] * 1000:.1f} ms")
+    return regressions
+
+
+def print_report(results):
+    print(f"{results['queries']} queries, tools: {results['tools']}")
+    print(f"{'stage':<22}{'n':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for stage, stats in results["stages"].items():
+        print(f"{stage:<22}{stats['n']:>5}{stats['p50'] * 1000:>10.1f}"
+              f"{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stage-level benchmark with fake LLMs and embeddings.")
+    parser.add_argument("--queries", help="file with one query per line (default: built-in corpus)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--db-path", default=KB_DB_PATH)
+    parser.add_argument("--router-latency", type=float, default=0.4, help="seconds before the router answers")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="seconds before the first answer token")
+    parser.add_argument("--tokens-per-sec", type=float, default=60.0)
+    parser.add_argument("--answer-tokens", type=int, default=120)
+    parser.add_argument("--embedding-latency", type=float, default=0.1)
+    parser.add_argument("--local-router", action="store_true", help="route with the local fast-path router")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
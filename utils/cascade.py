@@ -0,0 +1,142 @@
+"""
+Model cascade: answer with a small model first, escalate only when needed.
+
+The small model's answer is buffered and checked locally (truncation, code
+fences, a well-formed four-option MCQ). Answers that pass are replayed as a
+stream; the rest are regenerated by the large model. Escalation rates are
+tracked per tool.
+
+Trade-off: the checks need the whole answer, so nothing reaches the student
+until the small model has finished. Cascaded tools give up time to first
+token (the small model's full generation time, instead of its first token)
+in exchange for the cheaper model and for never streaming an answer that is
+then replaced. The cascade is therefore off by default and enabled per tool
+with VTA_CASCADE_TOOLS (e.g. "explain,exercise").
+
+Background calls tagged "exercise_pool" (pool refills) are counted under
+"<tool>_pool" so they do not skew the live escalation rates.
+"""
+
+import re
+import threading
+
+from langchain_core.runnables import Runnable
+
+from utils.answer_cache import replay_stream
+from utils.context import count_tokens
+
+# tool -> (small model, large model), both names from llm_models.MODEL_CONFIGS
+CASCADE_MODELS = {
+    "explain": ("openai_gpt4o_mini", "openai_gpt4o"),
+    "exercise": ("claude_haiku", "claude_sonnet"),
+}
+
+OPTION_RE = re.compile(r"^\s*(?:[-*]\s*)?(?:\*\*)?\(?([A-D])[\).:]", re.MULTILINE)
+POOL_TAG = "exercise_pool"  # tag on exercise pool refill calls
+ANSWER_REQUEST_RE = re.compile(r"\b(answer|solution|correct|check)\b", re.IGNORECASE)
+
+
+def looks_truncated(answer, max_tokens=None):
+    """An unclosed code fence, or an answer that ran into the model's token limit."""
+    if answer.count("```") % 2:
+        return True
+    return bool(max_tokens) and count_tokens(answer) >= 0.95 * max_tokens
+
+
+def check_explain(answer, input, max_tokens=None):
+    """Explanations must be complete and include a code snippet."""
+    return not looks_truncated(answer, max_tokens) and "```" in answer
+
+
+def check_exercise(answer, input, max_tokens=None):
+    """New exercises must be complete four-option (A-D) multiple choice questions."""
+    if looks_truncated(answer, max_tokens):
+        return False
+    if ANSWER_REQUEST_RE.search(input.get("query", "")):
+        return True
+    return set(OPTION_RE.findall(answer)) == {"A", "B", "C", "D"}
+
+
+CHECKS = {
+    "explain": check_explain,
+    "exercise": check_exercise,
+}
+
+
+class EscalationStats:
+    """Per-tool counts of cascade requests and escalations."""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, tool, escalated):
+        with self._lock:
+            counts = self._counts.setdefault(tool, {"requests": 0, "escalated": 0})
+            counts["requests"] += 1
+            counts["escalated"] += int(escalated)
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for tool, counts in self._counts.items():
+                result[f"{tool}_requests"] = counts["requests"]
+                result[f"{tool}_escalated"] = counts["escalated"]
+                result[f"{tool}_escalation_rate"] = counts["escalated"] / counts["requests"]
+            return result
+
+
+escalation_stats = EscalationStats()
+
+
+class CascadeChain(Runnable):
+    """Run the small chain, fall back to the large chain when the check fails."""
+
+    def __init__(self, tool, small, large, check, max_tokens=None, stats=escalation_stats):
+        self.tool = tool
+        self.small = small
+        self.large = large
+        self.check = check
+        self.max_tokens = max_tokens
+        self.stats = stats
+
+    def _accept(self, answer, input, config=None):
+        try:
+            accepted = self.check(answer, input, self.max_tokens)
+        except Exception as e:
+            print(f"Cascade check failed for {self.tool}: {e}")
+            accepted = False
+        background = POOL_TAG in ((config or {}).get("tags") or [])
+        self.stats.record(f"{self.tool}_pool" if background else self.tool, not accepted)
+        if not accepted:
+            print(f"Cascade escalated {self.tool}")
+        return accepted
+
+    def invoke(self, input, config=None, **kwargs):
+        answer = self.small.invoke(input, config)
+        if self._accept(answer, input, config):
+            return answer
+        return self.large.invoke(input, config)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        answer = await self.small.ainvoke(input, config)
+        if self._accept(answer, input, config):
+            return answer
+        return await self.large.ainvoke(input, config)
+
+    def stream(self, input, config=None, **kwargs):
+        # the small answer must be checked before any of it is shown
+        answer = self.small.invoke(input, config)
+        if self._accept(answer, input, config):
+            yield from replay_stream(answer)
+        else:
+            yield from self.large.stream(input, config)
+
+    async def astream(self, input, config=None, **kwargs):
+        answer = await self.small.ainvoke(input, config)
+        if self._accept(answer, input, config):
+            for chunk in replay_stream(answer):
+                yield chunk
+        else:
+            async for chunk in self.large.astream(input, config):
+                yield chunk
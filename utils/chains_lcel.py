@@ -3,9 +3,10 @@
 # Created 2/21/2024
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableParallel, RunnablePassthrough
+from langchain_core.runnables import RunnableBranch, RunnableParallel, RunnablePassthrough
 from operator import itemgetter
 from langchain_core.messages import SystemMessage, HumanMessage,AIMessage
+from utils.context import TOKEN_BUDGETS, assemble_context
 
 output_parser = StrOutputParser()
 
@@ -155,7 +156,7 @@ def code_chain(llm):
     return chain
 
 # 3b. Setup LLMChain & prompts for RAG answer generation
-def rag_chain(llm, retriever):
+def rag_chain(llm, retriever, context_tokens=TOKEN_BUDGETS["course_information"]["context"]):
     prompt = ChatPromptTemplate.from_messages([
         SystemMessage(content="""
     You are a virtual TA Peyton for an introductory Python coding class in Goizueta Business School. Your task is to answer following query based on relevant context retrieved from a database for course contents.
@@ -171,15 +172,25 @@ def rag_chain(llm, retriever):
         ("human", "{query}")]
     )
 
+    # use documents passed in as "context" (speculative prefetch), else retrieve
+    retrieve = RunnableBranch(
+        (lambda x: x.get("context") is not None, itemgetter("context")),
+        itemgetter("query") | retriever,
+    )
+
     setup_retrieval = RunnableParallel(
         {
-        "context": itemgetter("query") | retriever,
+        "context": retrieve,
         "query": itemgetter("query"),
         "chat_history": itemgetter("chat_history"),
         }
     )
 
-    return setup_retrieval | prompt | llm | output_parser
+    # render the retrieved documents as compact text within the token budget
+    assemble = RunnablePassthrough.assign(
+        context=lambda x: assemble_context(x["context"], x["query"], context_tokens))
+
+    return setup_retrieval | assemble | prompt | llm | output_parser
 
 # 
 # 3d. define chat history chain
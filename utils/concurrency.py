@@ -0,0 +1,106 @@
+"""
+Concurrency limits for the async request path.
+
+Model calls made through ainvoke/astream hold a per-provider semaphore
+(OpenAI vs Anthropic), and whole requests hold a slot under a global
+in-flight cap. Under overload requests queue for a slot instead of piling
+up, and are rejected with Overloaded once they have waited QUEUE_TIMEOUT.
+The sync path (Streamlit) passes straight through.
+"""
+
+import asyncio
+import os
+import time
+
+from langchain_core.runnables import Runnable
+
+PROVIDER_LIMITS = {
+    "openai": int(os.getenv("VTA_OPENAI_CONCURRENCY", "32")),
+    "anthropic": int(os.getenv("VTA_ANTHROPIC_CONCURRENCY", "16")),
+}
+GLOBAL_LIMIT = int(os.getenv("VTA_MAX_IN_FLIGHT", "64"))
+QUEUE_TIMEOUT = float(os.getenv("VTA_QUEUE_TIMEOUT", "30"))  # seconds
+
+
+class Overloaded(Exception):
+    """Raised when a request waited longer than the queue timeout for a slot."""
+
+
+class ConcurrencyLimiter:
+    """Per-provider semaphores for model calls plus a global cap on requests in flight."""
+
+    def __init__(self, provider_limits=PROVIDER_LIMITS, global_limit=GLOBAL_LIMIT, queue_timeout=QUEUE_TIMEOUT):
+        self.provider_limits = dict(provider_limits)
+        self.global_limit = global_limit
+        self.queue_timeout = queue_timeout
+        self._semaphores = {}
+        self._in_flight = {}
+        self._waiting = {}
+        self.rejected = 0
+        self.wait_seconds = 0.0
+
+    def _semaphore(self, name):
+        # created on first use so they bind to the serving event loop
+        if name not in self._semaphores:
+            limit = self.global_limit if name == "requests" else self.provider_limits.get(name, self.global_limit)
+            self._semaphores[name] = asyncio.Semaphore(limit)
+        return self._semaphores[name]
+
+    async def acquire(self, name):
+        """Wait for a slot under name ("requests" or a provider), raising Overloaded on timeout."""
+        start = time.perf_counter()
+        self._waiting[name] = self._waiting.get(name, 0) + 1
+        try:
+            await asyncio.wait_for(self._semaphore(name).acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Overloaded(f"no {name} slot available after {self.queue_timeout:.0f}s")
+        finally:
+            self._waiting[name] -= 1
+            self.wait_seconds += time.perf_counter() - start
+        self._in_flight[name] = self._in_flight.get(name, 0) + 1
+
+    def release(self, name):
+        self._in_flight[name] -= 1
+        self._semaphore(name).release()
+
+    def stats(self):
+        result = {"rejected": self.rejected, "wait_seconds_total": self.wait_seconds}
+        for name in self._semaphores:
+            result[f"{name}_in_flight"] = self._in_flight.get(name, 0)
+            result[f"{name}_waiting"] = self._waiting.get(name, 0)
+        return result
+
+
+# process-wide limiter shared by every conversation
+limiter = ConcurrencyLimiter()
+
+
+class LimitedRunnable(Runnable):
+    """Hold a provider slot for the whole duration of async calls to the wrapped runnable."""
+
+    def __init__(self, runnable, provider, limiter=limiter):
+        self.runnable = runnable
+        self.provider = provider
+        self.limiter = limiter
+
+    def invoke(self, input, config=None, **kwargs):
+        return self.runnable.invoke(input, config, **kwargs)
+
+    def stream(self, input, config=None, **kwargs):
+        yield from self.runnable.stream(input, config, **kwargs)
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        await self.limiter.acquire(self.provider)
+        try:
+            return await self.runnable.ainvoke(input, config, **kwargs)
+        finally:
+            self.limiter.release(self.provider)
+
+    async def astream(self, input, config=None, **kwargs):
+        await self.limiter.acquire(self.provider)
+        try:
+            async for chunk in self.runnable.astream(input, config, **kwargs):
+                yield chunk
+        finally:
+            self.limiter.release(self.provider)
@@ -0,0 +1,141 @@
+"""
+Token-budgeted context assembly for prompts.
+
+Retrieved chunks are cleaned of metadata noise, deduplicated and trimmed to
+the sentences most relevant to the query; chat history is truncated by
+tokens instead of by message count. Each tool gets its own budget, so prompt
+size (and with it prefill latency and cost) stays predictable.
+"""
+
+import re
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken missing or its encoding file unavailable offline
+    _encoding = None
+
+# per-tool token budgets for the retrieved context, the chat history and the query
+TOKEN_BUDGETS = {
+    "course_information": {"context": 800, "history": 400, "query": 200},
+    "explain_concept": {"history": 600, "query": 400},
+    "generate_exercise": {"history": 900, "query": 400},
+    "debug_code": {"history": 0, "query": 1200},
+    "general_chat": {"history": 600, "query": 300},
+}
+ROUTER_HISTORY_TOKENS = 300
+# id of the rolling summary message that utils.memory puts ahead of the recent turns
+SUMMARY_MESSAGE_ID = "conversation-summary"
+DUPLICATE_THRESHOLD = 0.8
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def count_tokens(text):
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def truncate_text(text, max_tokens):
+    """Keep the head and tail of text within max_tokens (tracebacks live at the end)."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    marker = "\n...\n"
+    if _encoding is not None:
+        tokens = _encoding.encode(text, disallowed_special=())
+        head = max_tokens // 2
+        tail = max_tokens - head - count_tokens(marker)
+        return _encoding.decode(tokens[:head]) + marker + _encoding.decode(tokens[-tail:] if tail > 0 else [])
+    # the fallback counts 4 characters per token, marker included
+    chars = max_tokens * 4 - len(marker)
+    if chars <= 0:
+        return text[:max_tokens * 4]
+    head = chars // 2
+    return text[:head] + marker + text[len(text) - (chars - head):]
+
+
+def clean_chunk(text):
+    """Strip byte-order marks and repeated whitespace from a chunk."""
+    text = text.replace("\ufeff", "")
+    return "\n".join(" ".join(line.split()) for line in text.splitlines() if line.strip())
+
+
+def _words(text):
+    return set(WORD_RE.findall(text.lower()))
+
+
+def dedupe_chunks(chunks, threshold=DUPLICATE_THRESHOLD):
+    """Drop chunks whose words are mostly contained in an earlier chunk."""
+    kept, kept_words = [], []
+    for chunk in chunks:
+        words = _words(chunk)
+        if any(words and len(words & other) / len(words) >= threshold for other in kept_words):
+            continue
+        kept.append(chunk)
+        kept_words.append(words)
+    return kept
+
+
+def relevant_sentences(text, query, max_tokens):
+    """Keep the sentences sharing the most words with query, in their original order."""
+    sentences = [s for s in SENTENCE_RE.split(text) if s.strip()]
+    query_words = _words(query)
+    ranked = sorted(range(len(sentences)),
+                    key=lambda i: len(_words(sentences[i]) & query_words), reverse=True)
+    chosen, used = [], 0
+    for i in ranked:
+        tokens = count_tokens(sentences[i])
+        if used + tokens > max_tokens:
+            continue
+        chosen.append(i)
+        used += tokens
+    # token counts are not additive across the joining spaces: drop the least relevant until it fits
+    while chosen and count_tokens(" ".join(sentences[i] for i in sorted(chosen))) > max_tokens:
+        chosen.pop()
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+
+def assemble_context(documents, query, max_tokens=TOKEN_BUDGETS["course_information"]["context"]):
+    """Render retrieved documents as compact, deduplicated text within max_tokens."""
+    chunks = dedupe_chunks([clean_chunk(doc.page_content) for doc in documents])
+    parts = []
+    for chunk in chunks:
+        # the separators count towards the budget too
+        remaining = max_tokens - (count_tokens("\n\n".join(parts) + "\n\n") if parts else 0)
+        if remaining <= 0:
+            break
+        if count_tokens(chunk) > remaining:
+            chunk = relevant_sentences(chunk, query, remaining)
+        if chunk and count_tokens("\n\n".join(parts + [chunk])) <= max_tokens:
+            parts.append(chunk)
+    return "\n\n".join(parts)
+
+
+def trim_history(messages, max_tokens):
+    """Keep the most recent messages that fit in max_tokens, truncating an oversized newest one.
+
+    A leading conversation summary is kept first, within half the budget.
+    """
+    if messages and messages[0].id == SUMMARY_MESSAGE_ID and max_tokens > 0:
+        summary = messages[0]
+        if count_tokens(summary.content) > max_tokens // 2:
+            summary = summary.__class__(truncate_text(summary.content, max_tokens // 2), id=SUMMARY_MESSAGE_ID)
+        return [summary] + trim_history(messages[1:], max_tokens - count_tokens(summary.content))
+
+    kept, used = [], 0
+    for message in reversed(messages):
+        tokens = count_tokens(message.content)
+        if used + tokens > max_tokens:
+            if not kept and max_tokens > 0:
+                kept.append(message.__class__(truncate_text(message.content, max_tokens)))
+            break
+        kept.append(message)
+        used += tokens
+    return list(reversed(kept))
+
+
+def budget_for(tool, part, default=None):
+    return TOKEN_BUDGETS.get(tool, {}).get(part, default)
+
@@ -0,0 +1,163 @@
+"""
+Course-structure metadata for knowledge base chunks and query scoping.
+
+At ingest every chunk is tagged with its document type and, when its source
+path or title names them, its week, module and assignment number. At query
+time a local parser turns mentions such as "week 5", "module 3",
+"assignment 2" or "the syllabus" into a Chroma `where` filter. A
+MetadataIndex over the stored metadata values resolves each filter to its
+candidate chunks up front: filters matching nothing, too little, or the
+whole KB are dropped, so the retriever only scopes searches that actually
+narrow the candidate set.
+"""
+
+import os
+import re
+import threading
+
+WORD_NUMBERS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15,
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5, "sixth": 6, "seventh": 7, "eighth": 8,
+}
+NUMBER = r"(\d{1,2}|" + "|".join(WORD_NUMBERS) + r")"
+
+# numbered course units, matched in source paths, chunk titles and queries
+UNIT_PATTERNS = {
+    "week": re.compile(r"\bweek[\s_-]*0*" + NUMBER + r"\b"),
+    "module": re.compile(r"\b(?:module|mod)[\s_-]*0*" + NUMBER + r"\b"),
+    # projects are the graded assignments of this course
+    "assignment": re.compile(r"\b(?:assignment|assgn|homework|hw|project)[\s_#-]*0*" + NUMBER + r"\b"),
+}
+# document type from the source path, first match wins
+SOURCE_DOC_TYPES = [
+    ("syllabus", re.compile(r"syllabus")),
+    ("assignment", re.compile(r"assignment|homework|\bhw|project")),
+    ("quiz", re.compile(r"quiz|exam")),
+    ("lecture", re.compile(r"lecture|slides|notes")),
+    ("exercise", re.compile(r"exercise|practice")),
+]
+DEFAULT_DOC_TYPE = "course_material"
+# document types a query can name explicitly; "assignment" alone is too generic
+QUERY_DOC_TYPES = [
+    ("syllabus", re.compile(r"\bsyllabus\b")),
+    ("lecture", re.compile(r"\blecture(?:s)?(?: notes| slides)?\b|\bslides\b")),
+]
+FILTER_FIELDS = ("doc_type", "week", "module", "assignment")
+MIN_CANDIDATES = 2  # filters matching fewer chunks fall back to unfiltered search
+
+
+def _number(text):
+    return WORD_NUMBERS.get(text) or int(text)
+
+
+def _units(text):
+    """Return {field: number} for units mentioned exactly once (by value) in text."""
+    found = {}
+    for field, pattern in UNIT_PATTERNS.items():
+        values = {_number(match) for match in pattern.findall(text)}
+        if len(values) == 1:
+            found[field] = values.pop()
+    return found
+
+
+def infer_metadata(source, text):
+    """Return course metadata for a chunk, from its source path and its title line."""
+    path = source.lower().replace("\\", "/")
+    # the file name decides before the directories it sits in
+    doc_type = next((doc_type for part in (os.path.basename(path), path)
+                     for doc_type, pattern in SOURCE_DOC_TYPES if pattern.search(part)), None)
+    if doc_type is None:
+        doc_type = "notebook" if path.endswith(".ipynb") else DEFAULT_DOC_TYPE
+    metadata = {"doc_type": doc_type}
+
+    # the title (first line, e.g. "Topic: Week 3 readings") may name a unit the path does not
+    title = text.lstrip("\ufeff").split("\n", 1)[0].lower()
+    return {**metadata, **_units(title), **_units(path)}
+
+
+def parse_filters(query):
+    """Return {field: value} for the course-structure mentions in a query."""
+    text = query.lower()
+    filters = _units(text)
+    for doc_type, pattern in QUERY_DOC_TYPES:
+        if pattern.search(text):
+            filters["doc_type"] = doc_type
+            break
+    return filters
+
+
+def to_where(filters):
+    """Chroma `where` clause for equality filters."""
+    conditions = [{field: value} for field, value in sorted(filters.items())]
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+class MetadataIndex:
+    """Postings from (field, value) to chunk positions, for resolving query filters before search."""
+
+    def __init__(self, documents, min_candidates=MIN_CANDIDATES):
+        self.size = len(documents)
+        self.min_candidates = min_candidates
+        self.postings = {}
+        for i, doc in enumerate(documents):
+            for field in FILTER_FIELDS:
+                value = (doc.metadata or {}).get(field)
+                if value is not None:
+                    self.postings.setdefault((field, value), set()).add(i)
+
+        self._lock = threading.Lock()
+        self.scoped = 0
+        self.unscoped = 0
+        self.fallbacks = 0
+        self.candidates = 0
+
+    def rows(self, where):
+        """Positions of the chunks satisfying a `where` clause built by to_where."""
+        conditions = where["$and"] if "$and" in where else [where]
+        rows = None
+        for condition in conditions:
+            for field, value in condition.items():
+                matching = self.postings.get((field, value), set())
+                rows = matching if rows is None else rows & matching
+        return rows if rows is not None else set(range(self.size))
+
+    def values(self, field):
+        return sorted(value for f, value in self.postings if f == field)
+
+    def scope(self, query):
+        """Return (where, candidate positions) for the query's filters, or None to search everything."""
+        filters = {field: value for field, value in parse_filters(query).items()
+                   if (field, value) in self.postings}
+        candidates = None
+        for field, value in filters.items():
+            rows = self.postings[(field, value)]
+            candidates = rows if candidates is None else candidates & rows
+
+        with self._lock:
+            if not filters:
+                self.unscoped += 1
+                return None
+            if len(candidates) < self.min_candidates or len(candidates) == self.size:
+                self.fallbacks += 1
+                return None
+            self.scoped += 1
+            self.candidates += len(candidates)
+        return to_where(filters), candidates
+
+    def record_fallback(self, candidates):
+        """Count a scoped search that returned too little and was re-run unfiltered."""
+        with self._lock:
+            self.fallbacks += 1
+            self.scoped -= 1
+            self.candidates -= len(candidates)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "scoped": self.scoped,
+                "unscoped": self.unscoped,
+                "fallbacks": self.fallbacks,
+                "mean_candidates": self.candidates / self.scoped if self.scoped else 0.0,
+                "chunks": self.size,
+            }
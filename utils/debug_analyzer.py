@@ -0,0 +1,421 @@
+"""
+Local static pre-analysis for debug_code requests.
+
+Pasted tracebacks are parsed for the error class, message and failing line,
+and the pasted code is analyzed with `ast` (when the student reports a syntax or
+indentation error, ast.parse locates it even without a traceback). The common
+beginner errors (IndentationError, NameError, KeyError on a DataFrame
+column, str + int TypeError) are answered instantly from templates written
+in the debug chain's style: explain the likely cause, show the student's
+line, suggest what to check, and do not hand over the fix. Anything else
+goes to the model as a trimmed prompt holding only the diagnosis and the
+lines around the failure.
+
+Set VTA_LOCAL_DEBUG=0 to send every request to the model unchanged.
+"""
+
+import ast
+import difflib
+import os
+import re
+import textwrap
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from utils.context import count_tokens, truncate_text
+
+LOCAL_DEBUG = os.getenv("VTA_LOCAL_DEBUG", "1") == "1"
+CONTEXT_LINES = 3  # lines of code shown before the failing line
+QUESTION_TOKENS = 150  # student's own words kept in the trimmed prompt
+
+ERROR_RE = re.compile(r"^\s*(?:[\w.]+\.)?(\w*(?:Error|Exception))\b:?[ \t]*(.*)$")
+INLINE_ERROR_RE = re.compile(r"\b(\w+(?:Error|Exception))\b:?[ \t]*([^\n]*)")
+SYNTAX_ERRORS = ("SyntaxError", "IndentationError", "TabError")
+SYNTAX_MENTION_RE = re.compile(r"\b(?:indentation|syntax|tab)\s*error\b", re.IGNORECASE)
+# 'File "a.py", line 3', IPython's 'File /path/frame.py:3761, in f' and notebook cells
+FRAME_RE = re.compile(r'^\s*(?:File "?([^",]+?)"?(?:, line |:)(\d+)'
+                      r'|(Cell In\s*\[\d*\]|Input In\s*\[\d*\]|<ipython-input-[^>]*>)(?:,\s*line (\d+))?)')
+ARROW_LINE_RE = re.compile(r"^\s*-+>\s*(\d+)\s(.*)$")  # Jupyter "----> 5 df['x']"
+LIBRARY_PATH_RE = re.compile(r"site-packages|dist-packages|[/\\]lib[/\\]python")
+TRACEBACK_NOISE_RE = re.compile(r"^\s*(-{5,}|During handling|The above exception)")
+CODE_LINE_RE = re.compile(
+    r"^\s*(#|@|def |class |import |from \w|for |while |if |elif |else\s*:|try\s*:|except|finally|with |"
+    r"return\b|print\(|[\w.\[\]'\"]+\s*(=|\+=|-=|\*=)[^=]|[\w.]+\(.*\)\s*$)|^\s{2,}\S")
+QUOTED_RE = re.compile(r"""^['"]([^'"]+)['"]""")
+NAME_RE = re.compile(r"name '(\w+)' is not defined")
+CONCAT_RE = re.compile(r'can only concatenate str \(not "(\w+)"\) to str'
+                       r"|unsupported operand type\(s\) for \+=?: '(\w+)' and '(\w+)'")
+NUMBER_TYPES = ("int", "float")  # the str + number template only fits these operands
+DATAFRAME_RE = re.compile(r"\bpd\.|\bpandas\b|read_csv|read_excel|read_sql|DataFrame")
+DATAFRAME_NAME_RE = re.compile(r"^df\w*$|^\w+_df$")
+IMPORT_ALIASES = {
+    "pd": "import pandas as pd",
+    "np": "import numpy as np",
+    "plt": "import matplotlib.pyplot as plt",
+    "sns": "import seaborn as sns",
+}
+
+ENCOURAGEMENT = "Give it a try and run the code again. If it still fails, paste the new error and we'll look at it together!"
+
+
+@dataclass
+class Diagnosis:
+    """What the local analysis found. answer is set when a template applies, prompt otherwise."""
+    error: Optional[str] = None
+    message: str = ""
+    line_number: Optional[int] = None  # 1-based, within code
+    line: Optional[str] = None
+    code: str = ""
+    question: str = ""
+    answer: Optional[str] = None
+    prompt: Optional[str] = None
+
+
+def split_query(text):
+    """Return (code, traceback, question) from a pasted debug request.
+
+    Code is what sits in ``` fences, or, without fences, the lines that look
+    like Python. A traceback runs from its header or first frame to the
+    error line, inside or outside a fence.
+    """
+    fenced = "```" in text
+    code_lines, traceback_lines, question_lines = [], [], []
+    in_fence = in_traceback = False
+    for line in text.splitlines():
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+            continue
+        if line.lstrip().startswith("Traceback (most recent") or FRAME_RE.match(line):
+            in_traceback = True
+        if in_traceback or ERROR_RE.match(line) or TRACEBACK_NOISE_RE.match(line):
+            traceback_lines.append(line)
+            in_traceback = in_traceback and not ERROR_RE.match(line)
+        elif in_fence or not fenced and CODE_LINE_RE.match(line):
+            code_lines.append(line)
+        elif line.strip():
+            question_lines.append(line.strip())
+    return "\n".join(code_lines).strip("\n"), "\n".join(traceback_lines), " ".join(question_lines)
+
+
+def parse_traceback(traceback, diagnosis):
+    """Fill the error class, message and failing line from the last frame of the student's own code."""
+    errors = [ERROR_RE.match(line) for line in traceback.splitlines()]
+    errors = [match for match in errors if match]
+    if errors:
+        diagnosis.error, diagnosis.message = errors[-1].group(1), errors[-1].group(2).strip()
+
+    lines = traceback.splitlines()
+    in_library = False
+    for i, line in enumerate(lines):
+        frame = FRAME_RE.match(line)
+        arrow = ARROW_LINE_RE.match(line)
+        if frame:
+            # frames inside pandas and friends say nothing about the student's code
+            in_library = bool(frame.group(1) and LIBRARY_PATH_RE.search(frame.group(1)))
+            if in_library:
+                continue
+            number = frame.group(2) or frame.group(4)
+            diagnosis.line_number = int(number) if number else None
+            diagnosis.line = None
+            following = lines[i + 1].strip() if i + 1 < len(lines) else ""
+            if following and not FRAME_RE.match(following) and not ERROR_RE.match(following) \
+                    and not ARROW_LINE_RE.match(following) and not following.startswith("^"):
+                diagnosis.line = following
+        elif arrow and not in_library:
+            diagnosis.line_number, diagnosis.line = int(arrow.group(1)), arrow.group(2).strip()
+
+
+def _locate(code, text):
+    """1-based number of the code line whose stripped text equals text, or None."""
+    for number, line in enumerate(code.splitlines(), 1):
+        if text and line.strip() == text.strip():
+            return number
+    return None
+
+
+def _defined_names(tree):
+    """Return {name: first line} for names assigned, defined or imported in the code."""
+    names = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store):
+            found = node.id
+        elif isinstance(node, (ast.FunctionDef, ast.ClassDef)):
+            found = node.name
+        elif isinstance(node, ast.arg):
+            found = node.arg
+        elif isinstance(node, ast.alias):
+            found = (node.asname or node.name).split(".")[0]
+        else:
+            continue
+        names[found] = min(names.get(found, node.lineno), node.lineno)
+    return names
+
+
+def _first_use(tree, name):
+    lines = [node.lineno for node in ast.walk(tree)
+             if isinstance(node, ast.Name) and node.id == name and isinstance(node.ctx, ast.Load)]
+    return min(lines) if lines else None
+
+
+def _subscripts(tree, key):
+    """(line, subscripted expression) of every `x['key']` in the code."""
+    found = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript):
+            if isinstance(node.slice, ast.Constant) and node.slice.value == key:
+                found.append((node.lineno, ast.unparse(node.value)))
+    return sorted(found)
+
+
+def _is_dataframe(tree, expression):
+    """True when expression is a df-style name or a name assigned from pandas in the code."""
+    if DATAFRAME_NAME_RE.match(expression):
+        return True
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Assign) and any(
+                isinstance(target, ast.Name) and target.id == expression for target in node.targets):
+            if DATAFRAME_RE.search(ast.unparse(node.value)):
+                return True
+    return False
+
+
+def _string_concatenation(tree):
+    """Line of the first `+` with a string literal on one side."""
+    for node in sorted((n for n in ast.walk(tree) if isinstance(n, (ast.BinOp, ast.AugAssign))),
+                       key=lambda n: n.lineno):
+        if not isinstance(node.op, ast.Add):
+            continue
+        sides = (node.left, node.right) if isinstance(node, ast.BinOp) else (node.target, node.value)
+        if any(isinstance(side, ast.JoinedStr) or isinstance(side, ast.Constant) and isinstance(side.value, str)
+               for side in sides):
+            return node.lineno
+    return None
+
+
+def _snippet(diagnosis, before=CONTEXT_LINES):
+    """The failing line with a few lines before it, marked for the student."""
+    lines = diagnosis.code.splitlines()
+    if diagnosis.line_number and lines and diagnosis.line_number <= len(lines):
+        start = max(0, diagnosis.line_number - 1 - before)
+        shown = lines[start:diagnosis.line_number]
+        shown[-1] = f"{shown[-1]}  # <- line {diagnosis.line_number}"
+        return "\n".join(shown)
+    return diagnosis.line or ""
+
+
+def _block(diagnosis):
+    snippet = _snippet(diagnosis)
+    return f"```python\n{snippet}\n```\n\n" if snippet else ""
+
+
+def _where(diagnosis):
+    return f"on line {diagnosis.line_number}" if diagnosis.line_number else "in your code"
+
+
+def indentation_answer(diagnosis):
+    message = diagnosis.message.lower()
+    if diagnosis.error == "TabError" or "inconsistent use of tabs" in message:
+        cause = ("the indentation mixes tabs and spaces. They can look identical in the editor, "
+                 "but Python counts them differently.")
+        check = "Re-indent the block using only spaces (4 per level) and see whether the error goes away."
+    elif "expected an indented block" in message:
+        cause = ("a line ending in `:` (like `if`, `for`, `def` or `while`) must be followed by at least one "
+                 "indented line that belongs to it.")
+        check = ("Which lines should run inside that block? Check that they are indented one level "
+                 "(4 spaces) deeper than the line with the colon.")
+    elif "unexpected indent" in message:
+        cause = "this line is indented more than Python expects, but the line before it does not open a new block."
+        check = "Compare its indentation with the lines around it. Should it line up with the previous line?"
+    elif "unindent" in message or "dedent" in message:
+        cause = "this line steps back to an indentation level that doesn't line up with any block above it."
+        check = "Look at how many spaces each line in the block uses; they need to match exactly (e.g. 4 vs 3 spaces)."
+    else:
+        return None
+    return (f"You're getting an **{diagnosis.error}** {_where(diagnosis)}. In Python, {cause}\n\n"
+            f"{_block(diagnosis)}{check}\n\n{ENCOURAGEMENT}")
+
+
+def name_error_answer(diagnosis, tree):
+    match = NAME_RE.search(diagnosis.message)
+    if not match:
+        return None
+    name = match.group(1)
+    defined = _defined_names(tree) if tree is not None else {}
+    if diagnosis.line_number is None and tree is not None:
+        diagnosis.line_number = _first_use(tree, name)
+
+    close = difflib.get_close_matches(name, [n for n in defined if n != name], n=1, cutoff=0.75)
+    if name in IMPORT_ALIASES and name not in defined:
+        hint = (f"`{name}` is usually the short name a library gets when it is imported (`{IMPORT_ALIASES[name]}`). "
+                f"Has that import run before this line? (In Colab, run the cell with the imports first.)")
+    elif close:
+        hint = (f"Your code does define `{close[0]}`. Names in Python are case- and spelling-sensitive, "
+                f"so compare the two carefully.")
+    elif name in defined and diagnosis.line_number and defined[name] > diagnosis.line_number:
+        hint = (f"`{name}` is only created on line {defined[name]}, after it is used. Python runs code top "
+                f"to bottom, so think about the order of these lines (or of your notebook cells).")
+    else:
+        hint = (f"Where did you expect `{name}` to come from? Check for a typo, whether it is created inside "
+                f"a function (and so not visible outside it), and whether the cell that creates it was run.")
+    return (f"You're getting a **NameError**: Python doesn't know the name `{name}` {_where(diagnosis)}.\n\n"
+            f"{_block(diagnosis)}{hint}\n\n{ENCOURAGEMENT}")
+
+
+def key_error_answer(diagnosis, tree):
+    quoted = QUOTED_RE.match(diagnosis.message.strip())
+    key = quoted.group(1) if quoted else diagnosis.message.strip()
+    if tree is None and diagnosis.line:
+        try:
+            tree = ast.parse(diagnosis.line)
+        except SyntaxError:
+            pass
+    if not key or tree is None:
+        return None
+    # only a subscript on something that is a DataFrame is a missing column; dicts go to the model
+    uses = [(line, expression) for line, expression in _subscripts(tree, key) if _is_dataframe(tree, expression)]
+    if not uses:
+        return None
+    diagnosis.line_number = diagnosis.line_number or (uses[0][0] if diagnosis.code else None)
+    frame = uses[0][1]
+    strings = {node.value for node in ast.walk(tree) if isinstance(node, ast.Constant)
+               and isinstance(node.value, str) and node.value != key}
+    close = difflib.get_close_matches(key, strings, n=1, cutoff=0.75)
+    hint = (f"You also use `'{close[0]}'` in your code. Are these meant to be the same column? "
+            if close else "")
+    return (f"You're getting a **KeyError**: `{frame}` has no column named `'{key}'` {_where(diagnosis)}.\n\n"
+            f"{_block(diagnosis)}{hint}Print `{frame}.columns` "
+            f"to see the exact column names. Watch for capital letters, extra spaces and spelling, "
+            f"and check the column exists at this point (e.g. it wasn't renamed or dropped earlier).\n\n"
+            f"{ENCOURAGEMENT}")
+
+
+def concatenation_answer(diagnosis, tree):
+    match = CONCAT_RE.search(diagnosis.message)
+    if not match:
+        return None
+    operands = [match.group(1), "str"] if match.group(1) else [match.group(2), match.group(3)]
+    # any other operand pair (int + NoneType, list + int, str + list, ...) needs the model
+    if "str" not in operands:
+        return None
+    operands.remove("str")
+    other = operands[0]
+    if other not in NUMBER_TYPES:
+        return None
+    if diagnosis.line_number is None and tree is not None:
+        diagnosis.line_number = _string_concatenation(tree)
+    return (f"You're getting a **TypeError** {_where(diagnosis)}: `+` is being used to join a string (`str`) "
+            f"and a number (`{other}`). Python won't combine text and numbers automatically.\n\n"
+            f"{_block(diagnosis)}Which value on this line is the number? You can check with `type(...)`. "
+            f"Then think about what you want: text (convert the number to a string, or use an f-string) "
+            f"or a calculation (convert the text to a number).\n\n{ENCOURAGEMENT}")
+
+
+def trimmed_prompt(diagnosis):
+    """A compact request for the model: the diagnosis, the lines around the failure and the question."""
+    parts = []
+    if diagnosis.error:
+        parts.append(f"Error: {diagnosis.error}: {diagnosis.message}".rstrip(": "))
+    if diagnosis.line_number or diagnosis.line:
+        parts.append(f"Failing line {diagnosis.line_number or ''}: {diagnosis.line or ''}".replace("  ", " "))
+    snippet = _snippet(diagnosis, before=2 * CONTEXT_LINES) if diagnosis.line_number else diagnosis.code
+    if snippet:
+        parts.append(f"Relevant code:\n```python\n{snippet}\n```")
+    if diagnosis.question:
+        parts.append(f"Student's question: {truncate_text(diagnosis.question, QUESTION_TOKENS)}")
+    return "\n".join(parts)
+
+
+class DebugStats:
+    """Counts of debug requests answered locally, trimmed, or passed through."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local = {}
+        self.trimmed = 0
+        self.passthrough = 0
+        self.tokens_saved = 0
+
+    def record(self, diagnosis, original):
+        with self._lock:
+            if diagnosis.answer is not None:
+                self.local[diagnosis.error] = self.local.get(diagnosis.error, 0) + 1
+                self.tokens_saved += count_tokens(original)
+            elif diagnosis.prompt is not None:
+                self.trimmed += 1
+                self.tokens_saved += max(0, count_tokens(original) - count_tokens(diagnosis.prompt))
+            else:
+                self.passthrough += 1
+
+    def stats(self):
+        with self._lock:
+            local = sum(self.local.values())
+            total = local + self.trimmed + self.passthrough
+            result = {
+                "local": local,
+                "trimmed": self.trimmed,
+                "passthrough": self.passthrough,
+                "local_rate": local / total if total else 0.0,
+                "tokens_saved": self.tokens_saved,
+            }
+            result.update({f"local_{error}": count for error, count in self.local.items()})
+            return result
+
+
+debug_stats = DebugStats()
+
+
+def analyze(query, stats=debug_stats):
+    """
+    Diagnose a debug request locally.
+
+    Returns a Diagnosis whose answer is a ready reply for the common error
+    classes, or whose prompt is a trimmed request for the model; both are
+    None when nothing useful was found (send the query unchanged).
+    """
+    code, traceback, question = split_query(query)
+    # excerpts pasted from inside a function or loop keep their indentation
+    code = textwrap.dedent(code)
+    diagnosis = Diagnosis(code=code, question=question)
+    parse_traceback(traceback, diagnosis)
+    if diagnosis.error is None:
+        # "I get NameError: name 'x' is not defined" written in a sentence
+        inline = INLINE_ERROR_RE.search(question)
+        if inline:
+            diagnosis.error, diagnosis.message = inline.group(1), inline.group(2).strip()
+    reported_syntax = diagnosis.error in SYNTAX_ERRORS or bool(SYNTAX_MENTION_RE.search(question))
+
+    tree = None
+    if code:
+        try:
+            tree = ast.parse(code)
+        except SyntaxError as e:
+            # ast locates a syntax or indentation error the student reported; an excerpt that
+            # merely doesn't parse on its own (an unfinished if/elif) is left to the model
+            if reported_syntax:
+                diagnosis.error, diagnosis.message = type(e).__name__, e.msg
+                diagnosis.line_number = e.lineno
+        except ValueError:
+            pass
+
+    # traceback line numbers refer to the student's file, not the pasted code: re-anchor on the line's text
+    located = _locate(code, diagnosis.line)
+    if located or diagnosis.line is not None or (diagnosis.line_number or 0) > len(code.splitlines()):
+        diagnosis.line_number = located
+    if diagnosis.line is None and diagnosis.line_number:
+        diagnosis.line = code.splitlines()[diagnosis.line_number - 1].strip()
+
+    if diagnosis.error in ("IndentationError", "TabError"):
+        diagnosis.answer = indentation_answer(diagnosis)
+    elif diagnosis.error == "NameError":
+        diagnosis.answer = name_error_answer(diagnosis, tree)
+    elif diagnosis.error == "KeyError":
+        diagnosis.answer = key_error_answer(diagnosis, tree)
+    elif diagnosis.error == "TypeError":
+        diagnosis.answer = concatenation_answer(diagnosis, tree)
+
+    if diagnosis.answer is None and (diagnosis.error or code):
+        diagnosis.prompt = trimmed_prompt(diagnosis)
+    if stats is not None:
+        stats.record(diagnosis, query)
+    return diagnosis
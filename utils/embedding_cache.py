@@ -0,0 +1,150 @@
+"""
+Caching layer for embedding models.
+
+Vectors are kept in an in-memory LRU backed by an on-disk SQLite store,
+keyed by model name plus a hash of the text. Misses are embedded in
+multi-text batches, and identical requests already in flight on another
+thread are awaited instead of being sent twice.
+"""
+
+import hashlib
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+
+import utils.http_clients as http
+
+EMBEDDING_CACHE_PATH = 'data/embedding_cache.sqlite3'
+EMBEDDING_BATCH_SIZE = 64
+MEMORY_CACHE_SIZE = 4096
+
+
+def cached_openai_embeddings(model='text-embedding-ada-002', cache_path=EMBEDDING_CACHE_PATH):
+    """Return OpenAI embeddings wrapped in the persistent cache."""
+    http_kwargs = http.openai_client_kwargs() if http.SHARED_HTTP else {}
+    embeddings = OpenAIEmbeddings(model=model, chunk_size=EMBEDDING_BATCH_SIZE, **http_kwargs)
+    return CachedEmbeddings(embeddings, model_name=model, cache_path=cache_path)
+
+
+class CachedEmbeddings(Embeddings):
+    """Wrap an Embeddings object with a memory + SQLite cache and batched misses."""
+
+    def __init__(self, embeddings, model_name, cache_path=EMBEDDING_CACHE_PATH,
+                 batch_size=EMBEDDING_BATCH_SIZE, memory_size=MEMORY_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.memory_size = memory_size
+
+        self._memory = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(cache_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        self._conn.commit()
+
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, key):
+        """Return a cached vector from memory or disk. Caller holds the lock."""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        row = self._conn.execute(
+            "SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        vector = array("f", row[0]).tolist()
+        self._remember(key, vector)
+        return vector
+
+    def _store(self, items):
+        """Persist (key, vector) pairs. Caller holds the lock."""
+        for key, vector in items:
+            self._remember(key, vector)
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+            [(key, array("f", vector).tobytes()) for key, vector in items])
+        self._conn.commit()
+
+    def _embed(self, texts, embed_fn):
+        keys = [self._key(text) for text in texts]
+        results = {}
+        waiting = {}
+        owned = {}
+
+        with self._lock:
+            for key, text in zip(keys, texts):
+                if key in results or key in waiting or key in owned:
+                    continue
+                vector = self._lookup(key)
+                if vector is not None:
+                    results[key] = vector
+                    self.hits += 1
+                elif key in self._inflight:
+                    waiting[key] = self._inflight[key]
+                    self.hits += 1
+                else:
+                    future = Future()
+                    self._inflight[key] = future
+                    owned[key] = (text, future)
+                    self.misses += 1
+
+        pending = list(owned.items())
+        try:
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                vectors = embed_fn([text for _, (text, _) in batch])
+                self.requests += 1
+                with self._lock:
+                    self._store([(key, vector) for (key, _), vector in zip(batch, vectors)])
+                    for (key, (_, future)), vector in zip(batch, vectors):
+                        self._inflight.pop(key, None)
+                        future.set_result(vector)
+                        results[key] = vector
+        except Exception as e:
+            with self._lock:
+                for key, (_, future) in owned.items():
+                    if not future.done():
+                        self._inflight.pop(key, None)
+                        future.set_exception(e)
+            raise
+
+        for key, future in waiting.items():
+            results[key] = future.result()
+
+        return [results[key] for key in keys]
+
+    def embed_documents(self, texts):
+        return self._embed(list(texts), self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed([text], lambda batch: [self.embeddings.embed_query(batch[0])])[0]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "requests": self.requests,
+            "memory_entries": len(self._memory),
+        }
@@ -0,0 +1,216 @@
+"""
+Pool of pre-generated practice exercises for generate_exercise.
+
+Keeps up to POOL_TARGET ready-made multiple choice questions per
+topic x difficulty x business context in a local SQLite store. Common
+requests ("give me a practice question on loops") are served from the pool
+instantly, skipping questions already in the conversation; buckets that run
+low are refilled in the background through the exercise chain. Unusual
+requests (answers, pasted code, topics outside the pool) return None so the
+live chain handles them.
+
+Usage (fill every bucket ahead of time):
+    python -m utils.exercise_pool [--target 5]
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.cascade import ANSWER_REQUEST_RE, POOL_TAG, check_exercise
+
+EXERCISE_POOL_PATH = 'data/exercise_pool.sqlite3'
+POOL_TARGET = 5  # questions kept per bucket
+LOW_WATER = 2  # refill a bucket when fewer fresh questions remain
+MAX_SERVES = 25  # retire a question after serving it this many times
+MAX_QUERY_WORDS = 25
+
+# first match wins, so the more specific topics come first
+TOPICS = {
+    "pandas": r"\bpandas\b|data ?frames?|\bgroupby\b|\bseries\b",
+    "dictionaries": r"\bdict(ionary|ionaries|s)?\b|key[- ]value",
+    "lists": r"\blists?\b|\btuples?\b|comprehensions?",
+    "strings": r"\bstrings?\b|f-strings?",
+    "loops": r"\bloops?\b|\bwhile\b|\biterat",
+    "conditionals": r"\bconditionals?\b|\bif\b|\belif\b",
+    "functions": r"\bfunctions?\b|\bdef\b|\bparameters?\b|\barguments?\b",
+}
+DIFFICULTIES = ("beginner", "intermediate")
+CONTEXTS = ("operations", "marketing", "finance", "accounting", "management")
+
+EXERCISE_REQUEST_RE = re.compile(r"\b(exercises?|questions?|quiz|practice|problems?|mcqs?)\b", re.IGNORECASE)
+HARDER_RE = re.compile(r"\b(intermediate|harder|hard|advanced|challenging|difficult)\b", re.IGNORECASE)
+CODE_RE = re.compile(r"```|\n")  # pasted code
+
+GENERATION_PROMPT = (
+    "Give me a new {difficulty} multiple choice practice question on Python {topic}, "
+    "set in a {context} business scenario. Do not reveal which option is right.")
+
+
+def parse_request(query):
+    """Return the (topic, difficulty, context) bucket for a standard exercise request, else None.
+
+    context is None when the query does not ask for a particular one.
+    """
+    if len(query.split()) > MAX_QUERY_WORDS or CODE_RE.search(query):
+        return None
+    if ANSWER_REQUEST_RE.search(query) or not EXERCISE_REQUEST_RE.search(query):
+        return None
+    topic = next((t for t, pattern in TOPICS.items() if re.search(pattern, query, re.IGNORECASE)), None)
+    if topic is None:
+        return None
+    difficulty = "intermediate" if HARDER_RE.search(query) else "beginner"
+    context = next((c for c in CONTEXTS if c in query.lower()), None)
+    return topic, difficulty, context
+
+
+class ExercisePool:
+    """SQLite-backed pool of exercises, refilled in the background."""
+
+    def __init__(self, path=EXERCISE_POOL_PATH, target=POOL_TARGET, low_water=LOW_WATER):
+        self.target = target
+        self.low_water = low_water
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS exercises ("
+            "id INTEGER PRIMARY KEY, topic TEXT, difficulty TEXT, context TEXT, "
+            "question TEXT UNIQUE, served INTEGER DEFAULT 0, created REAL)")
+        self._conn.commit()
+        self._refilling = set()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="exercise-pool")
+
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+
+    def _fresh_counts(self, topic, difficulty):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT context, COUNT(*) FROM exercises WHERE topic = ? AND difficulty = ? AND served < ? "
+                "GROUP BY context", (topic, difficulty, MAX_SERVES)).fetchall()
+        return dict(rows)
+
+    def take(self, topic, difficulty, context=None, seen=()):
+        """Serve the least used question in the bucket that is not in seen, or None."""
+        sql = ("SELECT id, question FROM exercises WHERE topic = ? AND difficulty = ? AND served < ?"
+               + (" AND context = ?" if context else "") + " ORDER BY served, RANDOM()")
+        params = (topic, difficulty, MAX_SERVES) + ((context,) if context else ())
+        with self._lock:
+            for exercise_id, question in self._conn.execute(sql, params).fetchall():
+                if question.strip() not in seen:
+                    self._conn.execute("UPDATE exercises SET served = served + 1 WHERE id = ?", (exercise_id,))
+                    self._conn.commit()
+                    return question
+        return None
+
+    def add(self, topic, difficulty, context, question):
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO exercises (topic, difficulty, context, question, created) "
+                "VALUES (?, ?, ?, ?, ?)", (topic, difficulty, context, question.strip(), time.time()))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def fill(self, topic, difficulty, context, chain, count):
+        """Generate count questions for a bucket; answers that fail the MCQ check are dropped."""
+        added = 0
+        query = GENERATION_PROMPT.format(topic=topic, difficulty=difficulty, context=context)
+        for _ in range(count):
+            try:
+                question = chain.invoke({"query": query, "chat_history": []}, config={"tags": [POOL_TAG]})
+            except Exception as e:
+                print(f"Exercise pool refill failed for {topic}/{difficulty}/{context}: {e}")
+                break
+            if check_exercise(question, {"query": query}) and self.add(topic, difficulty, context, question):
+                added += 1
+        self.generated += added
+        return added
+
+    def refill_async(self, topic, difficulty, chain, contexts=CONTEXTS):
+        """Top up the emptiest of the given buckets when it fell below the low-water mark, off the request path.
+
+        A request without a context draws from every context bucket, but only
+        one bucket is refilled per request, so a request never queues more
+        than `target` generations.
+        """
+        counts = self._fresh_counts(topic, difficulty)
+        context = min(contexts, key=lambda c: counts.get(c, 0))
+        fresh = counts.get(context, 0)
+        bucket = (topic, difficulty, context)
+        with self._lock:
+            if fresh >= self.low_water or bucket in self._refilling:
+                return
+            self._refilling.add(bucket)
+
+        def run():
+            try:
+                self.fill(*bucket, chain, self.target - fresh)
+            finally:
+                with self._lock:
+                    self._refilling.discard(bucket)
+
+        self._executor.submit(run)
+
+    def serve(self, query, chat_history, chain):
+        """Return a pooled exercise for a standard request, or None to use the live chain."""
+        bucket = parse_request(query)
+        if bucket is None:
+            return None
+        topic, difficulty, context = bucket
+        seen = {message.content.strip() for message in chat_history if isinstance(message.content, str)}
+        question = self.take(topic, difficulty, context, seen)
+        self.refill_async(topic, difficulty, chain, (context,) if context else CONTEXTS)
+        if question is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        print(f"Exercise pool hit for {topic}/{difficulty}/{context or 'any'}")
+        return question
+
+    def stats(self):
+        with self._lock:
+            size = self._conn.execute(
+                "SELECT COUNT(*) FROM exercises WHERE served < ?", (MAX_SERVES,)).fetchone()[0]
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+            "size": size,
+            "generated": self.generated,
+            "refilling": len(self._refilling),
+        }
+
+
+def main():
+    import utils.chains_lcel as chains
+    import utils.registry as registry
+    from utils.scheduler import PRIORITIES
+
+    parser = argparse.ArgumentParser(description="Fill the practice exercise pool.")
+    parser.add_argument("--path", default=EXERCISE_POOL_PATH)
+    parser.add_argument("--model", default='claude_sonnet')
+    parser.add_argument("--target", type=int, default=POOL_TARGET)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.path) or ".", exist_ok=True)
+    pool = ExercisePool(args.path, target=args.target)
+    chain = registry.get_chain(chains.exercise_chain, args.model, priority=PRIORITIES["exercise"])
+    for topic in TOPICS:
+        for difficulty in DIFFICULTIES:
+            counts = pool._fresh_counts(topic, difficulty)
+            for context in CONTEXTS:
+                missing = args.target - counts.get(context, 0)
+                if missing > 0:
+                    added = pool.fill(topic, difficulty, context, chain, missing)
+                    print(f"{topic}/{difficulty}/{context}: +{added}")
+    print(pool.stats())
+
+
+if __name__ == '__main__':
+    main()
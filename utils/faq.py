@@ -0,0 +1,345 @@
+"""
+FAQ index mined from the query log.
+
+An offline job streams new documents from the MongoDB query log (everything
+after the last checkpointed _id), embeds the queries and assigns each one to
+the nearest cluster, or opens a new cluster when nothing is close enough.
+Draft answers are generated for the largest clusters whose tool does not
+depend on the conversation; an answer is served only once it has been
+approved. Answers are stamped with the knowledge base version they were
+drafted from: after a re-ingest they stop being served, and the next mine
+run drafts them again for review. The app checks the approved entries
+before routing and replays a match without calling an LLM.
+
+Usage:
+    python -m utils.faq mine [--top 50] [--min-count 5]
+    python -m utils.faq list [--pending]
+    python -m utils.faq approve 12 15
+    python -m utils.faq reject 13
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from utils.answer_cache import CACHEABLE_TOOLS, kb_version, normalize_query, number_tokens
+
+FAQ_INDEX_PATH = 'data/faq_index.sqlite3'
+KB_DB_PATH = 'data/chroma_db'
+CLUSTER_THRESHOLD = 0.90  # cosine similarity to join an existing cluster
+MATCH_THRESHOLD = 0.95  # cosine similarity to serve an approved answer
+MIN_CLUSTER_SIZE = 5
+TOP_CLUSTERS = 50
+MINE_BATCH_SIZE = 500
+RELOAD_INTERVAL = 30  # seconds between checks for a newer index on disk
+
+
+def _normalized(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class FaqStore:
+    """SQLite store of query clusters, their answers and the mining checkpoint."""
+
+    def __init__(self, path=FAQ_INDEX_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS clusters ("
+            "id INTEGER PRIMARY KEY, question TEXT, centroid BLOB, count INTEGER, "
+            "tool TEXT, answer TEXT, approved INTEGER DEFAULT 0, updated REAL)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        # indexes created before answers were stamped with the knowledge base version
+        if "kb_version" not in {row[1] for row in self._conn.execute("PRAGMA table_info(clusters)")}:
+            self._conn.execute("ALTER TABLE clusters ADD COLUMN kb_version TEXT")
+        self._conn.commit()
+
+    def checkpoint(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'last_id'").fetchone()
+        return row[0] if row else None
+
+    def clusters(self):
+        """Return (ids, centroids, counts, questions) of every cluster."""
+        rows = self._conn.execute("SELECT id, centroid, count, question FROM clusters ORDER BY id").fetchall()
+        ids = [row[0] for row in rows]
+        centroids = [np.frombuffer(row[1], dtype=np.float32) for row in rows]
+        counts = [row[2] for row in rows]
+        questions = [row[3] for row in rows]
+        return ids, centroids, counts, questions
+
+    def save(self, updates, new_clusters, last_id):
+        """Write centroid updates and new clusters with the checkpoint; returns the new cluster ids."""
+        now = time.time()
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE clusters SET centroid = ?, count = ?, updated = ? WHERE id = ?",
+                [(centroid.tobytes(), count, now, cluster_id) for cluster_id, centroid, count in updates])
+            new_ids = [self._conn.execute(
+                "INSERT INTO clusters (question, centroid, count, updated) VALUES (?, ?, ?, ?)",
+                (question, centroid.tobytes(), count, now)).lastrowid
+                for question, centroid, count in new_clusters]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_id', ?)", (str(last_id),))
+        return new_ids
+
+    def unanswered(self, top, min_count):
+        return self._conn.execute(
+            "SELECT id, question FROM clusters WHERE answer IS NULL AND tool IS NULL AND count >= ? "
+            "ORDER BY count DESC LIMIT ?", (min_count, top)).fetchall()
+
+    def set_answer(self, cluster_id, tool, answer, kb_version=None):
+        with self._conn:
+            self._conn.execute(
+                "UPDATE clusters SET tool = ?, answer = ?, kb_version = ?, approved = 0, updated = ? WHERE id = ?",
+                (tool, answer, kb_version, time.time(), cluster_id))
+
+    def reset_stale(self, kb_version):
+        """Clear the answers drafted from another knowledge base version so they are drafted again."""
+        with self._conn:
+            return self._conn.execute(
+                "UPDATE clusters SET tool = NULL, answer = NULL, kb_version = NULL, approved = 0 "
+                "WHERE answer IS NOT NULL AND kb_version IS NOT ?", (kb_version,)).rowcount
+
+    def set_approved(self, cluster_ids, approved):
+        with self._conn:
+            self._conn.executemany(
+                "UPDATE clusters SET approved = ? WHERE id = ? AND answer IS NOT NULL",
+                [(int(approved), cluster_id) for cluster_id in cluster_ids])
+
+    def entries(self, pending=False):
+        sql = "SELECT id, count, tool, approved, question, answer FROM clusters WHERE answer IS NOT NULL"
+        if pending:
+            sql += " AND approved = 0"
+        return self._conn.execute(sql + " ORDER BY count DESC").fetchall()
+
+    def approved(self, kb_version=None):
+        """Return (centroids, answers, questions) of the approved entries drafted from kb_version."""
+        rows = self._conn.execute(
+            "SELECT centroid, answer, question FROM clusters WHERE approved = 1 AND answer IS NOT NULL "
+            "AND kb_version IS ?", (kb_version,)).fetchall()
+        return ([np.frombuffer(row[0], dtype=np.float32) for row in rows], [row[1] for row in rows],
+                [row[2] for row in rows])
+
+
+def _append(matrix, n, vector):
+    """Store vector as row n, growing the matrix geometrically."""
+    if n == len(matrix):
+        grown = np.zeros((max(64, 2 * n), vector.shape[0]), dtype=np.float32)
+        if n:
+            grown[:n] = matrix[:n]
+        matrix = grown
+    matrix[n] = vector
+    return matrix
+
+
+def _batches(cursor, size):
+    batch = []
+    for document in cursor:
+        query = document.get("query") or ""
+        # skip pasted code, which never repeats verbatim
+        if "\n" in query.strip() or not normalize_query(query):
+            continue
+        batch.append((document["_id"], normalize_query(query)))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def mine(collection, store, embeddings, threshold=CLUSTER_THRESHOLD, batch_size=MINE_BATCH_SIZE):
+    """Cluster query log documents added since the checkpoint; returns the number processed.
+
+    Leader clustering: each query joins the nearest cluster that mentions the
+    same numbers when it is at least threshold similar (moving its centroid),
+    otherwise it starts one.
+    """
+    from bson import ObjectId
+
+    last_id = store.checkpoint()
+    spec = {"_id": {"$gt": ObjectId(last_id)}} if last_id else {}
+    cursor = collection.find(spec, {"query": 1}).sort("_id", 1).batch_size(batch_size)
+
+    ids, centroids, counts, cluster_questions = store.clusters()
+    # questions about different assignments or weeks embed closely but must not merge
+    numbers = [number_tokens(question) for question in cluster_questions]
+    n = len(ids)
+    matrix = np.stack(centroids) if centroids else np.zeros((0, 0), dtype=np.float32)
+    processed = 0
+
+    for batch in _batches(cursor, batch_size):
+        questions, dirty = {}, set()
+        vectors = _normalized(embeddings.embed_documents([text for _, text in batch]))
+        for (_, text), vector in zip(batch, vectors):
+            text_numbers = number_tokens(text)
+            scores = np.where([cluster == text_numbers for cluster in numbers], matrix[:n] @ vector,
+                              -np.inf) if n else None
+            best = int(np.argmax(scores)) if n else -1
+            if best >= 0 and scores[best] >= threshold:
+                counts[best] += 1
+                matrix[best] = _normalized(matrix[best] + (vector - matrix[best]) / counts[best])
+            else:
+                matrix = _append(matrix, n, vector)
+                counts.append(1)
+                numbers.append(text_numbers)
+                questions[n] = text
+                best = n
+                n += 1
+            dirty.add(best)
+
+        known = len(ids)
+        ids.extend(store.save(
+            [(ids[i], matrix[i], counts[i]) for i in dirty if i < known],
+            [(questions[i], matrix[i], counts[i]) for i in range(known, n)],
+            batch[-1][0]))
+        processed += len(batch)
+    return processed
+
+
+def draft_answers(store, answer, top=TOP_CLUSTERS, min_count=MIN_CLUSTER_SIZE, kb_version=None):
+    """Generate draft answers for the largest unanswered clusters with answer(question) -> (tool, text)."""
+    drafted = 0
+    for cluster_id, question in store.unanswered(top, min_count):
+        tool, text = answer(question)
+        store.set_answer(cluster_id, tool, text if tool in CACHEABLE_TOOLS else None, kb_version)
+        drafted += int(tool in CACHEABLE_TOOLS)
+    return drafted
+
+
+class FaqIndex:
+    """In-memory matrix of approved FAQ answers, reloaded when the store changes."""
+
+    def __init__(self, embeddings, db_path=KB_DB_PATH, path=FAQ_INDEX_PATH, threshold=MATCH_THRESHOLD):
+        self.embeddings = embeddings
+        self.db_path = db_path
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._store = None
+        self._matrix = None
+        self._answers = []
+        self._numbers = []
+        self._mtime = None
+        self._kb_version = None
+        self._last_check = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self._reload()
+
+    def _reload(self):
+        now = time.monotonic()
+        if self._mtime is not None and now - self._last_check < RELOAD_INTERVAL:
+            return
+        self._last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return
+        # answers drafted from an older knowledge base are dropped after a re-ingest
+        version = kb_version(self.db_path)
+        if mtime == self._mtime and version == self._kb_version:
+            return
+        with self._lock:
+            if self._store is None:
+                self._store = FaqStore(self.path)
+            centroids, answers, questions = self._store.approved(version)
+            self._matrix = np.stack(centroids) if centroids else None
+            self._answers = answers
+            self._numbers = [number_tokens(question) for question in questions]
+            self._mtime = mtime
+            self._kb_version = version
+
+    def match(self, query):
+        """Return the approved answer for the closest FAQ, or None."""
+        self._reload()
+        with self._lock:
+            matrix, answers, numbers = self._matrix, self._answers, self._numbers
+        if matrix is None:
+            return None
+        vector = _normalized(self.embeddings.embed_query(normalize_query(query)))
+        # an answer about assignment 3 is never served for assignment 4
+        query_numbers = number_tokens(query)
+        scores = np.where([entry == query_numbers for entry in numbers], matrix @ vector, -np.inf)
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            self.misses += 1
+            return None
+        self.hits += 1
+        print(f"FAQ hit ({scores[best]:.3f}): {query}")
+        return answers[best]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._answers),
+        }
+
+
+def _llm_answer():
+    """Answer a question through the live router and chains, without chat history."""
+    from utils.pipeline import build_chains, call_function, route_query
+    from utils.utils import load_retriever
+
+    agent, chains_dict = build_chains(load_retriever())
+
+    def answer(question):
+        tool_call = route_query(agent, question, [])[0]
+        if tool_call["name"] not in CACHEABLE_TOOLS:
+            return tool_call["name"], None
+        return tool_call["name"], "".join(call_function(tool_call["name"], tool_call["args"], [], chains_dict))
+
+    return answer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mine and review the FAQ index built from the query log.")
+    parser.add_argument("--path", default=FAQ_INDEX_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    mine_parser = commands.add_parser("mine", help="cluster new log entries and draft answers")
+    mine_parser.add_argument("--collection", default='Python_toolkit')
+    mine_parser.add_argument("--embedding-model", default='text-embedding-ada-002')
+    mine_parser.add_argument("--top", type=int, default=TOP_CLUSTERS)
+    mine_parser.add_argument("--min-count", type=int, default=MIN_CLUSTER_SIZE)
+    mine_parser.add_argument("--db-path", default=KB_DB_PATH, help="knowledge base the answers are drafted from")
+    list_parser = commands.add_parser("list", help="show drafted answers")
+    list_parser.add_argument("--pending", action="store_true", help="only answers awaiting approval")
+    for name in ("approve", "reject"):
+        commands.add_parser(name).add_argument("ids", nargs="+", type=int)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.path) or ".", exist_ok=True)
+    store = FaqStore(args.path)
+    if args.command == "mine":
+        from utils.embedding_cache import cached_openai_embeddings
+        from utils.utils import query_db_connection
+
+        start = time.perf_counter()
+        processed = mine(query_db_connection()[args.collection], store,
+                         cached_openai_embeddings(model=args.embedding_model))
+        version = kb_version(args.db_path)
+        stale = store.reset_stale(version)
+        drafted = draft_answers(store, _llm_answer(), top=args.top, min_count=args.min_count, kb_version=version)
+        print(f"Clustered {processed} new queries, reset {stale} answers from an older knowledge base, "
+              f"drafted {drafted} answers "
+              f"in {time.perf_counter() - start:.1f}s; review with `python -m utils.faq list --pending`")
+    elif args.command == "list":
+        for cluster_id, count, tool, approved, question, answer in store.entries(pending=args.pending):
+            status = "approved" if approved else "pending"
+            print(f"[{cluster_id}] {status} {tool} x{count}: {question}\n{answer}\n")
+    else:
+        store.set_approved(args.ids, args.command == "approve")
+        print(f"{args.command}d {len(args.ids)} entries")
+
+
+if __name__ == '__main__':
+    main()
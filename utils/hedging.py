@@ -0,0 +1,207 @@
+"""
+Hedged model calls with cross-provider failover.
+
+If the primary model has not produced its first token within the tool's
+threshold, the same prompt is sent to an equivalent model from the other
+provider. Whichever starts streaming first wins and the other call is
+cancelled. A primary that fails before its first token fails over to the
+backup immediately. Hedge and win rates are tracked per tool.
+"""
+
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+
+from langchain_core.runnables import Runnable
+
+# tool -> (primary model, backup model, seconds to wait for the first token)
+HEDGE_MODELS = {
+    "rag": ("claude_haiku", "openai_gpt4o_mini", 2.0),
+    "debug": ("claude_haiku", "openai_gpt4o_mini", 2.0),
+    "chat": ("openai_gpt4o_mini", "claude_haiku", 1.5),
+}
+
+# tools whose model calls are hedged
+HEDGE_TOOLS = [t for t in os.getenv("VTA_HEDGE_TOOLS", "rag,debug,chat").split(",") if t]
+
+_DONE = object()
+
+
+class HedgeStats:
+    """Per-tool counts of requests, hedges, backup wins and failovers."""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, tool, hedged, backup_won, failover=False):
+        with self._lock:
+            counts = self._counts.setdefault(
+                tool, {"requests": 0, "hedged": 0, "backup_wins": 0, "failovers": 0})
+            counts["requests"] += 1
+            counts["hedged"] += int(hedged)
+            counts["backup_wins"] += int(backup_won)
+            counts["failovers"] += int(failover)
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for tool, counts in self._counts.items():
+                result[f"{tool}_requests"] = counts["requests"]
+                result[f"{tool}_hedged"] = counts["hedged"]
+                result[f"{tool}_failovers"] = counts["failovers"]
+                result[f"{tool}_hedge_rate"] = counts["hedged"] / counts["requests"]
+                result[f"{tool}_backup_win_rate"] = (
+                    counts["backup_wins"] / counts["hedged"] if counts["hedged"] else 0.0)
+            return result
+
+
+hedge_stats = HedgeStats()
+
+
+class _Race:
+    """Bookkeeping shared by the sync and async hedged streams."""
+
+    def __init__(self, tool, stats):
+        self.tool = tool
+        self.stats = stats
+        self.running = set()
+        self.winner = None
+        self.hedged = False
+        self.failover = False
+
+    def settle(self, label, error):
+        """Handle the first event from label; returns True when label becomes the winner."""
+        if error is None:
+            self.winner = label
+            self.stats.record(self.tool, self.hedged, label == "backup", self.failover)
+            return True
+        self.running.discard(label)
+        print(f"Hedged {self.tool} call failed on {label}: {error}")
+        if self.running or (label == "primary" and not self.hedged):
+            return False
+        raise error
+
+
+class HedgedRunnable(Runnable):
+    """Stream from primary, hedging with backup when the first token is slow."""
+
+    def __init__(self, tool, primary, backup, threshold, stats=hedge_stats):
+        self.tool = tool
+        self.primary = primary
+        self.backup = backup
+        self.threshold = threshold
+        self.stats = stats
+
+    def invoke(self, input, config=None, **kwargs):
+        result = None
+        for chunk in self.stream(input, config, **kwargs):
+            result = chunk if result is None else result + chunk
+        return result
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        result = None
+        async for chunk in self.astream(input, config, **kwargs):
+            result = chunk if result is None else result + chunk
+        return result
+
+    def stream(self, input, config=None, **kwargs):
+        events = queue.Queue()
+        cancelled = set()
+        race = _Race(self.tool, self.stats)
+
+        def run(label, runnable):
+            try:
+                for chunk in runnable.stream(input, config, **kwargs):
+                    if label in cancelled:
+                        return
+                    events.put((label, chunk, None))
+                events.put((label, _DONE, None))
+            except Exception as e:
+                events.put((label, None, e))
+
+        def start(label, runnable):
+            race.running.add(label)
+            # one thread per call, so the first chunk can be awaited with a timeout; a shared
+            # bounded pool would make concurrent answers (which hold a thread until done) queue
+            # behind each other. The context carries callback and tracing context vars.
+            threading.Thread(target=contextvars.copy_context().run, args=(run, label, runnable),
+                             name=f"hedge-{self.tool}-{label}", daemon=True).start()
+
+        start("primary", self.primary)
+        try:
+            while True:
+                try:
+                    timeout = self.threshold if not race.hedged and race.winner is None else None
+                    label, chunk, error = events.get(timeout=timeout)
+                except queue.Empty:
+                    race.hedged = True
+                    start("backup", self.backup)
+                    continue
+
+                if race.winner is None:
+                    if not race.settle(label, error):
+                        if not race.hedged:
+                            # primary failed before its first token: fail over now
+                            race.hedged = race.failover = True
+                            start("backup", self.backup)
+                        continue
+                    cancelled.update(race.running - {label})
+                if label != race.winner:
+                    continue
+                if error is not None:
+                    raise error
+                if chunk is _DONE:
+                    return
+                yield chunk
+        finally:
+            cancelled.update(race.running)
+
+    async def astream(self, input, config=None, **kwargs):
+        events = asyncio.Queue()
+        tasks = {}
+        race = _Race(self.tool, self.stats)
+
+        async def run(label, runnable):
+            try:
+                async for chunk in runnable.astream(input, config, **kwargs):
+                    await events.put((label, chunk, None))
+                await events.put((label, _DONE, None))
+            except Exception as e:
+                await events.put((label, None, e))
+
+        def start(label, runnable):
+            race.running.add(label)
+            tasks[label] = asyncio.create_task(run(label, runnable))
+
+        start("primary", self.primary)
+        try:
+            while True:
+                try:
+                    timeout = self.threshold if not race.hedged and race.winner is None else None
+                    label, chunk, error = await asyncio.wait_for(events.get(), timeout)
+                except asyncio.TimeoutError:
+                    race.hedged = True
+                    start("backup", self.backup)
+                    continue
+
+                if race.winner is None:
+                    if not race.settle(label, error):
+                        if not race.hedged:
+                            race.hedged = race.failover = True
+                            start("backup", self.backup)
+                        continue
+                    for other in race.running - {label}:
+                        tasks[other].cancel()
+                if label != race.winner:
+                    continue
+                if error is not None:
+                    raise error
+                if chunk is _DONE:
+                    return
+                yield chunk
+        finally:
+            for task in tasks.values():
+                task.cancel()
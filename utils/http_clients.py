@@ -0,0 +1,173 @@
+"""
+Shared, pooled HTTP clients for every model and embedding client.
+
+One sync and one async httpx client (HTTP/2 when the h2 package is
+installed) are shared by all ChatOpenAI, ChatAnthropic and OpenAIEmbeddings
+instances, with keep-alive tuned to outlive idle gaps between students. A
+warm-up opens connections to both providers at startup and periodically
+thereafter, so TLS handshakes stay off the request path. Connection reuse is
+counted through httpcore trace events.
+"""
+
+import asyncio
+import importlib.util
+import os
+import threading
+import time
+from functools import cached_property
+
+try:
+    # newer openai/anthropic SDKs are built on the httpx2 fork and reject plain httpx clients
+    import httpx2 as httpx
+except ImportError:
+    import httpx
+
+KEEPALIVE_EXPIRY = 300.0  # seconds an idle connection is kept open
+WARM_INTERVAL = 240.0  # re-warm before idle connections expire
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=KEEPALIVE_EXPIRY)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+HTTP2 = importlib.util.find_spec("h2") is not None
+SHARED_HTTP = os.getenv("VTA_SHARED_HTTP", "1") == "1"
+
+# providers whose connections are pre-warmed
+PROVIDER_URLS = {
+    "openai": os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+    "anthropic": os.getenv("ANTHROPIC_BASE_URL", "https://api.anthropic.com"),
+}
+
+
+class ConnectionStats:
+    """Counts requests, new connections and TLS handshakes from httpcore trace events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.handshakes = 0
+        self.warmups = 0
+
+    def trace(self, event, info):
+        with self._lock:
+            if event.endswith("send_request_headers.started"):
+                self.requests += 1
+            elif event == "connection.connect_tcp.complete":
+                self.connections += 1
+            elif event == "connection.start_tls.complete":
+                self.handshakes += 1
+
+    async def atrace(self, event, info):
+        self.trace(event, info)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "connections": self.connections,
+                "tls_handshakes": self.handshakes,
+                "reuse_rate": 1 - self.connections / self.requests if self.requests else 0.0,
+                "warmups": self.warmups,
+                "http2": int(HTTP2),
+            }
+
+
+connection_stats = ConnectionStats()
+
+
+def _add_trace(request):
+    request.extensions["trace"] = connection_stats.trace
+
+
+async def _aadd_trace(request):
+    request.extensions["trace"] = connection_stats.atrace
+
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def sync_client():
+    """The process-wide pooled httpx.Client."""
+    with _lock:
+        if "sync" not in _clients:
+            _clients["sync"] = httpx.Client(http2=HTTP2, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT,
+                                            event_hooks={"request": [_add_trace]})
+        return _clients["sync"]
+
+
+def async_client():
+    """The process-wide pooled httpx.AsyncClient."""
+    with _lock:
+        if "async" not in _clients:
+            _clients["async"] = httpx.AsyncClient(http2=HTTP2, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT,
+                                                  event_hooks={"request": [_aadd_trace]})
+        return _clients["async"]
+
+
+def openai_client_kwargs():
+    """Keyword arguments that make an OpenAI chat or embeddings client use the shared pool."""
+    return {"http_client": sync_client(), "http_async_client": async_client()}
+
+
+def share_anthropic_clients(model):
+    """Point a ChatAnthropic at the shared pool.
+
+    The installed langchain-anthropic has no http_client option; its SDK
+    clients are cached properties, so they are set before first use.
+    """
+    import anthropic
+
+    cls = type(model)
+    if not isinstance(cls.__dict__.get("_client"), cached_property):
+        return model
+    params = model._client_params
+    model.__dict__["_client"] = anthropic.Client(**params, http_client=sync_client())
+    model.__dict__["_async_client"] = anthropic.AsyncClient(**params, http_client=async_client())
+    return model
+
+
+def warm_up():
+    """Open (or keep alive) a connection to each provider with an unauthenticated request."""
+    for name, url in PROVIDER_URLS.items():
+        try:
+            sync_client().head(url, timeout=5.0)
+        except httpx.HTTPError as e:
+            print(f"Warm-up of {name} failed: {e}")
+    connection_stats.warmups += 1
+
+
+async def awarm_up():
+    """Async warm_up for the async client's pool."""
+    async def head(name, url):
+        try:
+            await async_client().head(url, timeout=5.0)
+        except httpx.HTTPError as e:
+            print(f"Warm-up of {name} failed: {e}")
+
+    await asyncio.gather(*(head(name, url) for name, url in PROVIDER_URLS.items()))
+    connection_stats.warmups += 1
+
+
+_warmer = None
+
+
+def start_warmer(interval=WARM_INTERVAL):
+    """Warm the sync pool now and then every interval seconds on a daemon thread (idempotent)."""
+    global _warmer
+    with _lock:
+        if _warmer is not None:
+            return
+
+        def run():
+            while True:
+                warm_up()
+                time.sleep(interval)
+
+        _warmer = threading.Thread(target=run, name="http-warmer", daemon=True)
+        _warmer.start()
+
+
+async def awarm_periodically(interval=WARM_INTERVAL):
+    """Keep the async pool warm; run as a task on the serving event loop."""
+    while True:
+        await awarm_up()
+        await asyncio.sleep(interval)
@@ -0,0 +1,143 @@
+"""
+Hybrid BM25 + vector retrieval with reciprocal-rank fusion.
+
+An in-process inverted index over the knowledge base chunks scores queries
+with BM25. Its ranking is fused with the dense Chroma results, and when the
+lexical match alone is strong the embedding round trip is skipped entirely.
+
+Queries naming a week, module, assignment or the syllabus are scoped to the
+matching chunks (utils.course_metadata) on both sides, and re-run unfiltered
+when the scoped search returns too little.
+"""
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, List
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from utils.course_metadata import MetadataIndex
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it me my of on or the
+this to what when where which who why will with you your
+""".split())
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """Inverted index with Okapi BM25 scoring."""
+
+    def __init__(self, documents: List[Document], k1=1.5, b=0.75):
+        self.documents = documents
+        self.k1 = k1
+        self.b = b
+
+        self.postings = defaultdict(list)  # term -> [(doc index, term frequency)]
+        self.doc_lengths = []
+        for i, doc in enumerate(documents):
+            tokens = tokenize(doc.page_content)
+            self.doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((i, tf))
+        self.avg_length = sum(self.doc_lengths) / len(documents) if documents else 0.0
+
+    @classmethod
+    def from_vectorstore(cls, db, **kwargs):
+        """Build the index from every chunk stored in a Chroma collection."""
+        stored = db.get(include=["documents", "metadatas"])
+        documents = [Document(page_content=text, metadata=metadata or {})
+                     for text, metadata in zip(stored["documents"], stored["metadatas"])]
+        return cls(documents, **kwargs)
+
+    def idf(self, term):
+        n = len(self.postings.get(term, ()))
+        return math.log((len(self.documents) - n + 0.5) / (n + 0.5) + 1)
+
+    def search(self, query, k=4, candidates=None):
+        """Return up to k (document index, score) pairs, best first, optionally among candidates only."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf(term)
+            for i, tf in self.postings.get(term, ()):
+                if candidates is not None and i not in candidates:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[i] / self.avg_length)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+    def full_match_score(self, query):
+        """Score of a document of average length containing every query term once."""
+        return sum(self.idf(term) for term in set(tokenize(query)))
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked document lists, identifying documents by their content."""
+    scores = defaultdict(float)
+    documents = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            scores[doc.page_content] += 1 / (k + rank + 1)
+            documents.setdefault(doc.page_content, doc)
+    return [documents[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuse BM25 and vector results; answer lexically alone when the match is strong."""
+
+    index: Any
+    vector_retriever: Any
+    metadata_index: Any = None
+    k: int = 4
+    rrf_k: int = 60
+    # lexical-only when the top BM25 score reaches this share of a full match
+    # and beats the runner-up by lexical_margin
+    lexical_coverage: float = 0.8
+    lexical_margin: float = 1.5
+    # scoped searches returning fewer documents are re-run unfiltered
+    min_scoped_results: int = 2
+
+    @classmethod
+    def from_vectorstore(cls, db, k=4, **kwargs):
+        index = BM25Index.from_vectorstore(db)
+        return cls(index=index, metadata_index=MetadataIndex(index.documents),
+                   vector_retriever=db.as_retriever(search_kwargs={"k": 2 * k}),
+                   k=k, **kwargs)
+
+    def _is_strong(self, query, lexical):
+        if not lexical:
+            return False
+        top = lexical[0][1]
+        second = lexical[1][1] if len(lexical) > 1 else 0.0
+        full_match = self.index.full_match_score(query)
+        return (full_match > 0 and top / full_match >= self.lexical_coverage
+                and top >= self.lexical_margin * second)
+
+    def _search(self, query, run_manager, scope=None):
+        where, candidates = scope or (None, None)
+        lexical = self.index.search(query, 2 * self.k, candidates)
+        lexical_docs = [self.index.documents[i] for i, _ in lexical]
+        # a scoped lexical answer still has to be large enough to keep
+        if self._is_strong(query, lexical) and (where is None or len(lexical) >= self.min_scoped_results):
+            return lexical_docs[:self.k]
+
+        filter_kwargs = {"filter": where} if where is not None else {}
+        vector_docs = self.vector_retriever.invoke(query, config={"callbacks": run_manager.get_child()},
+                                                   **filter_kwargs)
+        return reciprocal_rank_fusion([lexical_docs, vector_docs], k=self.rrf_k)[:self.k]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        scope = self.metadata_index.scope(query) if self.metadata_index is not None else None
+        if scope is not None:
+            documents = self._search(query, run_manager, scope)
+            if len(documents) >= self.min_scoped_results:
+                return documents
+            self.metadata_index.record_fallback(scope[1])
+        return self._search(query, run_manager)
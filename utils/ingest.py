@@ -0,0 +1,210 @@
+"""
+Incremental knowledge base ingestion for data/chroma_db.
+
+Streams course documents (markdown/text, CSV, PDF, notebooks), splits them
+into chunks and identifies every chunk by a hash of its source and content.
+Only new chunks are embedded; chunks that disappeared from a source are
+deleted. Every chunk carries course-structure metadata (doc_type, week,
+module, assignment; see utils.course_metadata), which is refreshed in place
+on unchanged chunks without re-embedding them. A version stamp is written
+next to the collection afterwards.
+
+Usage:
+    python -m utils.ingest data/course_docs trial.ipynb [--prune] [--dry-run]
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+from langchain_community.vectorstores import Chroma
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from utils.course_metadata import infer_metadata
+from utils.embedding_cache import EMBEDDING_BATCH_SIZE, cached_openai_embeddings
+
+KB_DB_PATH = 'data/chroma_db'
+KB_VERSION_FILE = 'kb_version.json'
+SUPPORTED_EXTENSIONS = ('.md', '.txt', '.csv', '.pdf', '.ipynb')
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+
+def _read_csv(path):
+    # same layout as LangChain's CSVLoader: one "column: value" line per field
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        for row_number, row in enumerate(csv.DictReader(f)):
+            text = "\n".join(f"{k.strip()}: {(v or '').strip()}" for k, v in row.items() if k)
+            yield text, {"row": row_number}
+
+
+def _read_pdf(path):
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        print(f"Skipping {path}: install pypdf to ingest PDF files")
+        return
+    for page_number, page in enumerate(PdfReader(path).pages):
+        yield page.extract_text() or "", {"page": page_number + 1}
+
+
+def _read_notebook(path):
+    with open(path, encoding='utf-8') as f:
+        notebook = json.load(f)
+    cells = []
+    for cell in notebook.get("cells", []):
+        source = "".join(cell.get("source", []))
+        if not source.strip():
+            continue
+        cells.append(f"```python\n{source}\n```" if cell.get("cell_type") == "code" else source)
+    yield "\n\n".join(cells), {}
+
+
+def _read_text(path):
+    with open(path, encoding='utf-8') as f:
+        yield f.read(), {}
+
+
+READERS = {
+    '.csv': _read_csv,
+    '.pdf': _read_pdf,
+    '.ipynb': _read_notebook,
+    '.md': _read_text,
+    '.txt': _read_text,
+}
+
+
+def iter_sources(paths):
+    """Yield supported files under the given files or directories."""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for file_name in sorted(files):
+                    if file_name.lower().endswith(SUPPORTED_EXTENSIONS):
+                        yield os.path.join(root, file_name)
+        elif path.lower().endswith(SUPPORTED_EXTENSIONS):
+            yield path
+        else:
+            print(f"Skipping unsupported file: {path}")
+
+
+def chunk_id(source, text):
+    """Content hash identifying a chunk within its source."""
+    return hashlib.sha256(f"{source}\0{text}".encode('utf-8')).hexdigest()
+
+
+def iter_chunks(source, splitter):
+    """Yield (id, text, metadata) for every chunk of a source file."""
+    reader = READERS[os.path.splitext(source)[1].lower()]
+    for text, metadata in reader(source):
+        for text_chunk in splitter.split_text(text):
+            yield (chunk_id(source, text_chunk), text_chunk,
+                   {"source": source, **metadata, **infer_metadata(source, text_chunk)})
+
+
+def write_version(db_path, ids, added, deleted, retagged=0):
+    """Record a version stamp for the current contents of the collection."""
+    stamp = {
+        "version": hashlib.sha256("\n".join(sorted(ids)).encode('utf-8')).hexdigest()[:16],
+        "updated_at": datetime.now().isoformat(timespec='seconds'),
+        "chunks": len(ids),
+        "added": added,
+        "deleted": deleted,
+        "retagged": retagged,
+    }
+    with open(os.path.join(db_path, KB_VERSION_FILE), 'w', encoding='utf-8') as f:
+        json.dump(stamp, f, indent=2)
+    return stamp
+
+
+def ingest(paths, db_path=KB_DB_PATH, embedding_model='text-embedding-ada-002',
+           chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, prune=False, dry_run=False):
+    """Sync the Chroma collection with the given documents, embedding only changed chunks."""
+    db = Chroma(persist_directory=db_path, embedding_function=cached_openai_embeddings(embedding_model))
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    # existing chunk ids per source
+    existing = {}
+    stored = db.get(include=["metadatas"])
+    stored_metadata = dict(zip(stored["ids"], stored["metadatas"]))
+    for chunk, metadata in stored_metadata.items():
+        existing.setdefault((metadata or {}).get("source"), set()).add(chunk)
+
+    added, deleted, retagged = 0, 0, 0
+    seen_sources = set()
+    for source in iter_sources(paths):
+        seen_sources.add(source)
+        old_ids = existing.get(source, set())
+        new_ids = set()
+        pending, retag = [], []
+        for chunk, text, metadata in iter_chunks(source, splitter):
+            if chunk in new_ids:
+                continue
+            new_ids.add(chunk)
+            if chunk not in old_ids:
+                pending.append((chunk, text, metadata))
+            elif stored_metadata.get(chunk) != metadata:
+                retag.append((chunk, metadata))
+
+        stale = old_ids - new_ids
+        print(f"{source}: {len(pending)} new, {len(stale)} removed, {len(new_ids) - len(pending)} unchanged"
+              + (f" ({len(retag)} metadata updated)" if retag else ""))
+        if dry_run:
+            continue
+
+        for start in range(0, len(pending), EMBEDDING_BATCH_SIZE):
+            batch = pending[start:start + EMBEDDING_BATCH_SIZE]
+            db.add_texts(
+                texts=[text for _, text, _ in batch],
+                metadatas=[metadata for _, _, metadata in batch],
+                ids=[chunk for chunk, _, _ in batch])
+        if retag:
+            # metadata only: the stored embeddings stay as they are
+            db._collection.update(ids=[chunk for chunk, _ in retag], metadatas=[metadata for _, metadata in retag])
+        if stale:
+            db.delete(ids=list(stale))
+        added += len(pending)
+        retagged += len(retag)
+        deleted += len(stale)
+
+    if prune:
+        for source, ids in existing.items():
+            if source not in seen_sources:
+                print(f"{source}: {len(ids)} removed (source no longer present)")
+                if not dry_run:
+                    db.delete(ids=list(ids))
+                    deleted += len(ids)
+
+    if dry_run:
+        return None
+    return write_version(db_path, db.get(include=[])["ids"], added, deleted, retagged)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally ingest course documents into the knowledge base.")
+    parser.add_argument("paths", nargs="+", help="files or directories to ingest")
+    parser.add_argument("--db-path", default=KB_DB_PATH)
+    parser.add_argument("--embedding-model", default='text-embedding-ada-002')
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP)
+    parser.add_argument("--prune", action="store_true",
+                        help="delete chunks whose source file is not among the given paths")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stamp = ingest(args.paths, db_path=args.db_path, embedding_model=args.embedding_model,
+                   chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap,
+                   prune=args.prune, dry_run=args.dry_run)
+    if stamp:
+        print(f"KB version {stamp['version']}: {stamp['chunks']} chunks "
+              f"(+{stamp['added']} / -{stamp['deleted']}, {stamp['retagged']} retagged) "
+              f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Per-request latency and token instrumentation.
+
+RequestMetricsHandler is a LangChain callback handler attached to the router
+call, the retriever and the answer chain of a single request. It produces one
+record per request (router latency, tool, retrieval latency and document
+count, time-to-first-token, tokens/sec, tokens per model) that is stored,
+flattened, with the query log and fed into rolling histograms in the
+process-wide `metrics` registry, which renders as a Prometheus-style text
+dump.
+"""
+
+import threading
+import time
+from collections import defaultdict, deque
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+HISTOGRAM_WINDOW = 1000  # most recent observations kept per metric
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class MetricsRegistry:
+    """Rolling histograms of recent observations, plus gauges read from stats() callables."""
+
+    def __init__(self, window=HISTOGRAM_WINDOW):
+        self.window = window
+        self._histograms = defaultdict(lambda: deque(maxlen=self.window))
+        self._counters = defaultdict(int)
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._histograms[key].append(value)
+            self._counters[key] += 1
+
+    def register_stats(self, prefix, stats_fn):
+        """Expose the numeric values of stats_fn() as gauges named prefix_<key>."""
+        self._gauges[prefix] = stats_fn
+
+    def snapshot(self):
+        """Return {(name, labels): (count, sum, {quantile: value})} over the rolling window."""
+        with self._lock:
+            items = [(key, list(values), self._counters[key]) for key, values in self._histograms.items()]
+        result = {}
+        for key, values, count in items:
+            values.sort()
+            quantiles = {q: values[min(len(values) - 1, int(q * len(values)))] for q in QUANTILES}
+            result[key] = (count, sum(values), quantiles)
+        return result
+
+    def render_text(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for (name, labels), (count, total, quantiles) in sorted(self.snapshot().items()):
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels)
+            for q, value in quantiles.items():
+                q_labels = f'{label_text},quantile="{q}"' if label_text else f'quantile="{q}"'
+                lines.append(f"vta_{name}{{{q_labels}}} {value:.6g}")
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"vta_{name}_sum{suffix} {total:.6g}")
+            lines.append(f"vta_{name}_count{suffix} {count}")
+        for prefix, stats_fn in sorted(self._gauges.items()):
+            for key, value in stats_fn().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"vta_{prefix}_{key} {value:.6g}")
+        return "\n".join(lines) + "\n"
+
+
+# process-wide registry shared by every session
+metrics = MetricsRegistry()
+
+
+def _model_name(metadata, kwargs):
+    params = kwargs.get("invocation_params") or {}
+    return ((metadata or {}).get("ls_model_name") or params.get("model")
+            or params.get("model_name") or "unknown")
+
+
+class RequestMetricsHandler(BaseCallbackHandler):
+    """Collect timings and token counts for one request."""
+
+    def __init__(self, registry=metrics):
+        self.registry = registry
+        self.start = time.perf_counter()
+        self.record = {"tool": None, "router": None, "router_latency": None,
+                       "retrieval_latency": None, "retrieval_docs": None,
+                       "time_to_first_token": None, "tokens_per_sec": None,
+                       "total_latency": None, "tokens": {}}
+        self._runs = {}
+        self._first_token = None
+        self._lock = threading.Lock()
+
+    # routing and streaming are marked by the pipeline itself
+
+    def record_route(self, tool, seconds, method):
+        self.record.update(tool=tool, router=method, router_latency=seconds)
+
+    def track_stream(self, stream):
+        """Wrap an answer stream to time its first chunk and its end."""
+        for chunk in stream:
+            if self._first_token is None:
+                self._first_token = time.perf_counter()
+            yield chunk
+
+    async def atrack_stream(self, stream):
+        """Async track_stream."""
+        async for chunk in stream:
+            if self._first_token is None:
+                self._first_token = time.perf_counter()
+            yield chunk
+
+    # LangChain callbacks
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        with self._lock:
+            self._runs[run_id] = {"model": _model_name(metadata, kwargs), "start": time.perf_counter(),
+                                  "first_token": None, "tokens": 0}
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None:
+            if run["first_token"] is None:
+                run["first_token"] = time.perf_counter()
+            run["tokens"] += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        end = time.perf_counter()
+
+        usage = None
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or usage
+        input_tokens = usage["input_tokens"] if usage else 0
+        output_tokens = usage["output_tokens"] if usage else run["tokens"]
+
+        totals = self.record["tokens"].setdefault(run["model"], {"input": 0, "output": 0})
+        totals["input"] += input_tokens
+        totals["output"] += output_tokens
+
+        if run["first_token"] is not None and output_tokens and end > run["first_token"]:
+            self.record["tokens_per_sec"] = output_tokens / (end - run["first_token"])
+        self.registry.observe("llm_latency_seconds", end - run["start"], model=run["model"])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs):
+        # only time the outermost retriever (the hybrid retriever wraps a vector one)
+        if parent_run_id is None or parent_run_id not in self._runs:
+            with self._lock:
+                self._runs[run_id] = {"start": time.perf_counter()}
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is not None and self.record["retrieval_latency"] is None:
+            self.record["retrieval_latency"] = time.perf_counter() - run["start"]
+            self.record["retrieval_docs"] = len(documents)
+
+    def finish(self):
+        """Close the record, feed the histograms and return the record."""
+        end = time.perf_counter()
+        record = self.record
+        record["total_latency"] = end - self.start
+        if self._first_token is not None:
+            record["time_to_first_token"] = self._first_token - self.start
+
+        tool = record["tool"] or "unknown"
+        for field in ("router_latency", "retrieval_latency", "time_to_first_token", "total_latency"):
+            if record[field] is not None:
+                self.registry.observe(f"{field}_seconds", record[field], tool=tool)
+        if record["retrieval_docs"] is not None:
+            self.registry.observe("retrieval_docs", record["retrieval_docs"], tool=tool)
+        if record["tokens_per_sec"] is not None:
+            self.registry.observe("tokens_per_sec", record["tokens_per_sec"], tool=tool)
+        for model, tokens in record["tokens"].items():
+            self.registry.observe("input_tokens", tokens["input"], model=model)
+            self.registry.observe("output_tokens", tokens["output"], model=model)
+        return record
+
+    def log_fields(self):
+        """Finish the request and return flat fields for its query log document."""
+        record = self.finish()
+        # a list rather than a dict: model names such as gpt-3.5-turbo are not valid Mongo keys
+        tokens = [{"model": model, **counts} for model, counts in record["tokens"].items()]
+        answer_model = max(tokens, key=lambda t: t["output"], default={}).get("model")
+        return {
+            "tool": record["tool"],
+            "router": record["router"],
+            "model": answer_model,
+            "latency": record["total_latency"],
+            "time_to_first_token": record["time_to_first_token"],
+            "input_tokens": sum(t["input"] for t in tokens),
+            "output_tokens": sum(t["output"] for t in tokens),
+            "tokens": tokens,
+            "metrics": {k: v for k, v in record.items() if k != "tokens"},
+        }
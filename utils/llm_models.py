@@ -1,58 +1,117 @@
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
+import threading
+import utils.http_clients as http
 
 # Create a couple of Global Variables
 TEMPERATURE = 0.2
 MAX_TOKENS = 512
 
-# Code generation llm with gpt-3.5
-openai_gpt35 = ChatOpenAI(temperature=TEMPERATURE, 
-                 model="gpt-3.5-turbo",
-                 verbose=False,
-                 max_tokens=300,
-                 )
+# Model clients are built on first use, once per process, from these configs.
+# They are still available as module attributes, e.g. llm_models.claude_haiku
+MODEL_CONFIGS = {
+    # Code generation llm with gpt-3.5
+    'openai_gpt35': (ChatOpenAI, dict(
+        temperature=TEMPERATURE,
+        model="gpt-3.5-turbo",
+        verbose=False,
+        max_tokens=300,
+        )),
 
-openai_gpt4o_mini = ChatOpenAI(temperature=TEMPERATURE, 
-                 model="gpt-4o-mini",
-                 verbose=False,
-                 max_tokens=300,
-                 )
+    'openai_gpt4o_mini': (ChatOpenAI, dict(
+        temperature=TEMPERATURE,
+        model="gpt-4o-mini",
+        verbose=False,
+        max_tokens=300,
+        )),
 
-openai_4o_mini_json = ChatOpenAI(temperature=TEMPERATURE,
+    'openai_4o_mini_json': (ChatOpenAI, dict(
+        temperature=TEMPERATURE,
         model="gpt-4o-mini",
         max_tokens=300,
         model_kwargs={ "response_format": { "type": "json_object" } }
-        )
-
-# Router llm: Choose OpenAI-GPT4 for better reasoning 
-openai_gpt4 = ChatOpenAI(temperature=0.1, 
-                 model="gpt-4-0125-preview",
-                 verbose=False,
-                 max_tokens=50,
-                 )
+        )),
 
+    # Router llm: Choose OpenAI-GPT4 for better reasoning
+    'openai_gpt4': (ChatOpenAI, dict(
+        temperature=0.1,
+        model="gpt-4-0125-preview",
+        verbose=False,
+        max_tokens=50,
+        )),
 
-openai_gpt4o = ChatOpenAI(temperature=0.1, 
+    'openai_gpt4o': (ChatOpenAI, dict(
+        temperature=0.1,
         model='gpt-4o',
-        # max_tokens=self.max_tokens,,
-        )
+        )),
 
-# define the Anthropic chat client
-# overall style seems consistent with the OpenAI chat client
-claude_sonnet = ChatAnthropic(
+    # define the Anthropic chat client
+    # overall style seems consistent with the OpenAI chat client
+    'claude_sonnet': (ChatAnthropic, dict(
         model='claude-sonnet-4-5',
         temperature=TEMPERATURE,
         max_tokens=MAX_TOKENS
-        )
+        )),
 
-claude_opus = ChatAnthropic(
+    'claude_opus': (ChatAnthropic, dict(
         model='claude-3-opus-20240229',
         temperature=TEMPERATURE,
         max_tokens=MAX_TOKENS
-        )
+        )),
 
-claude_haiku = ChatAnthropic(
+    'claude_haiku': (ChatAnthropic, dict(
         model='claude-haiku-4-5',
         temperature=TEMPERATURE,
         max_tokens=MAX_TOKENS
-        )
+        )),
+}
+
+_clients = {}
+_overrides = {}
+_lock = threading.Lock()
+
+
+def _config_key(cls, kwargs):
+    return (cls.__name__, repr(sorted(kwargs.items())))
+
+
+def override_models(models):
+    """Replace named model clients, e.g. with fakes for offline benchmarks."""
+    with _lock:
+        _overrides.update(models)
+
+
+def _build(cls, kwargs):
+    """Construct a model client on the shared, pre-warmed HTTP connection pool."""
+    if not http.SHARED_HTTP:
+        return cls(**kwargs)
+    if cls is ChatAnthropic:
+        return http.share_anthropic_clients(cls(**kwargs))
+    return cls(**kwargs, **http.openai_client_kwargs())
+
+
+def get_model(name):
+    """Return the model client for name, constructing it on first use."""
+    if name in _overrides:
+        return _overrides[name]
+    cls, kwargs = MODEL_CONFIGS[name]
+    key = _config_key(cls, kwargs)
+    with _lock:
+        if key not in _clients:
+            _clients[key] = _build(cls, kwargs)
+        return _clients[key]
+
+
+def provider_of(name):
+    """Return "openai" or "anthropic" for a model config name."""
+    if name in _overrides:
+        return "fake"
+    cls, _ = MODEL_CONFIGS[name]
+    return "anthropic" if cls is ChatAnthropic else "openai"
+
+
+def __getattr__(name):
+    # lazily resolve the legacy module-level clients, e.g. llms.claude_haiku
+    if name in MODEL_CONFIGS:
+        return get_model(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,138 @@
+"""
+Session memory: a rolling summary of older turns plus the recent turns verbatim.
+
+Turns that fall out of the recent window are folded into the summary on a
+background thread after the answer has streamed, so summarizing never
+delays a response. Until a fold finishes, the evicted turns are still
+passed verbatim. The summarizer is extractive by default (no model call);
+VTA_SUMMARY_MODE=llm uses a cheap model instead.
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from utils.context import SUMMARY_MESSAGE_ID, count_tokens, truncate_text
+
+RECENT_MESSAGES = 4  # verbatim messages kept after the summary (two turns)
+SUMMARY_TOKENS = 250
+SUMMARY_MODE = os.getenv("VTA_SUMMARY_MODE", "extractive")
+SUMMARY_MODEL = 'openai_gpt4o_mini'
+
+SUMMARY_PROMPT = """Update the running summary of a tutoring conversation between a student and a Python TA.
+Keep the topics, exercises, code problems and decisions the student may refer back to; drop pleasantries.
+Reply with the updated summary only, in at most {max_words} words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}"""
+
+CODE_BLOCK_RE = re.compile(r"```.*?(```|$)", re.DOTALL)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+# summaries are folded off the request path
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory")
+
+
+def _first_sentence(text, max_chars=160):
+    text = " ".join(CODE_BLOCK_RE.sub(" [code] ", text).split())
+    return SENTENCE_END_RE.split(text, 1)[0][:max_chars]
+
+
+def extractive_summary(summary, messages, max_tokens=SUMMARY_TOKENS):
+    """Append one line per evicted turn (the question, the first sentence of the answer), oldest dropped first."""
+    lines = [line for line in summary.splitlines() if line]
+    for message in messages:
+        role = "Student" if isinstance(message, HumanMessage) else "TA"
+        lines.append(f"{role}: {_first_sentence(message.content)}")
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+    return truncate_text("\n".join(lines), max_tokens)
+
+
+def llm_summarizer(model_name=SUMMARY_MODEL):
+    """Return a summarizer that asks a cheap model to update the summary, at the lowest priority."""
+    import utils.llm_models as llms
+    import utils.registry as registry
+    from utils.scheduler import PRIORITIES
+
+    model = registry.cached(("summary", model_name), lambda: registry.scheduled(
+        llms.get_model(model_name), model_name, PRIORITIES["summary"]))
+
+    def summarize(summary, messages, max_tokens=SUMMARY_TOKENS):
+        turns = "\n".join(
+            f"{'Student' if isinstance(m, HumanMessage) else 'TA'}: {truncate_text(m.content, 300)}" for m in messages)
+        prompt = SUMMARY_PROMPT.format(summary=summary or "(none)", turns=turns, max_words=int(max_tokens * 0.7))
+        try:
+            return truncate_text(model.invoke(prompt).content, max_tokens)
+        except Exception as e:
+            print(f"Summary update failed, falling back to extractive: {e}")
+            return extractive_summary(summary, messages, max_tokens)
+
+    return summarize
+
+
+def default_summarizer():
+    return llm_summarizer() if SUMMARY_MODE == "llm" else extractive_summary
+
+
+class SessionMemory:
+    """Rolling summary + recent turns for one conversation."""
+
+    def __init__(self, initial_messages=(), summarizer=None, recent_messages=RECENT_MESSAGES,
+                 summary_tokens=SUMMARY_TOKENS):
+        self.summarizer = summarizer or default_summarizer()
+        self.recent_messages = recent_messages
+        self.summary_tokens = summary_tokens
+        self.summary = ""
+        self.recent = list(initial_messages)
+        self._pending = []  # evicted turns not yet folded into the summary
+        self._lock = threading.Lock()
+        self._folding = None
+
+    def messages(self):
+        """The bounded history passed to the chains: summary, unfolded turns, recent turns."""
+        with self._lock:
+            head = [AIMessage(f"Summary of the earlier conversation:\n{self.summary}", id=SUMMARY_MESSAGE_ID)
+                    ] if self.summary else []
+            return head + list(self._pending) + list(self.recent)
+
+    def add_turn(self, query, answer):
+        """Record a finished turn and fold evicted turns into the summary in the background."""
+        with self._lock:
+            self.recent += [HumanMessage(query), AIMessage(answer)]
+            if len(self.recent) > self.recent_messages:
+                self._pending += self.recent[:-self.recent_messages]
+                del self.recent[:-self.recent_messages]
+            if self._pending and self._folding is None:
+                self._folding = _executor.submit(self._fold)
+
+    def _fold(self):
+        while True:
+            with self._lock:
+                batch = list(self._pending)
+                summary = self.summary
+                if not batch:
+                    self._folding = None
+                    return
+            try:
+                summary = self.summarizer(summary, batch, self.summary_tokens)
+            except Exception as e:
+                print(f"Summary update failed: {e}")
+                with self._lock:
+                    self._folding = None
+                return
+            with self._lock:
+                self.summary = summary
+                del self._pending[:len(batch)]
+
+    def wait(self, timeout=None):
+        """Block until pending turns are folded (tests and shutdown)."""
+        folding = self._folding
+        if folding is not None:
+            folding.result(timeout)
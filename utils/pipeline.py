@@ -0,0 +1,258 @@
+"""
+Request pipeline shared by the Streamlit app, the API server and offline
+tools: building the chains, routing a query to a tool and streaming the
+tool's answer. Async variants (aroute_query, acall_function) serve many
+conversations on one event loop.
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import HumanMessage
+
+import utils.chains_lcel as chains
+import utils.llm_models as llms
+import utils.registry as registry
+from utils.answer_cache import CACHEABLE_TOOLS, replay_stream
+from utils.cascade import CASCADE_MODELS, CHECKS, CascadeChain
+from utils.context import ROUTER_HISTORY_TOKENS, budget_for, trim_history, truncate_text
+from utils.debug_analyzer import LOCAL_DEBUG, analyze
+from utils.hedging import HEDGE_MODELS, HEDGE_TOOLS
+from utils.scheduler import PRIORITIES
+from utils.tools import create_tool_chain
+
+ROUTER_PROMPT = """
+            Your only task is to decide which tool to call based on the user query delimited with <query> tags and chat history, and generate the appropriate arguements for the tool call.
+
+            Previous conversation: {conversation_context} \n
+            Query: <query>{user_query}</query>\n
+            Generate the tool call with appropriate arguments. Do not generate direct response. Enrich the query for the tool call when appropriate, but don't fundamentally change it. Limit query to no more than 25 tokens.
+            """
+
+# tools answered by a small model first, escalating to a large one when a local check fails.
+# Off by default: the small answer is buffered for the check, which delays the first token
+CASCADE_TOOLS = [t for t in os.getenv("VTA_CASCADE_TOOLS", "").split(",") if t]
+
+# background worker for router shadow checks, off the request path
+_shadow_executor = ThreadPoolExecutor(max_workers=2)
+
+
+def router_input(user_query, chat_history):
+    """Build the prompt for the tool-bound LLM router."""
+    conversation_context = "\n".join([
+        f"{'User' if isinstance(msg, HumanMessage) else 'Assistant'}: {msg.content}"
+        for msg in trim_history(chat_history, ROUTER_HISTORY_TOKENS)  # recent exchanges within budget
+    ])
+    return ROUTER_PROMPT.format(conversation_context=conversation_context, user_query=user_query)
+
+
+def _shadow_check(agent, router, decision, prompt):
+    try:
+        tool_call = agent.invoke(prompt)
+        router.record_llm_decision(decision, tool_call.tool_calls[0]["name"])
+    except Exception as e:
+        print(f"Router shadow check failed: {e}")
+
+
+def route_query(agent, user_query, chat_history, router=None, handler=None, decision=None,
+                decision_seconds=0.0):
+    """
+    Decide which tool to call, returning a list of tool calls.
+
+    The local router answers confident queries without an LLM call; the
+    tool-bound agent handles the rest. A local decision the caller already
+    made is reused instead of routing again; decision_seconds is the time it
+    took, so the recorded routing latency still includes it. When a
+    RequestMetricsHandler is given, it is attached to the router call and
+    receives the routing decision.
+    """
+    start = time.perf_counter() - decision_seconds
+    prompt = router_input(user_query, chat_history)
+
+    if router is not None:
+        if decision is None:
+            decision = router.route(user_query)
+        if decision.name is not None:
+            if router.should_shadow():
+                _shadow_executor.submit(_shadow_check, agent, router, decision, prompt)
+            if handler is not None:
+                handler.record_route(decision.name, time.perf_counter() - start, decision.method)
+            return decision.tool_calls(user_query)
+
+    config = {"tags": ["router"], "callbacks": [handler] if handler is not None else None}
+    tool_call = agent.invoke(prompt, config=config)
+    if router is not None:
+        router.record_llm_decision(decision, tool_call.tool_calls[0]["name"])
+    if handler is not None:
+        handler.record_route(tool_call.tool_calls[0]["name"], time.perf_counter() - start, "llm")
+    return tool_call.tool_calls
+
+
+def _hedge(tool, hedge_tools):
+    """The (tool, backup model, threshold) hedge for a tool's chain, or None."""
+    if tool not in hedge_tools:
+        return None
+    _, backup, threshold = HEDGE_MODELS[tool]
+    return (tool, backup, threshold)
+
+
+def build_chains(retriever, cascade_tools=CASCADE_TOOLS, hedge_tools=HEDGE_TOOLS):
+    """Return the tool-bound router and the chains for each tool, built once per process."""
+    # Create base chains, keyed by model config name; single-provider tools race the other provider
+    chains_dict = {
+        'rag': registry.get_chain(chains.rag_chain, 'claude_haiku', retriever, priority=PRIORITIES['rag'],
+                                  hedge=_hedge('rag', hedge_tools)),
+        'exercise': registry.get_chain(chains.exercise_chain, 'claude_sonnet', priority=PRIORITIES['exercise']),
+        'chat': registry.get_chain(chains.chat_chain, 'openai_gpt4o_mini', priority=PRIORITIES['chat'],
+                                   hedge=_hedge('chat', hedge_tools)),
+        'explain': registry.get_chain(chains.code_chain, 'openai_gpt4o', priority=PRIORITIES['explain']),
+        'debug': registry.get_chain(chains.code_chain, 'claude_haiku', priority=PRIORITIES['debug'],
+                                    hedge=_hedge('debug', hedge_tools)),
+    }
+
+    # Wrap cascade tools: small model first, the chain above as the large model
+    factories = {'explain': chains.code_chain, 'exercise': chains.exercise_chain}
+    for tool in cascade_tools:
+        small, large = CASCADE_MODELS[tool]
+        chains_dict[tool] = registry.cached(
+            ('cascade', tool, small, large),
+            lambda: CascadeChain(tool, registry.get_chain(factories[tool], small, priority=PRIORITIES[tool]),
+                                 chains_dict[tool], CHECKS[tool],
+                                 max_tokens=llms.MODEL_CONFIGS[small][1].get('max_tokens')))
+
+    # Create tool chain; router calls go ahead of every other queued call
+    tool_chain = registry.cached(
+        ('tool_chain', 'openai_gpt4o_mini', id(retriever)),
+        lambda: registry.scheduled(create_tool_chain(llms.get_model('openai_gpt4o_mini'), chains_dict),
+                                   'openai_gpt4o_mini', PRIORITIES['router']))
+
+    return tool_chain, chains_dict
+
+
+# chain used by each tool
+TOOL_CHAINS = {
+    "course_information": "rag",
+    "explain_concept": "explain",
+    "generate_exercise": "exercise",
+    "debug_code": "debug",
+    "general_chat": "chat",
+}
+
+
+def tool_input(name, args: dict, chat_history, context=None):
+    """Return the chain input for a tool call, within the tool's token budgets."""
+    # bound the prompt: history by tokens, oversized queries (code pastes) head + tail
+    chat_history = trim_history(chat_history, budget_for(name, "history", 0))
+    if budget_for(name, "query"):
+        args = {**args, 'query': truncate_text(args['query'], budget_for(name, "query"))}
+
+    if name == "course_information":
+        return {'chat_history': chat_history, 'context': context, **args}
+    if name == "debug_code":
+        return args
+    return {**args, 'chat_history': chat_history}
+
+
+def call_function(name, args: dict, chat_history, chains_dict, answer_cache=None, prefetched=None,
+                  callbacks=None, exercise_pool=None):
+    """Invoke the appropriate tool based on the name and arguments."""
+
+    # standard practice questions come ready-made from the pool
+    if exercise_pool is not None and name == "generate_exercise":
+        question = exercise_pool.serve(args['query'], chat_history, chains_dict['exercise'])
+        if question is not None:
+            return replay_stream(question)
+
+    # common beginner errors are answered from templates, the rest get a trimmed prompt
+    if LOCAL_DEBUG and name == "debug_code":
+        diagnosis = analyze(args['query'])
+        if diagnosis.answer is not None:
+            return replay_stream(diagnosis.answer)
+        if diagnosis.prompt is not None:
+            args = {**args, 'query': diagnosis.prompt}
+
+    # replay near-identical earlier answers instead of calling the chain again; cached answers are
+    # generated without the chat history (the router's rewritten query carries a follow-up's context)
+    if answer_cache is not None and name in CACHEABLE_TOOLS:
+        return answer_cache.stream_through(
+            name, args['query'],
+            lambda: call_function(name, args, [], chains_dict, prefetched=prefetched,
+                                  callbacks=callbacks))
+
+    if name not in TOOL_CHAINS:
+        return "Invalid tool name"
+
+    context = None
+    if name == "course_information" and prefetched is not None:
+        context = prefetched.documents_for(args['query'])
+    return chains_dict[TOOL_CHAINS[name]].stream(
+        input=tool_input(name, args, chat_history, context), config={"callbacks": callbacks})
+
+
+async def aroute_query(agent, user_query, chat_history, router=None, handler=None, decision=None,
+                       decision_seconds=0.0):
+    """Async route_query: the LLM router runs with ainvoke, local routing in a thread."""
+    start = time.perf_counter() - decision_seconds
+    prompt = router_input(user_query, chat_history)
+
+    if router is not None:
+        if decision is None:
+            decision = await asyncio.to_thread(router.route, user_query)
+        if decision.name is not None:
+            if router.should_shadow():
+                _shadow_executor.submit(_shadow_check, agent, router, decision, prompt)
+            if handler is not None:
+                handler.record_route(decision.name, time.perf_counter() - start, decision.method)
+            return decision.tool_calls(user_query)
+
+    config = {"tags": ["router"], "callbacks": [handler] if handler is not None else None}
+    tool_call = await agent.ainvoke(prompt, config=config)
+    if router is not None:
+        router.record_llm_decision(decision, tool_call.tool_calls[0]["name"])
+    if handler is not None:
+        handler.record_route(tool_call.tool_calls[0]["name"], time.perf_counter() - start, "llm")
+    return tool_call.tool_calls
+
+
+async def acall_function(name, args: dict, chat_history, chains_dict, answer_cache=None, prefetched=None,
+                         callbacks=None, exercise_pool=None):
+    """Async call_function: yield the tool's answer chunks from the chain's astream."""
+    if exercise_pool is not None and name == "generate_exercise":
+        question = await asyncio.to_thread(
+            exercise_pool.serve, args['query'], chat_history, chains_dict['exercise'])
+        if question is not None:
+            for chunk in replay_stream(question):
+                yield chunk
+            return
+
+    if LOCAL_DEBUG and name == "debug_code":
+        diagnosis = analyze(args['query'])
+        if diagnosis.answer is not None:
+            for chunk in replay_stream(diagnosis.answer):
+                yield chunk
+            return
+        if diagnosis.prompt is not None:
+            args = {**args, 'query': diagnosis.prompt}
+
+    if answer_cache is not None and name in CACHEABLE_TOOLS:
+        stream = answer_cache.astream_through(
+            name, args['query'],
+            lambda: acall_function(name, args, [], chains_dict, prefetched=prefetched,
+                                   callbacks=callbacks))
+        async for chunk in stream:
+            yield chunk
+        return
+
+    if name not in TOOL_CHAINS:
+        yield "Invalid tool name"
+        return
+
+    context = None
+    if name == "course_information" and prefetched is not None:
+        context = await asyncio.to_thread(prefetched.documents_for, args['query'])
+    stream = chains_dict[TOOL_CHAINS[name]].astream(
+        input=tool_input(name, args, chat_history, context), config={"callbacks": callbacks})
+    async for chunk in stream:
+        yield chunk
@@ -0,0 +1,178 @@
+"""
+Non-blocking, batched query logging.
+
+Requests put documents on a bounded queue; a writer thread drains it with
+insert_many in batches. When the queue is full or MongoDB is unreachable,
+documents are appended to a local JSONL spill file, which is replayed once
+inserts succeed again.
+
+Any object with an insert_many(documents, ordered=False) method works as the
+collection, so a mongomock collection can stand in for Atlas locally.
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError
+
+QUERY_LOG_SPILL_PATH = 'data/query_log_spill.jsonl'
+MAX_QUEUE_SIZE = 1000
+BATCH_SIZE = 50
+FLUSH_INTERVAL = 2.0  # seconds
+RETRY_INTERVAL = 30.0  # seconds before retrying MongoDB after a failure
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return str(value)
+
+
+def _decode(obj):
+    if set(obj) == {"$date"}:
+        return datetime.fromisoformat(obj["$date"])
+    return obj
+
+
+class QueryLogger:
+    """Background writer that batches query documents into a MongoDB collection."""
+
+    def __init__(self, collection, spill_path=QUERY_LOG_SPILL_PATH, max_queue_size=MAX_QUEUE_SIZE,
+                 batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, retry_interval=RETRY_INTERVAL):
+        self.collection = collection
+        self.spill_path = spill_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._spill_lock = threading.Lock()
+        self._retry_at = 0.0
+        self._stop = threading.Event()
+
+        self.written = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.dropped = 0
+        self.failures = 0
+
+        self._thread = threading.Thread(target=self._run, name="query-logger", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, **kwargs):
+        """Queue a query document without blocking the request."""
+        document = {"timestamp": datetime.now()}
+        document.update(kwargs)
+        try:
+            self._queue.put_nowait(document)
+        except queue.Full:
+            self._spill([document])
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch:
+                self._write(batch)
+                for _ in batch:
+                    self._queue.task_done()
+            elif self._retry_at and time.monotonic() >= self._retry_at:
+                self._replay()
+
+    def _insert(self, documents):
+        """Insert documents, returning the ones that failed."""
+        try:
+            # insert_many adds _id to the documents it is given, keep ours clean
+            self.collection.insert_many([dict(d) for d in documents], ordered=False)
+            return []
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            return [d for i, d in enumerate(documents) if i in failed]
+        except Exception as e:
+            print(f"Query log insert failed: {e}")
+            return documents
+
+    def _write(self, batch):
+        if time.monotonic() < self._retry_at:
+            self._spill(batch)
+            return
+
+        failed = self._insert(batch)
+        self.written += len(batch) - len(failed)
+        if failed:
+            self.failures += 1
+            self._retry_at = time.monotonic() + self.retry_interval
+            self._spill(failed)
+        elif self._retry_at or os.path.exists(self.spill_path):
+            self._retry_at = 0.0
+            self._replay()
+
+    def _spill(self, documents):
+        try:
+            with self._spill_lock, open(self.spill_path, "a", encoding="utf-8") as f:
+                for document in documents:
+                    f.write(json.dumps(document, default=_encode) + "\n")
+            self.spilled += len(documents)
+        except OSError as e:
+            print(f"Query log spill failed, dropping {len(documents)} documents: {e}")
+            self.dropped += len(documents)
+
+    def _replay(self):
+        """Move spilled documents back into MongoDB."""
+        replay_path = self.spill_path + ".replay"
+        with self._spill_lock:
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    self._retry_at = 0.0
+                    return
+                os.replace(self.spill_path, replay_path)
+
+        with open(replay_path, encoding="utf-8") as f:
+            documents = [json.loads(line, object_hook=_decode) for line in f if line.strip()]
+
+        remaining = []
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start:start + self.batch_size]
+            failed = self._insert(batch)
+            self.replayed += len(batch) - len(failed)
+            if failed:
+                remaining = failed + documents[start + self.batch_size:]
+                break
+
+        os.remove(replay_path)
+        if remaining:
+            self.failures += 1
+            self._retry_at = time.monotonic() + self.retry_interval
+            self.spilled -= len(remaining)  # counted again by _spill
+            self._spill(remaining)
+        else:
+            self._retry_at = 0.0
+
+    def flush(self):
+        """Block until everything queued so far has been written or spilled."""
+        self._queue.join()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=self.flush_interval + 5)
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "written": self.written,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "dropped": self.dropped,
+            "failures": self.failures,
+        }
@@ -0,0 +1,62 @@
+"""
+Process-wide registry of LCEL chains.
+
+Each chain is built once per process, on first use, keyed by the chain
+factory, the model config name and any extra dependencies (e.g. the
+retriever), so Streamlit reruns reuse the same objects.
+"""
+
+import threading
+
+import utils.llm_models as llms
+from utils.concurrency import LimitedRunnable
+from utils.hedging import HedgedRunnable
+from utils.scheduler import DEFAULT_PRIORITY, ScheduledRunnable
+
+_chains = {}
+_lock = threading.RLock()
+
+
+def cached(key, build):
+    """Return the object registered under key, calling build() the first time."""
+    with _lock:
+        if key not in _chains:
+            _chains[key] = build()
+        return _chains[key]
+
+
+def scheduled(runnable, model_name, priority=DEFAULT_PRIORITY):
+    """
+    Wrap a model (or model-bound runnable) for the named model config.
+
+    Calls queue by priority within the model's rate budget and retry on
+    429s; async calls then hold a slot of the provider's concurrency limit.
+    """
+    return ScheduledRunnable(
+        LimitedRunnable(runnable, llms.provider_of(model_name)), model_name, priority,
+        max_tokens=llms.MODEL_CONFIGS.get(model_name, (None, {}))[1].get('max_tokens'))
+
+
+def get_chain(factory, model_name, *deps, priority=DEFAULT_PRIORITY, hedge=None):
+    """
+    Return factory(model, *deps) for the named model, built once per process.
+
+    hedge is an optional (tool, backup model name, threshold seconds): calls
+    whose first token is slower than the threshold are raced on the backup.
+    """
+    key = (factory.__module__, factory.__name__, model_name, priority, hedge, *(id(dep) for dep in deps))
+
+    def build():
+        model = scheduled(llms.get_model(model_name), model_name, priority)
+        if hedge is not None:
+            tool, backup_name, threshold = hedge
+            backup = scheduled(llms.get_model(backup_name), backup_name, priority)
+            model = HedgedRunnable(tool, model, backup, threshold)
+        return factory(model, *deps)
+
+    return cached(key, build)
+
+
+def clear():
+    with _lock:
+        _chains.clear()
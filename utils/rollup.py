@@ -0,0 +1,191 @@
+"""
+Hourly analytics rollups over the query log.
+
+An incremental job reads only documents whose _id is after the last
+checkpoint (the _id index, no collection scans), and folds them into hourly
+aggregates in a local SQLite store. Aggregates are grouped by the document
+timestamp: request count and a latency histogram per tool (for p95), and
+calls and tokens per model. Latency histograms use fixed log-spaced buckets
+so hours can be merged across runs.
+
+The _id is used as the checkpoint rather than the timestamp: documents
+replayed from the query logger's spill file carry their original, older
+timestamp but get a new _id when they are finally inserted.
+
+Usage:
+    python -m utils.rollup update [--collection Python_toolkit]
+    python -m utils.rollup report [--hours 24]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from collections import defaultdict
+
+ROLLUP_PATH = 'data/rollups.sqlite3'
+ROLLUP_BATCH_SIZE = 1000
+# histogram bucket upper bounds in seconds, 0.1s to ~10 min
+LATENCY_BUCKETS = [round(0.1 * 1.25 ** i, 4) for i in range(40)]
+
+
+def bucket_index(seconds):
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if seconds <= bound:
+            return i
+    return len(LATENCY_BUCKETS) - 1
+
+
+def histogram_quantile(histogram, q):
+    """Upper bound of the bucket holding the q-th quantile of a bucket-count list."""
+    total = sum(histogram)
+    if not total:
+        return None
+    seen = 0
+    for i, count in enumerate(histogram):
+        seen += count
+        if seen >= q * total:
+            return LATENCY_BUCKETS[i]
+    return LATENCY_BUCKETS[-1]
+
+
+def _fields(document):
+    """Return (tool, latency, tokens) from a log document, including older nested records."""
+    metrics = document.get("metrics") or {}
+    tool = document.get("tool") or metrics.get("tool") or "unknown"
+    latency = document.get("latency", metrics.get("total_latency"))
+    tokens = document.get("tokens")
+    if isinstance(tokens, dict) or tokens is None:
+        tokens = [{"model": model, **counts} for model, counts in (tokens or metrics.get("tokens") or {}).items()]
+    return tool, latency, tokens
+
+
+class RollupStore:
+    """SQLite store of hourly per-tool and per-model aggregates plus the job checkpoint."""
+
+    def __init__(self, path=ROLLUP_PATH):
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_hours ("
+            "hour TEXT, tool TEXT, requests INTEGER, latency_sum REAL, latency_histogram TEXT, "
+            "PRIMARY KEY (hour, tool))")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS model_hours ("
+            "hour TEXT, model TEXT, calls INTEGER, input_tokens INTEGER, output_tokens INTEGER, "
+            "PRIMARY KEY (hour, model))")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    def checkpoint(self):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'last_id'").fetchone()
+        return row[0] if row else None
+
+    def merge(self, tools, models, last_id):
+        """Add one batch of aggregates and move the checkpoint, in one transaction."""
+        with self._conn:
+            for (hour, tool), (requests, latency_sum, histogram) in tools.items():
+                row = self._conn.execute(
+                    "SELECT requests, latency_sum, latency_histogram FROM tool_hours WHERE hour = ? AND tool = ?",
+                    (hour, tool)).fetchone()
+                if row:
+                    requests += row[0]
+                    latency_sum += row[1]
+                    histogram = [a + b for a, b in zip(histogram, json.loads(row[2]))]
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO tool_hours VALUES (?, ?, ?, ?, ?)",
+                    (hour, tool, requests, latency_sum, json.dumps(histogram)))
+            for (hour, model), (calls, input_tokens, output_tokens) in models.items():
+                self._conn.execute(
+                    "INSERT INTO model_hours VALUES (?, ?, ?, ?, ?) ON CONFLICT (hour, model) DO UPDATE SET "
+                    "calls = calls + excluded.calls, input_tokens = input_tokens + excluded.input_tokens, "
+                    "output_tokens = output_tokens + excluded.output_tokens",
+                    (hour, model, calls, input_tokens, output_tokens))
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('last_id', ?)", (str(last_id),))
+
+    def tool_hours(self, since):
+        return self._conn.execute(
+            "SELECT hour, tool, requests, latency_sum, latency_histogram FROM tool_hours "
+            "WHERE hour >= ? ORDER BY hour, tool", (since,)).fetchall()
+
+    def model_totals(self, since):
+        return self._conn.execute(
+            "SELECT model, SUM(calls), SUM(input_tokens), SUM(output_tokens) FROM model_hours "
+            "WHERE hour >= ? GROUP BY model ORDER BY SUM(output_tokens) DESC", (since,)).fetchall()
+
+
+def update(collection, store, batch_size=ROLLUP_BATCH_SIZE):
+    """Fold log documents added since the checkpoint into the store; returns the number read."""
+    from bson import ObjectId
+
+    last_id = store.checkpoint()
+    spec = {"_id": {"$gt": ObjectId(last_id)}} if last_id else {}
+    projection = {"timestamp": 1, "tool": 1, "latency": 1, "tokens": 1, "metrics": 1}
+    cursor = collection.find(spec, projection).sort("_id", 1).batch_size(batch_size)
+
+    processed = 0
+    tools, models = {}, defaultdict(lambda: [0, 0, 0])
+    for document in cursor:
+        hour = document["timestamp"].strftime("%Y-%m-%d %H:00")
+        tool, latency, tokens = _fields(document)
+
+        entry = tools.setdefault((hour, tool), [0, 0.0, [0] * len(LATENCY_BUCKETS)])
+        entry[0] += 1
+        if latency is not None:
+            entry[1] += latency
+            entry[2][bucket_index(latency)] += 1
+        for counts in tokens:
+            totals = models[(hour, counts["model"])]
+            totals[0] += 1
+            totals[1] += counts.get("input", 0)
+            totals[2] += counts.get("output", 0)
+
+        processed += 1
+        if processed % batch_size == 0:
+            store.merge(tools, models, document["_id"])
+            tools, models = {}, defaultdict(lambda: [0, 0, 0])
+    if tools:
+        store.merge(tools, models, document["_id"])
+    return processed
+
+
+def report(store, hours=24):
+    """Print hourly load and p95 latency per tool, then token totals per model."""
+    since = time.strftime("%Y-%m-%d %H:00", time.localtime(time.time() - hours * 3600))
+    print(f"{'hour':<17} {'tool':<20} {'requests':>8} {'mean s':>8} {'p95 s':>8}")
+    for hour, tool, requests, latency_sum, histogram in store.tool_hours(since):
+        histogram = json.loads(histogram)
+        timed = sum(histogram)
+        mean = f"{latency_sum / timed:.2f}" if timed else "-"
+        p95 = histogram_quantile(histogram, 0.95)
+        p95 = f"{p95:.2f}" if p95 is not None else "-"
+        print(f"{hour:<17} {tool:<20} {requests:>8} {mean:>8} {p95:>8}")
+    print(f"\n{'model':<30} {'calls':>8} {'input':>10} {'output':>10}")
+    for model, calls, input_tokens, output_tokens in store.model_totals(since):
+        print(f"{model:<30} {calls:>8} {input_tokens:>10} {output_tokens:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hourly rollups of the query log for capacity planning.")
+    parser.add_argument("--path", default=ROLLUP_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    update_parser = commands.add_parser("update", help="fold new log documents into the rollups")
+    update_parser.add_argument("--collection", default='Python_toolkit')
+    report_parser = commands.add_parser("report", help="print the latest hourly rollups")
+    report_parser.add_argument("--hours", type=int, default=24)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.path) or ".", exist_ok=True)
+    store = RollupStore(args.path)
+    if args.command == "update":
+        from utils.utils import query_db_connection
+
+        start = time.perf_counter()
+        processed = update(query_db_connection()[args.collection], store)
+        print(f"Rolled up {processed} new documents in {time.perf_counter() - start:.1f}s")
+    else:
+        report(store, hours=args.hours)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Local fast-path tool router.
+
+Picks a tool with keyword/regex rules and nearest-centroid matching over
+embeddings of labelled example queries. Only low-confidence queries are sent
+to the tool-bound LLM router.
+"""
+
+import random
+import re
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+TOOL_NAMES = ("course_information", "explain_concept", "generate_exercise",
+              "debug_code", "general_chat")
+
+# A query that matches the rules of exactly one tool is routed to it when the centroids agree
+ROUTING_RULES = {
+    "course_information": [
+        r"\bsyllabus\b", r"\boffice hours?\b", r"\b(professor|instructor|dr\.? gu)\b",
+        r"\bcontact\b", r"\b(grade|grading|late policy|attendance)\b",
+        r"\b(midterm|final exam|exam)\b", r"\b(assignment|homework|hw|week|module)\s*#?\d+\b",
+        r"\b(due date|deadline|canvas)\b",
+    ],
+    "debug_code": [
+        r"traceback \(most recent call last\)", r"\b\w+Error\b", r"\bexception\b",
+        r"\b(bug|debug|doesn't work|does not work|not working)\b", r"\bfix (my|this|the) code\b",
+    ],
+    "generate_exercise": [
+        r"\b(practice|exercise|quiz|mcq)\b", r"\b(give|generate) me (a|an|another|some) \w*\s*questions?\b",
+        r"\b(check|is) my answer\b", r"\bwhat('s| is) the (correct )?answer\b",
+    ],
+    "explain_concept": [
+        r"^\s*what('s| is| are) (a|an|the)?\s*\w+", r"\bhow (do|does|can) i\b",
+        r"\bdifference between\b", r"\bwhat does .+ (do|mean)\b",
+    ],
+    "general_chat": [
+        r"^\s*(hi|hello|hey|thanks|thank you|bye|good (morning|afternoon|evening))\b[\s!.]*$",
+        r"\bwho are you\b", r"\bwhat('s| is) your name\b",
+    ],
+}
+
+# Labelled example queries used to build one embedding centroid per tool
+EXAMPLE_QUERIES = {
+    "course_information": [
+        "How can I contact the professor?",
+        "When are the office hours?",
+        "What is the late policy for assignments?",
+        "How is the final grade calculated?",
+        "When is assignment 3 due?",
+        "What topics are covered in week 5?",
+        "Who is the teaching assistant for this course?",
+    ],
+    "explain_concept": [
+        "What's a parameter in Python function",
+        "Explain list comprehension",
+        "What is the difference between a list and a tuple?",
+        "How does a for loop work?",
+        "What does the groupby function do in pandas?",
+        "How to use my own module in Colab?",
+    ],
+    "generate_exercise": [
+        "Give me a practice question on Python functions",
+        "Can I have an exercise about loops?",
+        "Quiz me on pandas dataframes",
+        "Generate another question on dictionaries",
+        "What's the answer to the previous question?",
+        "Is my answer B correct?",
+    ],
+    "debug_code": [
+        "How to fix the error in my code?",
+        "I get a NameError when I run this cell",
+        "KeyError: 'Revenue' when selecting a column",
+        "TypeError: can only concatenate str (not \"int\") to str",
+        "My loop is not working, it prints nothing",
+        "IndentationError: expected an indented block",
+    ],
+    "general_chat": [
+        "Hi, I'm Lili",
+        "Thanks for your help!",
+        "Who are you?",
+        "Good morning Peyton",
+        "What can you help me with?",
+    ],
+}
+
+MIN_SIMILARITY = 0.80
+MIN_MARGIN = 0.03
+# a rule hit the centroids disagree with is still accepted above this similarity to its tool
+MIN_RULE_SIMILARITY = 0.85
+
+
+@dataclass
+class RouteDecision:
+    """Outcome of local routing. name is None when the LLM router must decide."""
+    name: Optional[str]
+    guess: Optional[str]
+    confidence: float
+    method: str
+
+    def tool_calls(self, query):
+        """Return the decision in the same shape as an LLM tool call."""
+        return [{"name": self.name, "args": {"query": query}, "id": None}]
+
+
+class LocalRouter:
+    """Rule + nearest-centroid router with fallback and shadow-check statistics."""
+
+    def __init__(self, embeddings, examples=EXAMPLE_QUERIES, rules=ROUTING_RULES,
+                 min_similarity=MIN_SIMILARITY, min_margin=MIN_MARGIN, min_rule_similarity=MIN_RULE_SIMILARITY,
+                 shadow_rate=0.0):
+        self.embeddings = embeddings
+        self.examples = examples
+        self.rules = {tool: [re.compile(p, re.IGNORECASE) for p in patterns]
+                      for tool, patterns in rules.items()}
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.min_rule_similarity = min_rule_similarity
+        self.shadow_rate = shadow_rate
+
+        self._centroids = None
+        self._lock = threading.Lock()
+
+        self.local_routes = 0
+        self.fallbacks = 0
+        self.checked = 0
+        self.agreed = 0
+
+    def _embed(self, texts):
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _get_centroids(self):
+        with self._lock:
+            if self._centroids is None:
+                tools = list(self.examples)
+                centroids = np.stack([self._embed(self.examples[tool]).mean(axis=0) for tool in tools])
+                centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+                self._centroids = (tools, centroids)
+            return self._centroids
+
+    def match_rules(self, query):
+        """Return the tools whose rules match the query."""
+        return [tool for tool, patterns in self.rules.items()
+                if any(p.search(query) for p in patterns)]
+
+    def route(self, query) -> RouteDecision:
+        rule_tools = self.match_rules(query)
+        tools, centroids = self._get_centroids()
+        scores = centroids @ self._embed([query])[0]
+        order = np.argsort(scores)[::-1]
+        best, second = float(scores[order[0]]), float(scores[order[1]])
+        guess = tools[order[0]]
+
+        if len(rule_tools) == 1:
+            # a single keyword hit is only trusted when the query also looks like that tool's examples
+            rule_tool = rule_tools[0]
+            rule_score = float(scores[tools.index(rule_tool)])
+            if guess == rule_tool or rule_score >= self.min_rule_similarity:
+                self.local_routes += 1
+                return RouteDecision(rule_tool, rule_tool, rule_score, "rule")
+
+        confident = best >= self.min_similarity and best - second >= self.min_margin
+        if confident and (not rule_tools or guess in rule_tools):
+            self.local_routes += 1
+            return RouteDecision(guess, guess, best, "centroid")
+
+        self.fallbacks += 1
+        return RouteDecision(None, guess, best, "llm")
+
+    def should_shadow(self):
+        """Whether a locally routed query should also be checked against the LLM router."""
+        return random.random() < self.shadow_rate
+
+    def record_llm_decision(self, decision: RouteDecision, llm_tool):
+        """Compare the local guess with the LLM router's choice to track accuracy."""
+        self.checked += 1
+        if decision.guess == llm_tool:
+            self.agreed += 1
+        print(f"Router check: local={decision.guess} ({decision.method}, "
+              f"{decision.confidence:.2f}) llm={llm_tool}")
+
+    def stats(self):
+        total = self.local_routes + self.fallbacks
+        return {
+            "local_routes": self.local_routes,
+            "fallbacks": self.fallbacks,
+            "fallback_rate": self.fallbacks / total if total else 0.0,
+            "checked": self.checked,
+            "accuracy": self.agreed / self.checked if self.checked else None,
+        }
@@ -0,0 +1,286 @@
+"""
+Rate-limit-aware scheduling of model calls.
+
+Each model has token-bucket budgets for requests/min and tokens/min.
+Callers queue by priority (router calls ahead of long exercise generations)
+until both buckets have room. Rate-limit errors (HTTP 429) are retried with
+jittered exponential backoff, honouring retry-after headers, and pause the
+model's buckets so queued calls back off too.
+
+Anything that raises an exception with status_code == 429 (e.g. a local fake
+provider) exercises the same path as the OpenAI/Anthropic SDK errors.
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from langchain_core.runnables import Runnable
+
+from utils.context import count_tokens
+from utils.instrumentation import metrics
+
+# (requests per minute, tokens per minute) per model config name; match your API tier
+MODEL_BUDGETS = {
+    'openai_gpt4o_mini': (5000, 2_000_000),
+    'openai_4o_mini_json': (5000, 2_000_000),
+    'openai_gpt4o': (5000, 800_000),
+    'openai_gpt35': (3500, 160_000),
+    'openai_gpt4': (500, 80_000),
+    'claude_haiku': (1000, 400_000),
+    'claude_sonnet': (1000, 80_000),
+    'claude_opus': (500, 40_000),
+}
+DEFAULT_BUDGET = (500, 100_000)
+
+# lower runs first
+PRIORITIES = {
+    "router": 0,
+    "rag": 1,
+    "chat": 1,
+    "debug": 1,
+    "explain": 2,
+    "exercise": 3,
+    "summary": 4,  # background conversation summaries
+}
+DEFAULT_PRIORITY = 2
+
+MAX_RETRIES = 4
+BASE_DELAY = 1.0  # seconds
+MAX_DELAY = 30.0
+
+
+def is_rate_limit_error(error):
+    return getattr(error, "status_code", None) == 429 or type(error).__name__ == "RateLimitError"
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, if it said so."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+def backoff_delay(attempt, error=None):
+    """Jittered exponential backoff, at least as long as the provider's retry-after."""
+    delay = min(MAX_DELAY, BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.5)
+    requested = retry_after(error) if error is not None else None
+    return max(delay, requested or 0.0)
+
+
+class TokenBucket:
+    """Continuously refilling bucket; capacity is one minute of budget."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount is available (0 if it is available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self):
+        self.tokens = min(self.tokens, 0.0)
+
+
+class ModelScheduler:
+    """Priority queue in front of one model's request and token buckets."""
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+        self._queue = []  # (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+        self.granted = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+    def _try_grant(self, ticket, amount):
+        """Grant ticket if it is first in line and the budgets allow it, else return seconds to wait."""
+        now = time.monotonic()
+        if self._queue[0] != ticket:
+            return 0.05
+        wait = max(self.paused_until - now,
+                   self.requests.wait_time(1, now),
+                   self.tokens.wait_time(amount, now))
+        if wait > 0:
+            return wait
+        self.requests.consume(1)
+        self.tokens.consume(amount)
+        heapq.heappop(self._queue)
+        self.granted += 1
+        self._cond.notify_all()
+        return 0.0
+
+    def acquire(self, priority, amount):
+        """Block until the call may go out; returns the time spent queued."""
+        start = time.perf_counter()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+            while (wait := self._try_grant(ticket, amount)) > 0:
+                self._cond.wait(timeout=wait)
+        return self._queued(start)
+
+    async def aacquire(self, priority, amount):
+        """Async acquire: polls the queue without blocking the event loop."""
+        start = time.perf_counter()
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._queue, ticket)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_grant(ticket, amount)
+                if wait <= 0:
+                    return self._queued(start)
+                await asyncio.sleep(min(wait, 0.25))
+        except asyncio.CancelledError:
+            with self._cond:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    heapq.heapify(self._queue)
+                    self._cond.notify_all()
+            raise
+
+    def _queued(self, start):
+        waited = time.perf_counter() - start
+        metrics.observe("scheduler_queue_wait_seconds", waited, model=self.name)
+        return waited
+
+    def on_rate_limited(self, error, attempt):
+        """Pause the model's budget after a 429 and return how long to back off."""
+        delay = backoff_delay(attempt, error)
+        with self._cond:
+            self.rate_limited += 1
+            self.retries += 1
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            self.requests.drain()
+        print(f"Rate limited on {self.name}, retrying in {delay:.1f}s")
+        return delay
+
+    def stats(self):
+        return {
+            f"{self.name}_queue_depth": len(self._queue),
+            f"{self.name}_granted": self.granted,
+            f"{self.name}_rate_limited": self.rate_limited,
+            f"{self.name}_retries": self.retries,
+        }
+
+
+_schedulers = {}
+_lock = threading.Lock()
+
+
+def get_scheduler(name):
+    with _lock:
+        if name not in _schedulers:
+            _schedulers[name] = ModelScheduler(name, *MODEL_BUDGETS.get(name, DEFAULT_BUDGET))
+        return _schedulers[name]
+
+
+def scheduler_stats():
+    result = {}
+    for scheduler in list(_schedulers.values()):
+        result.update(scheduler.stats())
+    return result
+
+
+def _estimate_tokens(input, max_tokens):
+    text = input.to_string() if hasattr(input, "to_string") else str(input)
+    return count_tokens(text) + (max_tokens or 0)
+
+
+class ScheduledRunnable(Runnable):
+    """Queue calls to a model by priority within its rate budget, retrying 429s with backoff.
+
+    Streams are only retried before their first chunk has been yielded.
+    """
+
+    def __init__(self, runnable, model_name, priority=DEFAULT_PRIORITY, max_tokens=None,
+                 max_retries=MAX_RETRIES):
+        self.runnable = runnable
+        self.scheduler = get_scheduler(model_name)
+        self.priority = priority
+        self.max_tokens = max_tokens
+        self.max_retries = max_retries
+
+    def _retry_or_raise(self, error, attempt):
+        if not is_rate_limit_error(error) or attempt >= self.max_retries:
+            raise error
+        return self.scheduler.on_rate_limited(error, attempt)
+
+    def invoke(self, input, config=None, **kwargs):
+        amount = _estimate_tokens(input, self.max_tokens)
+        for attempt in itertools.count():
+            self.scheduler.acquire(self.priority, amount)
+            try:
+                return self.runnable.invoke(input, config, **kwargs)
+            except Exception as e:
+                time.sleep(self._retry_or_raise(e, attempt))
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        amount = _estimate_tokens(input, self.max_tokens)
+        for attempt in itertools.count():
+            await self.scheduler.aacquire(self.priority, amount)
+            try:
+                return await self.runnable.ainvoke(input, config, **kwargs)
+            except Exception as e:
+                await asyncio.sleep(self._retry_or_raise(e, attempt))
+
+    def stream(self, input, config=None, **kwargs):
+        amount = _estimate_tokens(input, self.max_tokens)
+        for attempt in itertools.count():
+            self.scheduler.acquire(self.priority, amount)
+            stream = self.runnable.stream(input, config, **kwargs)
+            try:
+                first = next(stream)
+            except StopIteration:
+                return
+            except Exception as e:
+                time.sleep(self._retry_or_raise(e, attempt))
+                continue
+            yield first
+            yield from stream
+            return
+
+    async def astream(self, input, config=None, **kwargs):
+        amount = _estimate_tokens(input, self.max_tokens)
+        for attempt in itertools.count():
+            await self.scheduler.aacquire(self.priority, amount)
+            stream = self.runnable.astream(input, config, **kwargs)
+            try:
+                first = await stream.__anext__()
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                await asyncio.sleep(self._retry_or_raise(e, attempt))
+                continue
+            yield first
+            async for chunk in stream:
+                yield chunk
+            return
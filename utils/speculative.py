@@ -0,0 +1,58 @@
+"""
+Speculative retrieval that runs concurrently with the routing call.
+
+Retrieval for the raw user query starts in a worker thread while the LLM
+router decides on a tool. It is only started when the local router picked
+course_information or could not decide, so queries routed locally to other
+tools never pay for a retrieval. The course_information path reuses those
+documents when the router's rewritten query is close enough to the
+original, and discards them otherwise.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.answer_cache import normalize_query
+
+MIN_QUERY_SIMILARITY = 0.6
+PREFETCH_TIMEOUT = 10  # seconds
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+
+def query_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of the normalized word sets of two queries."""
+    words_a, words_b = set(normalize_query(a).split()), set(normalize_query(b).split())
+    if not words_a or not words_b:
+        return 0.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+class Prefetch:
+    """Handle on documents being retrieved for the original user query."""
+
+    def __init__(self, retriever, query, callbacks=None):
+        self.query = query
+        self.future = _executor.submit(retriever.invoke, query, config={"callbacks": callbacks})
+
+    def documents_for(self, query, min_similarity=MIN_QUERY_SIMILARITY):
+        """Return the prefetched documents if query is close to the original, else None."""
+        similarity = query_similarity(self.query, query)
+        if similarity < min_similarity:
+            print(f"Prefetch discarded (similarity {similarity:.2f}): {query}")
+            self.future.cancel()
+            return None
+        try:
+            return self.future.result(timeout=PREFETCH_TIMEOUT)
+        except Exception as e:
+            print(f"Prefetch failed, retrieving again: {e}")
+            return None
+
+
+def wants_prefetch(decision) -> bool:
+    """Whether a local routing decision may still lead to course_information retrieval."""
+    return decision.name in (None, "course_information")
+
+
+def prefetch(retriever, query, callbacks=None) -> Prefetch:
+    """Start retrieval for query in the background."""
+    return Prefetch(retriever, query, callbacks=callbacks)
@@ -0,0 +1,169 @@
+"""
+Compact NumPy vector index exported from the Chroma knowledge base.
+
+The index is a directory holding a unit-normalized embedding matrix
+(embeddings.npy, float16 or float32, memory-mapped on load), the chunk texts
+and metadata (documents.jsonl, one line per matrix row) and meta.json. Search
+is exact: one matrix-vector product and a partial sort. The KB is small
+enough that this beats the Chroma client on cold start and memory per
+worker.
+
+NumpyVectorStore offers the parts of the Chroma API the app uses (get,
+as_retriever, similarity_search, embeddings, equality `filter`s), so load_db
+can return either.
+
+Usage:
+    python -m utils.vector_index [--db-path data/chroma_db] [--out data/numpy_index] [--dtype float16]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from utils.course_metadata import MetadataIndex
+
+NUMPY_INDEX_PATH = 'data/numpy_index'
+MATRIX_FILE = 'embeddings.npy'
+DOCUMENTS_FILE = 'documents.jsonl'
+META_FILE = 'meta.json'
+KB_VERSION_FILE = 'kb_version.json'
+
+
+def _version(ids):
+    # same stamp as utils.ingest.write_version
+    return hashlib.sha256("\n".join(sorted(ids)).encode('utf-8')).hexdigest()[:16]
+
+
+def export_chroma(db_path, out_path=NUMPY_INDEX_PATH, dtype='float16'):
+    """Write the vectors, texts and metadata of a Chroma collection as a NumPy index."""
+    from langchain_community.vectorstores import Chroma
+
+    # Chroma rewrites its files when opened; read a copy so the checked-in KB stays untouched
+    with tempfile.TemporaryDirectory() as workdir:
+        copy_path = os.path.join(workdir, "chroma_db")
+        shutil.copytree(db_path, copy_path)
+        stored = Chroma(persist_directory=copy_path).get(include=["embeddings", "documents", "metadatas"])
+    matrix = np.asarray(stored["embeddings"], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = (matrix / np.where(norms == 0, 1, norms)).astype(dtype)
+
+    os.makedirs(out_path, exist_ok=True)
+    np.save(os.path.join(out_path, MATRIX_FILE), matrix)
+    with open(os.path.join(out_path, DOCUMENTS_FILE), 'w', encoding='utf-8') as f:
+        for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"]):
+            f.write(json.dumps({"id": chunk_id, "text": text, "metadata": metadata or {}}) + "\n")
+    meta = {"version": _version(stored["ids"]), "count": len(stored["ids"]),
+            "dimensions": int(matrix.shape[1]) if len(matrix) else 0, "dtype": dtype,
+            "source": db_path}
+    with open(os.path.join(out_path, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class NumpyIndex:
+    """Exact cosine top-k over a memory-mapped, unit-normalized embedding matrix."""
+
+    def __init__(self, path=NUMPY_INDEX_PATH):
+        self.path = path
+        self.matrix = np.load(os.path.join(path, MATRIX_FILE), mmap_mode='r')
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.ids = []
+        self.documents = []
+        with open(os.path.join(path, DOCUMENTS_FILE), encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                self.ids.append(record["id"])
+                self.documents.append(Document(page_content=record["text"], metadata=record["metadata"]))
+        self.metadata_index = MetadataIndex(self.documents)
+
+    def is_stale(self, db_path):
+        """True when the Chroma KB at db_path has been re-ingested since the export."""
+        try:
+            with open(os.path.join(db_path, KB_VERSION_FILE), encoding='utf-8') as f:
+                return json.load(f)["version"] != self.meta["version"]
+        except (OSError, KeyError, ValueError):
+            return False
+
+    def search(self, vector, k=4, rows=None):
+        """Return up to k (row, cosine similarity) pairs, best first, optionally among rows only."""
+        if not len(self.documents if rows is None else rows):
+            return []
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        # a filtered search only reads its candidate rows of the memory map
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        scores = matrix @ (vector / norm if norm else vector)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i if rows is None else rows[i]), float(scores[i])) for i in top]
+
+    def filtered_search(self, vector, k=4, filter=None):
+        """search restricted to the rows matching a Chroma-style equality `filter`."""
+        if not filter:
+            return self.search(vector, k)
+        return self.search(vector, k, np.array(sorted(self.metadata_index.rows(filter)), dtype=np.int64))
+
+
+class NumpyRetriever(BaseRetriever):
+    """Retriever over a NumpyIndex; returns the k most similar chunks."""
+
+    index: Any
+    embeddings: Any
+    k: int = 4
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun,
+                                filter: Any = None) -> List[Document]:
+        vector = self.embeddings.embed_query(query)
+        return [self.index.documents[i] for i, _ in self.index.filtered_search(vector, self.k, filter)]
+
+
+class NumpyVectorStore:
+    """The subset of the Chroma vector store API used by the app, backed by a NumpyIndex."""
+
+    def __init__(self, index, embeddings):
+        self.index = index
+        self.embeddings = embeddings
+
+    def get(self, include=("documents", "metadatas")):
+        return {
+            "ids": list(self.index.ids),
+            "documents": [doc.page_content for doc in self.index.documents],
+            "metadatas": [doc.metadata for doc in self.index.documents],
+        }
+
+    def as_retriever(self, search_kwargs=None):
+        return NumpyRetriever(index=self.index, embeddings=self.embeddings, **(search_kwargs or {}))
+
+    def similarity_search(self, query, k=4, filter=None):
+        vector = self.embeddings.embed_query(query)
+        return [self.index.documents[i] for i, _ in self.index.filtered_search(vector, k, filter)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the Chroma knowledge base as a NumPy vector index.")
+    parser.add_argument("--db-path", default='data/chroma_db')
+    parser.add_argument("--out", default=NUMPY_INDEX_PATH)
+    parser.add_argument("--dtype", choices=("float16", "float32"), default='float16')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    meta = export_chroma(args.db_path, args.out, args.dtype)
+    size = os.path.getsize(os.path.join(args.out, MATRIX_FILE))
+    print(f"Exported {meta['count']} chunks ({meta['dimensions']} dims, {meta['dtype']}, "
+          f"{size / 1024:.0f} KB) to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()